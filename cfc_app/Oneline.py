@@ -18,6 +18,7 @@ import nltk
 
 # Application imports
 from .bill_detail import BillDetail, MAX_TITLE, MAX_SUMMARY
+from .warm_state import ensure_punkt
 
 # Debug with:  import pdb; pdb.set_trace()
 logger = logging.getLogger(__name__)
@@ -30,6 +31,72 @@ CITE_REGEX = re.compile(r"_CITE_\s*(.*?) _")
 TITLE_REGEX = re.compile(r"_TITLE_\s*(.*?) _")
 SUMMARY_REGEX = re.compile(r"_SUMMARY[_]?\s*(.*?) _")
 
+# Rules for common_acronyms(), applied in this order, as the later rules
+# depend on the output of the earlier ones.  Each rule is [guard, pattern,
+# replacement], and its pass over the text is skipped if the guard string
+# is not found.
+ACRONYM_RULES = [
+    # Convert "H. B. No. 3" to "HB3"
+    ['No', r"H.\s*B.\s*No.\s*(\d)", r"HB\1"],
+    ['No', r"S.\s*B.\s*No.\s*(\d)", r"SB\1"],
+    ['No', r"H.\s*R.\s*No.\s*(\d)", r"HR\1"],
+    ['No', r"S.\s*R.\s*No.\s*(\d)", r"SR\1"],
+    ['No', r"C.\s*R.\s*No.\s*(\d)", r"CR\1"],
+    ['No', r"J.\s*R.\s*No.\s*(\d)", r"JR\1"],
+
+    # Convert "H. B. 3" to "HB3"
+    ['B', r"H.\s*B.\s*(\d)", r"HB\1"],
+    ['B', r"S.\s*B.\s*(\d)", r"SB\1"],
+    ['Sub', r"Am.\sSub.", r"Am-Sub"],
+
+    # Convert General Assembly to avoid confusion with state of Georgia
+    [' G', r"(st|nd|rd|th) G.A.", r"\1-GA "],
+
+    # Convert Sec. Sub. etc. to Sec# Sub#
+    ['.', r"(Sec|Sub|SEC)[.]\s*([0-9]+)", r" \1#\2 "],
+
+    # Remove sections NN-NNNN.NN
+    ['-', r"[0-9]+[-][0-9]+[.][0-9]+", r" "],
+
+    # Remove sections "(NNNN.MMM)"
+    ['(', r"[(][0-9]+[.][ 0-9]+[)]", r" "],
+
+    # Remove sections "NNNN.MMM and NNNN.MMM"
+    [' and ', r"[0-9]+[.][0-9]+[,]? and [0-9]+[.][0-9]+", r" "],
+
+    # Remove sections "NNNN.MMM,"
+    [',', r"[0-9]+[.][0-9]+\s*[,]", r" "],
+
+    # Ordered lists are changed from "N." to "(N)"
+    ['.', r"[.]\s+([0-9]{1,2})[.]\s", r". (\1) "],
+
+    # Change "sections and sections" to just "sections"
+    ['ection', r"ection[s]?\s*and\s*[Ss]ection[s]?", r"ections"],
+]
+ACRONYM_RULES = [[guard, re.compile(pattern), replacement]
+                 for guard, pattern, replacement in ACRONYM_RULES]
+
+
+def squeeze_spaces(text):
+    """ Shrink whitespace to a single space, none before , ; or :
+
+    Same result as the two regex passes it replaces, but str.split() and
+    str.replace() do it without the regex engine.
+    """
+
+    if not text or text.isspace():
+        return ' ' if text else text
+
+    newline = ' '.join(text.split())
+    if text[0].isspace():
+        newline = ' ' + newline
+    if text[-1].isspace():
+        newline += ' '
+
+    for mark in ',;:':
+        newline = newline.replace(' ' + mark, mark)
+    return newline
+
 
 class OnelineError(RuntimeError):
     """ Customize error for this class """
@@ -41,20 +108,44 @@ class Oneline():
 
     def __init__(self, nltk_loaded=False):
         """ Set characters to use for showing progress"""
-        self.oneline = ''
+        self.chunks = []
         if not nltk_loaded:
-            nltk.download('punkt')
+            ensure_punkt()
         self.nltk_loaded = True
         return None
 
+    @property
+    def oneline(self):
+        """ Text added so far, joined into a single string """
+
+        if len(self.chunks) > 1:
+            self.chunks = [''.join(self.chunks)]
+        return self.chunks[0] if self.chunks else ''
+
+    @oneline.setter
+    def oneline(self, text):
+        self.chunks = [text] if text else []
+
     def add_text(self, line):
-        """ append a line to the existing file """
+        """ append a line to the existing file
+
+        Lines are kept as a list of chunks and joined only once, when
+        oneline is read, rather than copying the whole text each time.
+        """
 
         newline = line.replace('\u2011', '-').replace('\u2013', '-')
         newline = newline.replace('\u2019', '-')
         newlines = newline.splitlines()
         newline2 = ' '.join(newlines)
-        self.oneline += newline2 + ' '
+        self.chunks.append(newline2)
+        self.chunks.append(' ')
+        return self
+
+    def add_oneline(self, text):
+        """ append text already joined by add_text(), such as oneline """
+
+        if text:
+            self.chunks.append(text)
         return self
 
     def split_sentences(self):
@@ -93,52 +184,11 @@ class Oneline():
         """ Convert acronyms and bad character strings before NLTK """
         newline = line.replace(r'\x91', '')
 
-        # Convert "H. B. No. 3" to "HB3"
-        newline = re.sub(r"H.\s*B.\s*No.\s*(\d)", r"HB\1", newline)
-        newline = re.sub(r"S.\s*B.\s*No.\s*(\d)", r"SB\1", newline)
-        newline = re.sub(r"H.\s*R.\s*No.\s*(\d)", r"HR\1", newline)
-        newline = re.sub(r"S.\s*R.\s*No.\s*(\d)", r"SR\1", newline)
-        newline = re.sub(r"C.\s*R.\s*No.\s*(\d)", r"CR\1", newline)
-        newline = re.sub(r"J.\s*R.\s*No.\s*(\d)", r"JR\1", newline)
-
-        # Convert "H. B. 3" to "HB3"
-        newline = re.sub(r"H.\s*B.\s*(\d)", r"HB\1", newline)
-        newline = re.sub(r"S.\s*B.\s*(\d)", r"SB\1", newline)
-        newline = re.sub(r"Am.\sSub.", r"Am-Sub", newline)
-
-        # Convert General Assembly to avoid confusion with state of Georgia
-        newline = re.sub(r"(st|nd|rd|th) G.A.", r"\1-GA ", newline)
-
-        # Convert Sec. Sub. etc. to Sec# Sub#
-        newline = re.sub(r"(Sec|Sub|SEC)[.]\s*([0-9]+)", r" \1#\2 ", newline)
-
-        # Remove sections NN-NNNN.NN
-        newline = re.sub(r"[0-9]+[-][0-9]+[.][0-9]+", r" ", newline)
-
-        # Remove sections "(NNNN.MMM)"
-        newline = re.sub(r"[(][0-9]+[.][ 0-9]+[)]", r" ", newline)
-
-        # Remove sections "NNNN.MMM and NNNN.MMM"
-        newline = re.sub(r"[0-9]+[.][0-9]+[,]? and [0-9]+[.][0-9]+",
-                         r" ", newline)
-
-        # Remove sections "NNNN.MMM,"
-        newline = re.sub(r"[0-9]+[.][0-9]+\s*[,]", r" ", newline)
-
-        # Ordered lists are changed from "N." to "(N)"
-        newline = re.sub(r"[.]\s+([0-9]{1,2})[.]\s", r". (\1) ", newline)
-
-        # Change "sections and sections" to just "sections"
-        newline = re.sub(r"ection[s]?\s*and\s*[Ss]ection[s]?",
-                         r"ections", newline)
-
-        # remove all whitespace before certain punctuation marks
-        newline = re.sub(r"\s+([,;:])", r"\1", newline)
-
-        # shrink multiple spaces to a single space for readability
-        newline = re.sub(r"\s+", " ", newline)
+        for guard, regex, replacement in ACRONYM_RULES:
+            if guard is None or guard in newline:
+                newline = regex.sub(replacement, newline)
 
-        return newline
+        return squeeze_spaces(newline)
 
     @staticmethod
     def merge_sentences(a_list):
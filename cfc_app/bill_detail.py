@@ -51,6 +51,7 @@ class BillDetail():
         self.title = None
         self.url = None
         self.doc_id = None
+        self.source_key = None     # TextCache key of PDF/HTML bytes
 
         if jsondet:
             self.bill_id = jsondet['bill_id']
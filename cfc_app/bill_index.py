@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Index of the bills in a Legiscan session dataset ZIP.
+
+For each bill, the index holds the path of its JSON in the ZIP, the key
+used for its PDF/HTML/TXT items, the extension and doc_id of its latest
+text, and the Legiscan change_hash.  The index is saved next to the
+dataset as SS-Dataset-NNNN.idx, and rebuilt only when the dataset hash
+code changes.
+
+Comparing the change_hash of each bill with the cfc_app_hash table and
+the list of TXT items gives the bills that changed since the last run,
+without reading the bill JSON, the database or File/Object storage for
+the bills that did not.
+
+Written by Tony Pearson, IBM, 2021
+Licensed under Apache 2.0, see LICENSE for details
+"""
+
+# System imports
+import json
+import logging
+import re
+
+# Django and other third-party imports
+
+# Application imports
+from cfc_app.bill_detail import BillDetail
+from cfc_app.fob_helper import FobHelper
+
+# import pdb; pdb.set_trace()
+logger = logging.getLogger(__name__)
+
+BILL_REGEX = re.compile(r"^([A-Z]{2})/\d\d\d\d-(\d\d\d\d).*/bill/(\w*).json$")
+
+# Fields of each bill entry, in the order saved
+FIELDS = ['path', 'key', 'extension', 'change_hash', 'doc_id', 'doc_date']
+
+
+class BillIndex():
+    """ Bill key => change_hash, doc_id, extension for one dataset """
+
+    def __init__(self, dataset_hash=None):
+        self.dataset_hash = dataset_hash
+        self.bills = []
+        return None
+
+    @staticmethod
+    def from_zip(zipf, dataset_hash):
+        """ Build index from the bill JSON files in an open ZipFile """
+
+        index = BillIndex(dataset_hash)
+        for path in zipf.namelist():
+            if not BILL_REGEX.search(path):
+                continue
+            json_data = zipf.read(path).decode('UTF-8', errors='ignore')
+            detail = BillDetail(json.loads(json_data)['bill'])
+            if not detail.texts:
+                continue
+
+            earliest_year, chosen = detail.latest_text()
+            detail.choose_document(chosen)
+            key = FobHelper.bill_text_key(detail.state, detail.bill_number,
+                                          detail.session_id, earliest_year)
+            index.bills.append([path, key, detail.extension,
+                                detail.hashcode, detail.doc_id,
+                                detail.doc_date])
+
+        logger.debug(f"71:Indexed {len(index.bills)} bills")
+        return index
+
+    @staticmethod
+    def from_json(textdata):
+        """ Load index saved by to_json(), None if not valid """
+
+        try:
+            saved = json.loads(textdata)
+            dataset_hash = saved['dataset_hash']
+            bills = [[bill[field] for field in FIELDS]
+                     for bill in saved['bills']]
+        except (ValueError, KeyError, TypeError) as exc:
+            logger.warning(f"84:Invalid bill index: {exc}")
+            return None
+
+        index = BillIndex(dataset_hash)
+        index.bills = bills
+        return index
+
+    def to_json(self):
+        """ Save index as JSON text """
+
+        bills = [dict(zip(FIELDS, bill)) for bill in self.bills]
+        return json.dumps({'dataset_hash': self.dataset_hash,
+                           'bills': bills})
+
+    def changed_paths(self, hashes, text_names, fromyear, after=None):
+        """ Return ZIP paths of bills that need to be extracted
+
+        hashes is {bill_name: Hash} and text_names is a set of the TXT
+        items in File/Object storage.  A bill is unchanged if its hash
+        code matches its change_hash and its TXT item exists.
+        """
+
+        paths = []
+        for path, key, extension, change_hash, _, doc_date in self.bills:
+            if int(doc_date[:4]) < fromyear:
+                continue
+            if after and key <= after:
+                continue
+            bill_hash = hashes.get(FobHelper.bill_text_name(key, extension))
+            if (bill_hash is not None
+                    and bill_hash.hashcode == change_hash
+                    and FobHelper.bill_text_name(key, 'txt') in text_names):
+                continue
+            paths.append(path)
+        return paths
+
+# end of module
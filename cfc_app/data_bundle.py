@@ -9,15 +9,13 @@ Licensed under Apache 2.0, see LICENSE for details
 """
 
 # System imports
-import certifi
 import logging
 import sys
-import urllib3
 
 # Django and other third-party imports
-import requests
 
 # Application imports
+from cfc_app.http_client import shared_client
 
 # import pdb; pdb.set_trace()
 logger = logging.getLogger(__name__)
@@ -62,13 +60,8 @@ class DataBundle():
         """ Make API request and capture the response """
 
         logger.debug(f"Make request {self.name}")
-        # Issue 72 add ca_cert verification, bypass for Ohio
-        ca_cert = certifi.where()
-        if 'state.oh.us' in url:
-            ca_cert = False
-            urllib3.disable_warnings()
-        # import pdb; pdb.set_trace()
-        response = requests.get(url, params, verify=ca_cert) 
+        # Keep-alive session, per-host limits and retries, see http_client
+        response = shared_client().get(url, params)
         return response
 
     def load_response(self, response):
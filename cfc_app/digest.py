@@ -0,0 +1,314 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Weekly digest of new and changed laws, emailed to each profile user.
+
+send_digest() finds the laws added or changed since the last digest, by
+Law.date_changed, and matches them against the criteria of all profiles
+in one pass, instead of searching once for each user.  Profiles with the
+same location and impacts share one Criteria row, so the changed laws
+are indexed by location and impact, and looked up once for each Criteria
+with the ancestor chain of its location and its set of impacts.  The
+email for each Criteria is rendered once, and sent to all of its profile
+users over one connection to the email backend, MAIL_QUEUE['batch']
+messages at a time.  The recipients of a batch that fails are saved as
+MailJob rows for this Digest, and sent again by send_queued_mail, the
+same way as search results, see cfc_app/mailer.py.
+
+Written by Tony Pearson, IBM, 2021
+Licensed under Apache 2.0, see LICENSE for details
+"""
+
+# System imports
+from datetime import timedelta
+import logging
+import time
+
+# Django and other third-party imports
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.db import transaction
+from django.template.loader import render_to_string
+from django.utils import timezone
+
+# Application imports
+from cfc_app.mailer import (MAIL_FROM, enqueue, queue_options,
+                            recipient_format)
+from cfc_app.models import Criteria, Digest, Law, MailJob, REFERENCE_DATA
+from users.models import Profile
+
+# Debug with:  import pdb; pdb.set_trace()
+logger = logging.getLogger(__name__)
+
+FIRST_DAYS = 7      # days of changed laws in the first digest
+MAX_LAWS = 50       # laws listed in each email, the rest are counted
+PROFILE_CHUNK = 2000    # profiles read per round trip
+
+
+def changed_laws(since, until):
+    """ {id: law} added or changed after since, up to until, in key order """
+
+    laws = Law.objects.filter(date_changed__gt=since,
+                              date_changed__lte=until)
+    laws = laws.select_related('location', 'impact').order_by('key')
+    return {law.id: law for law in laws}
+
+
+def law_index(laws):
+    """ {(location_id, impact_id): [law ids]} """
+
+    index = {}
+    for law in laws.values():
+        index.setdefault((law.location_id, law.impact_id), []).append(law.id)
+    return index
+
+
+def profile_criteria():
+    """ {criteria_id: [location_id, {impact ids}]} of profiles, 2 queries """
+
+    used = Profile.objects.filter(criteria__isnull=False).values(
+        'criteria_id')
+    rows = Criteria.objects.filter(id__in=used, location__isnull=False)
+    groups = {crit_id: [loc_id, set()] for crit_id, loc_id
+              in rows.values_list('id', 'location_id')}
+
+    through = Criteria.impacts.through.objects.filter(criteria_id__in=used)
+    for crit_id, impact_id in through.values_list('criteria_id',
+                                                  'impact_id'):
+        if crit_id in groups:
+            groups[crit_id][1].add(impact_id)
+    return groups
+
+
+def match_criteria(groups, index):
+    """ {criteria_id: [law ids]} for criteria with new or changed laws """
+
+    chains = {}
+    matched = {}
+    for crit_id, (loc_id, impact_ids) in groups.items():
+        chain = chains.get(loc_id)
+        if chain is None:
+            location = REFERENCE_DATA.location_id(loc_id)
+            chain = []
+            if location is not None:
+                chain = [loc.id for loc in location.ancestors()]
+            chains[loc_id] = chain
+
+        law_ids = []
+        for chain_id in chain:
+            for impact_id in impact_ids:
+                law_ids.extend(index.get((chain_id, impact_id), []))
+        if law_ids:
+            matched[crit_id] = law_ids
+    return matched
+
+
+def digest_content(group, law_ids, laws, gen_date):
+    """ [subject, text, html] of the email for one criteria """
+
+    loc_id, impact_ids = group
+    impacts = [imp.iname for imp in REFERENCE_DATA.impacts(include_none=True)
+               if imp.id in impact_ids]
+    found = sorted((laws[law_id] for law_id in law_ids),
+                   key=lambda law: law.key)
+    laws_found = [{'key': law.key,
+                   'location': law.location.longname,
+                   'impact': law.impact.iname,
+                   'title': law.title,
+                   'summary': law.summary}
+                  for law in found[:MAX_LAWS]]
+
+    context = {'laws_found': laws_found,
+               'gen_date': gen_date,
+               'digest': {'location': REFERENCE_DATA.location_id(
+                              loc_id).longname,
+                          'impacts': ', '.join(impacts),
+                          'more': max(len(found) - MAX_LAWS, 0)}}
+    text_version = render_to_string(template_name='email-results.txt',
+                                    context=context)
+    html_version = render_to_string(template_name='email-results.html',
+                                    context=context)
+    subject = f"{settings.APP_NAME} --Weekly Digest-- {gen_date}"
+    return [subject, text_version, html_version]
+
+
+def digest_message(content, recipient):
+    """ EmailMessage for [subject, text, html] content """
+
+    subject, text_version, html_version = content
+    message = EmailMultiAlternatives(subject, text_version, MAIL_FROM,
+                                     [recipient])
+    message.attach_alternative(html_version, 'text/html')
+    return message
+
+
+def retry_message(job):
+    """ Digest email for a MailJob saved by a failed batch """
+
+    digest = job.digest
+    criteria = job.criteria
+    group = [criteria.location_id,
+             set(criteria.impacts.values_list('id', flat=True))]
+    laws = changed_laws(digest.since, digest.until)
+    matched = match_criteria({criteria.id: group}, law_index(laws))
+    content = digest_content(group, matched.get(criteria.id, []), laws,
+                             digest.until.strftime("%B %d, %Y"))
+    return digest_message(content, job.recipient)
+
+
+class DigestMailer():
+    """ Collect digest messages and send them in batches
+
+    A MailJob is kept for each message that could not be sent, saved by
+    send_digest with the Digest.  If the connection could not be opened,
+    error is set and every message is failed without being sent.
+    """
+
+    def __init__(self, connection, batch_size):
+        self.connection = connection
+        self.batch_size = max(batch_size, 1)
+        self.error = None
+        self.pending = []
+        self.failed_jobs = []
+        self.sent = 0
+        self.failed = 0
+        return None
+
+    def add(self, content, recipient, user_id, crit_id):
+        """ Queue message to be sent, send the batch if it is full """
+
+        self.pending.append([digest_message(content, recipient),
+                             user_id, crit_id])
+        if len(self.pending) >= self.batch_size:
+            self.flush()
+        return None
+
+    def flush(self):
+        """ Send all pending messages over the open connection """
+
+        if not self.pending:
+            return None
+
+        if self.error is not None:
+            self.keep_failed(self.error)
+        else:
+            try:
+                self.connection.send_messages(
+                    [message for message, _, _ in self.pending])
+            except Exception as exc:
+                logger.warning(f"158:Digest batch of {len(self.pending)} "
+                               f"failed: {exc}")
+                self.keep_failed(exc)
+            else:
+                self.sent += len(self.pending)
+        self.pending = []
+        return None
+
+    def keep_failed(self, exc):
+        """ Keep a MailJob for each pending message, to be sent again """
+
+        options = queue_options()
+        retry_at = timezone.now() + timedelta(seconds=options['retry'])
+        self.failed += len(self.pending)
+        self.failed_jobs.extend(
+            MailJob(user_id=user_id, criteria_id=crit_id,
+                    recipient=message.to[0], attempts=1,
+                    error=str(exc)[:200], retry_at=retry_at)
+            for message, user_id, crit_id in self.pending)
+        return None
+
+
+def send_digest(until=None, dry_run=False, batch_size=None, connection=None):
+    """ Email new and changed laws to each profile user, return Digest
+
+    The Digest is saved once all messages have been sent, so the next
+    one starts where this one ended, unless dry_run is specified.
+    Messages that fail are saved with it as MailJob rows, and a task is
+    scheduled to send them again.  If an exception stops the digest,
+    nothing is saved, and the next run includes the same laws.
+    """
+
+    started = time.monotonic()
+    until = until or timezone.now()
+    since = Digest.last_until() or until - timedelta(days=FIRST_DAYS)
+    digest = Digest(since=since, until=until)
+    failed_jobs = []
+
+    laws = changed_laws(since, until)
+    groups = {}
+    matched = {}
+    if laws:
+        groups = profile_criteria()
+        matched = match_criteria(groups, law_index(laws))
+    digest.laws = len(laws)
+    digest.criteria = len(matched)
+    logger.info(f"185:Digest {since} to {until}: {len(laws)} laws, "
+                f"{len(matched)} of {len(groups)} criteria matched")
+
+    if matched:
+        if connection is None:
+            connection = get_connection(fail_silently=False)
+        mailer = DigestMailer(connection,
+                              batch_size or queue_options()['batch'])
+        gen_date = until.strftime("%B %d, %Y")
+        if not dry_run:
+            try:
+                connection.open()
+            except Exception as exc:
+                logger.warning(f"244:Digest connection failed: {exc}")
+                mailer.error = exc
+        try:
+            digest.profiles = send_profiles(mailer, matched, groups, laws,
+                                            gen_date, dry_run)
+        finally:
+            if not dry_run:
+                connection.close()
+        digest.sent = mailer.sent
+        digest.failed = mailer.failed
+        failed_jobs = mailer.failed_jobs
+
+    if not dry_run:
+        with transaction.atomic():
+            digest.save()
+            for job in failed_jobs:
+                job.digest = digest
+            MailJob.objects.bulk_create(failed_jobs,
+                                        batch_size=PROFILE_CHUNK)
+        if digest.failed:
+            enqueue(delay=queue_options()['retry'])
+    logger.info(f"206:Digest {digest.profiles} profiles, {digest.sent} sent, "
+                f"{digest.failed} failed in "
+                f"{time.monotonic() - started:.1f} seconds")
+    return digest
+
+
+def send_profiles(mailer, matched, groups, laws, gen_date, dry_run):
+    """ Queue a message for each profile user of a matched criteria """
+
+    profiles = Profile.objects.filter(criteria__isnull=False)
+    profiles = profiles.exclude(user__email='').order_by('criteria_id')
+    rows = profiles.values_list('criteria_id', 'user_id', 'user__first_name',
+                                'user__last_name', 'user__email')
+
+    # Profiles are read in criteria order, so only the email of the
+    # current criteria is kept in memory
+    count = 0
+    crit_id, content = None, None
+    for row in rows.iterator(chunk_size=PROFILE_CHUNK):
+        row_crit, user_id, first, last, email = row
+        if row_crit not in matched or not email:
+            continue
+        if row_crit != crit_id:
+            crit_id = row_crit
+            content = digest_content(groups[crit_id], matched[crit_id],
+                                     laws, gen_date)
+        count += 1
+        if not dry_run:
+            mailer.add(content, recipient_format(first, last, email),
+                       user_id, row_crit)
+
+    mailer.flush()
+    return count
+
+# end of module
@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+File/Object Manifest -- Local index of items in File/Object storage
+
+Listing FILE storage with glob, or OBJECT storage with list_objects_v2,
+costs time proportional to the number of items stored.  The manifest
+keeps the name, size, etag (MD5) and modification time of each item in
+a local SQLite3 table, so item_exists() and list_items() are answered
+with an index lookup instead.
+
+Items from several FILE directories or COS buckets can share the same
+manifest file, each one is identified by its "store" name.  FobStorage
+keeps the manifest up to date as items are uploaded and removed, and
+refresh() catches up with changes made outside of FobStorage.
+
+Written by Tony Pearson, IBM, 2021
+Licensed under Apache 2.0, see LICENSE for details
+"""
+# System imports
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+
+# Django and other third-party imports
+
+# Application imports
+
+# import pdb; pdb.set_trace()
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 1024 * 1024
+LAST_CHAR = '\U0010ffff'    # Sorts after any other character
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS manifest (
+    store TEXT NOT NULL,
+    name TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    etag TEXT,
+    mtime REAL NOT NULL,
+    PRIMARY KEY (store, name)
+)
+"""
+
+
+def file_md5(fullname):
+    """ MD5 of a file, read a chunk at a time """
+
+    md5 = hashlib.md5()
+    with open(fullname, 'rb') as infile:
+        for chunk in iter(lambda: infile.read(CHUNK_SIZE), b''):
+            md5.update(chunk)
+    return md5.hexdigest()
+
+
+class FobManifest():
+    """
+    SQLite3 index of items in one FILE directory or COS bucket
+    """
+
+    def __init__(self, dbname, store):
+        self.dbname = dbname
+        self.store = store
+        self.lock = threading.Lock()   # extract_files fetches in threads
+        self.conn = sqlite3.connect(dbname, check_same_thread=False)
+        with self.conn:
+            self.conn.execute(SCHEMA)
+        return None
+
+    def close(self):
+        """ Close the SQLite3 database """
+        self.conn.close()
+        return None
+
+    def record(self, item_name, size, etag, mtime):
+        """ Add or update one item """
+
+        with self.lock, self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO manifest "
+                "(store, name, size, etag, mtime) VALUES (?, ?, ?, ?, ?)",
+                (self.store, item_name, size, etag, mtime))
+        return self
+
+    def remove(self, item_name):
+        """ Remove one item """
+
+        with self.lock, self.conn:
+            self.conn.execute(
+                "DELETE FROM manifest WHERE store = ? AND name = ?",
+                (self.store, item_name))
+        return self
+
+    def item_exists(self, item_name):
+        """ Check if item exists """
+
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT 1 FROM manifest WHERE store = ? AND name = ?",
+                (self.store, item_name)).fetchone()
+        return row is not None
+
+    def item_stats(self, item_name):
+        """ Return dict with size, etag and mtime, or None if not found """
+
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT size, etag, mtime FROM manifest "
+                "WHERE store = ? AND name = ?",
+                (self.store, item_name)).fetchone()
+        stats = None
+        if row:
+            stats = {'size': row[0], 'etag': row[1], 'mtime': row[2]}
+        return stats
+
+    def list_items(self, prefix=None, suffix=None, after=None, limit=0):
+        """ list items that match prefix/suffix, in name order """
+
+        query = "SELECT name FROM manifest WHERE store = ?"
+        params = [self.store]
+        if prefix:
+            query += " AND name >= ? AND name < ?"
+            params += [prefix, prefix + LAST_CHAR]
+        if after:
+            query += " AND name > ?"
+            params.append(after)
+        query += " ORDER BY name"
+
+        items = []
+        with self.lock:
+            cursor = self.conn.execute(query, params)
+            for (name,) in cursor:
+                if suffix and not name.endswith(suffix):
+                    continue
+                items.append(name)
+                if limit > 0 and len(items) >= limit:
+                    break
+            cursor.close()
+        return items
+
+    def known_items(self):
+        """ Return {name: [size, etag, mtime]} for all items in the store """
+
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT name, size, etag, mtime FROM manifest "
+                "WHERE store = ?", (self.store,)).fetchall()
+        known = {}
+        for name, size, etag, mtime in rows:
+            known[name] = [size, etag, mtime]
+        return known
+
+    def apply_changes(self, changed, removed):
+        """ Save [name, size, etag, mtime] rows, delete removed names """
+
+        with self.lock, self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO manifest "
+                "(store, name, size, etag, mtime) VALUES (?, ?, ?, ?, ?)",
+                [[self.store] + row for row in changed])
+            self.conn.executemany(
+                "DELETE FROM manifest WHERE store = ? AND name = ?",
+                [(self.store, name) for name in removed])
+        logger.debug(f"178:Manifest {self.store} changed={len(changed)} "
+                     f"removed={len(removed)}")
+        return self
+
+    def refresh_file(self, filesys):
+        """ Catch up with FILE storage, hashing only new or changed files """
+
+        known = self.known_items()
+        changed = []
+        with os.scandir(filesys) as entries:
+            for entry in entries:
+                if entry.name.startswith('.') or not entry.is_file():
+                    continue
+                stat = entry.stat()
+                old = known.pop(entry.name, None)
+                if (old is not None and old[0] == stat.st_size
+                        and old[2] == stat.st_mtime and old[1]):
+                    continue
+                changed.append([entry.name, stat.st_size,
+                                file_md5(entry.path), stat.st_mtime])
+
+        self.apply_changes(changed, list(known))
+        return self
+
+    def refresh_object(self, cos, bucket):
+        """ Catch up with OBJECT storage, one listing of the bucket """
+
+        known = self.known_items()
+        changed = []
+        paginator = cos.get_paginator('list_objects_v2')
+        for page in paginator.paginate(Bucket=bucket):
+            for content in page.get('Contents', []):
+                name = content['Key']
+                etag = content['ETag'].strip('"')
+                mtime = content['LastModified'].timestamp()
+                old = known.pop(name, None)
+                if (old is not None and old[0] == content['Size']
+                        and old[1] == etag):
+                    continue
+                changed.append([name, content['Size'], etag, mtime])
+
+        self.apply_changes(changed, list(known))
+        return self
+
+# end of module
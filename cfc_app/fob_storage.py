@@ -7,16 +7,24 @@ Written by Tony Pearson, IBM, 2020
 Licensed under Apache 2.0, see LICENSE for details
 """
 # System imports
+from contextlib import closing
+import io
 import logging
 import os
 import re
+import hashlib
 import sys
+import tempfile
+import time
 import glob
 
 # Django and other third-party imports
 import ibm_boto3
 from ibm_botocore.client import Config, ClientError
 
+# Application imports
+from cfc_app.fob_manifest import CHUNK_SIZE, FobManifest
+
 # import pdb; pdb.set_trace()
 logger = logging.getLogger(__name__)
 
@@ -36,7 +44,7 @@ class FobStorage():
     Support both Local File and Remote Object Storage
     """
 
-    def __init__(self, mode, filesys=None, bucket=None):
+    def __init__(self, mode, filesys=None, bucket=None, manifest=None):
         self.mode = mode  # 'FILE' or 'OBJECT'
 
         self.cos = None
@@ -47,12 +55,59 @@ class FobStorage():
 
         self.filesys = None
 
+        # Optional SQLite3 index of items, see fob_manifest.py
+        self.manifest = None
+        self.manifest_fresh = False
+
         if mode == 'FILE':
             self.setup_filesys(filesys)
         elif mode == 'OBJECT':
             self.setup_cos(bucket)
+
+        if manifest is None:
+            manifest = os.getenv('FOB_MANIFEST', None)
+        if manifest:
+            self.setup_manifest(manifest)
         return None
 
+    def setup_manifest(self, dbname):
+        """ Use manifest to answer item_exists and list_items """
+
+        store = None
+        if self.cos and self.mode == 'OBJECT':
+            store = 'cos:' + self.cos_bucket
+        elif self.filesys and self.mode == 'FILE':
+            store = 'file:' + os.path.abspath(self.filesys)
+
+        if store:
+            self.manifest = FobManifest(dbname, store)
+        return self
+
+    def refresh_manifest(self):
+        """ Catch up with changes made outside of this FobStorage """
+
+        if self.manifest is None:
+            return self
+
+        if self.cos and self.mode == 'OBJECT':
+            self.manifest.refresh_object(self.cos, self.cos_bucket)
+
+        if self.filesys and self.mode == 'FILE':
+            self.manifest.refresh_file(self.filesys)
+
+        self.manifest_fresh = True
+        return self
+
+    def use_manifest(self):
+        """ True if manifest is enabled, refreshing it on first use """
+
+        if self.manifest is None:
+            return False
+
+        if not self.manifest_fresh:
+            self.refresh_manifest()
+        return True
+
     def setup_cos(self, bucket=None):
         """ Setup variables needed to access IBM Cloud Object Storage """
 
@@ -112,13 +167,61 @@ class FobStorage():
         fob_mode = self.mode
 
         if self.cos and fob_mode == 'OBJECT':
-            self.cos.put_object(Key=item_name, Body=bindata,
-                                Bucket=self.cos_bucket)
+            response = self.cos.put_object(Key=item_name, Body=bindata,
+                                           Bucket=self.cos_bucket)
+            if self.manifest:
+                etag = response['ETag'].strip('"')
+                self.manifest.record(item_name, len(bindata), etag,
+                                     time.time())
 
         if self.filesys and fob_mode == 'FILE':
             fullname = os.path.join(self.filesys, item_name)
             with open(fullname, 'wb') as outfile:
                 outfile.write(bindata)
+            if self.manifest:
+                etag = hashlib.md5(bindata).hexdigest()
+                self.record_file(fullname, item_name, etag)
+
+        return self
+
+    def record_file(self, fullname, item_name, etag):
+        """ Add FILE item to manifest, with size and mtime from disk """
+
+        stat = os.stat(fullname)
+        self.manifest.record(item_name, stat.st_size, etag, stat.st_mtime)
+        return self
+
+    def upload_file(self, infile, item_name):
+        """ Upload from open binary file, without reading it all in memory """
+        fob_mode = self.mode
+
+        if self.cos and fob_mode == 'OBJECT':
+            # upload_fileobj uses multipart upload for large files
+            self.cos.upload_fileobj(infile, self.cos_bucket, item_name)
+            if self.manifest:
+                head = self.cos.head_object(Bucket=self.cos_bucket,
+                                            Key=item_name)
+                self.manifest.record(item_name, head['ContentLength'],
+                                     head['ETag'].strip('"'),
+                                     head['LastModified'].timestamp())
+
+        if self.filesys and fob_mode == 'FILE':
+            fullname = os.path.join(self.filesys, item_name)
+            md5 = hashlib.md5()
+            # Write to a hidden temporary file, then rename, so that an
+            # interrupted upload does not leave a partial item behind.
+            partname = os.path.join(self.filesys, '.fob-' + item_name)
+            try:
+                with open(partname, 'wb') as outfile:
+                    for chunk in iter(lambda: infile.read(CHUNK_SIZE), b''):
+                        md5.update(chunk)
+                        outfile.write(chunk)
+            except Exception:
+                os.remove(partname)
+                raise
+            os.replace(partname, fullname)
+            if self.manifest:
+                self.record_file(fullname, item_name, md5.hexdigest())
 
         return self
 
@@ -131,6 +234,9 @@ class FobStorage():
     def item_exists(self, item_name):
         """ Check if item exists """
 
+        if self.use_manifest():
+            return self.manifest.item_exists(item_name)
+
         items = self.list_items(prefix=item_name, limit=1)
         found = False
         if items:
@@ -145,6 +251,9 @@ class FobStorage():
 
         items = []
 
+        if self.use_manifest():
+            return self.manifest.list_items(prefix, suffix, after, limit)
+
         if self.cos and fob_mode == 'OBJECT':
             items = self.list_items_object(prefix, suffix, after, limit)
 
@@ -249,6 +358,40 @@ class FobStorage():
 
         return bindata
 
+    def open_binary(self, item_name, seekable=True):
+        """ Open item for reading, without loading it all in memory
+
+        Use as a context manager.  For OBJECT mode, seekable=True copies
+        the object to a temporary file, as needed by zipfile, otherwise
+        the object is read as a stream.
+        """
+
+        fob_mode = self.mode
+
+        infile = io.BytesIO(b'')
+        try:
+            if self.cos and fob_mode == 'OBJECT':
+                if seekable:
+                    infile = tempfile.TemporaryFile(prefix='fob-')
+                    self.cos.download_fileobj(self.cos_bucket, item_name,
+                                              infile)
+                    infile.seek(0)
+                else:
+                    response = self.cos.get_object(
+                        Key=item_name, Bucket=self.cos_bucket)
+                    infile = closing(response["Body"])
+        except Exception as exc:
+            logger.error(f"307:Exception {exc}")
+
+        if self.filesys and fob_mode == 'FILE':
+            fullname = os.path.join(self.filesys, item_name)
+            try:
+                infile = open(fullname, 'rb')
+            except Exception as exc:
+                logger.error(f"315:Exception {exc}")
+
+        return infile
+
     def download_text(self, item_name, codec='UTF-8'):
         """ Upload text file """
         bindata = self.download_binary(item_name)
@@ -266,6 +409,9 @@ class FobStorage():
             fullname = os.path.join(self.filesys, item_name)
             if os.path.exists(fullname):
                 os.remove(fullname)
+
+        if self.manifest:
+            self.manifest.remove(item_name)
         return self
 
 #################################################
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+File/Object Transfer -- Stream items between FILE and OBJECT storage
+
+Items are read and written a chunk at a time, so a large PDF or ZIP is
+never held in memory, and the MD5 hash code is computed as the bytes go
+by.  OBJECT uploads go through upload_fileobj, which switches to a
+multipart upload for large items.  These functions only touch File/Object
+storage, so they can be run in a thread pool by fob_sync --workers.
+
+The checkpoint records each item copied, so an interrupted fob_sync can
+resume without copying those items again.
+
+Written by Tony Pearson, IBM, 2021
+Licensed under Apache 2.0, see LICENSE for details
+"""
+# System imports
+import hashlib
+import json
+import logging
+import os
+
+# Django and other third-party imports
+
+# Application imports
+from cfc_app.fob_manifest import CHUNK_SIZE
+
+# import pdb; pdb.set_trace()
+logger = logging.getLogger(__name__)
+
+
+class HashingReader():
+    """ File-like wrapper that hashes and counts the bytes read """
+
+    def __init__(self, infile):
+        self.infile = infile
+        self.md5 = hashlib.md5()
+        self.size = 0
+        return None
+
+    def read(self, size=-1):
+        """ Read from the wrapped file, updating hash and size """
+
+        data = self.infile.read(size)
+        self.md5.update(data)
+        self.size += len(data)
+        return data
+
+    def hexdigest(self):
+        """ MD5 of the bytes read so far """
+        return self.md5.hexdigest()
+
+
+def hash_item(fob, item_name):
+    """ Return [hashcode, size] of item, read a chunk at a time """
+
+    with fob.open_binary(item_name, seekable=False) as infile:
+        reader = HashingReader(infile)
+        while reader.read(CHUNK_SIZE):
+            pass
+    return [reader.hexdigest(), reader.size]
+
+
+def copy_item(read_fob, write_fob, item_name):
+    """ Stream item from one FobStorage to another, return [hashcode, size] """
+
+    with read_fob.open_binary(item_name, seekable=False) as infile:
+        reader = HashingReader(infile)
+        write_fob.upload_file(reader, item_name)
+    logger.debug(f"74:Copied {item_name} {reader.size} bytes")
+    return [reader.hexdigest(), reader.size]
+
+
+class TransferCheckpoint():
+    """ Items already copied and their hash codes, one JSON line each """
+
+    def __init__(self, filename):
+        self.filename = filename
+        return None
+
+    def load(self):
+        """ Return {name: hashcode} of items copied before interruption
+
+        The plan skips an item only if its source hash code still
+        matches, so items changed since the checkpoint are copied again.
+        """
+
+        done = {}
+        if os.path.exists(self.filename):
+            with open(self.filename, 'r') as ckfile:
+                for line in ckfile:
+                    try:
+                        entry = json.loads(line)
+                        done[entry['name']] = entry['hashcode']
+                    except (ValueError, KeyError):
+                        logger.warning(f"94:Ignoring checkpoint: {line}")
+            logger.info(f"95:Resuming {self.filename}, "
+                        f"{len(done)} items already copied")
+        return done
+
+    def record(self, item_name, hashcode, size):
+        """ Remember this item has been copied """
+
+        entry = {'name': item_name, 'hashcode': hashcode, 'size': size}
+        with open(self.filename, 'a') as ckfile:
+            ckfile.write(json.dumps(entry) + '\n')
+        return self
+
+    def clear(self):
+        """ Transfer completed, nothing to resume """
+
+        if os.path.exists(self.filename):
+            os.remove(self.filename)
+        return self
+
+# end of module
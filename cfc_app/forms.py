@@ -11,12 +11,30 @@ Licensed under Apache 2.0, see LICENSE for details
 # System imports
 # Django and other third-party imports
 from django import forms
-from cfc_app.models import Location, Impact
+from cfc_app.models import Location, Impact, REFERENCE_DATA
 
 # Application imports
 from .models import Criteria
 
 
+def reference_choices(form):
+    """ Fill location and impact choices from REFERENCE_DATA
+
+    The querysets are still used to check what was selected, but the
+    choices shown are not read from the database for every form.
+    """
+
+    location = form.fields['location']
+    location.choices = [('', location.empty_label)] + [
+        (loc.pk, location.label_from_instance(loc))
+        for loc in REFERENCE_DATA.locations()]
+
+    impacts = form.fields['impacts']
+    impacts.choices = [(imp.pk, impacts.label_from_instance(imp))
+                       for imp in REFERENCE_DATA.impacts()]
+    return form
+
+
 class SearchForm(forms.ModelForm):
     """ Input form to search legislation """
 
@@ -38,6 +56,7 @@ class SearchForm(forms.ModelForm):
     def __init__(self, *args, **kwargs):
         """Specify location and impact pull down menus """
         super().__init__(*args, **kwargs)
+        reference_choices(self)
 
         # if you want to do just one
         self.fields['location'].error_messages = {
@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Unit of work for rows of the cfc_app_hash table.
+
+Hash.find_item_name() and save() issue one query per item, and
+extract_files, get_datasets and fob_sync look up and save hash codes
+for thousands of items in a run.  HashStore reads all the rows for an
+item name prefix and fob_method in one query, keeps changed rows in
+memory, and writes them with bulk_create/bulk_update in one transaction
+when flush() is called, or when batch_size rows are waiting.
+
+Rows are only read and written in the main thread, as with the rest of
+the Django ORM in the management commands.
+
+QueryCounter counts the SQL statements run by a command, shown under
+"-v 2" to check that each command issues a bounded number of queries.
+
+Written by Tony Pearson, IBM, 2021
+Licensed under Apache 2.0, see LICENSE for details
+"""
+
+# System imports
+import logging
+
+# Django and other third-party imports
+from django.conf import settings
+from django.db import connection, transaction
+
+# Application imports
+from cfc_app.models import Hash
+
+# Debug with:  import pdb; pdb.set_trace()
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 500    # rows per bulk query, and pending rows before flush
+FIELDS = ['generated_date', 'hashcode', 'objsize', 'legdesc']
+
+
+class HashStore():
+    """ Hash rows of one fob_method, read and written in bulk """
+
+    def __init__(self, mode=None, batch_size=BATCH_SIZE):
+        self.mode = mode or settings.FOB_METHOD
+        self.batch_size = batch_size
+        self.rows = {}         # item_name => Hash, None if no row
+        self.prefixes = []     # prefixes loaded in full
+        self.dirty = {}        # item_name => Hash to be written
+        self.deleted = set()   # item_names to be deleted
+        return None
+
+    def load(self, prefix=''):
+        """ Read all rows for this item name prefix, in one query """
+
+        if self.loaded(prefix):
+            return self
+
+        records = Hash.objects.filter(fob_method=self.mode)
+        if prefix:
+            records = records.filter(item_name__startswith=prefix)
+        for record in records.iterator():
+            name = record.item_name
+            if name not in self.dirty and name not in self.deleted:
+                self.rows[name] = record
+        self.prefixes.append(prefix)
+        logger.debug(f"67:Loaded hashes {self.mode} {prefix}* "
+                     f"total={len(self.rows)}")
+        return self
+
+    def loaded(self, name):
+        """ Was every row for this item name read by load()? """
+        return any(name.startswith(prefix) for prefix in self.prefixes)
+
+    def find(self, name):
+        """ get row if exists, None if not """
+
+        if name in self.rows:
+            return self.rows[name]
+        if self.loaded(name):
+            return None
+
+        record = Hash.objects.filter(item_name=name,
+                                     fob_method=self.mode).first()
+        self.rows[name] = record
+        return record
+
+    def save(self, record):
+        """ Write this new or changed row on the next flush """
+
+        name = record.item_name
+        if name in self.deleted:
+            # The old row is deleted first, so insert this one again
+            record.pk = None
+        self.rows[name] = record
+        self.dirty[name] = record
+        if self.pending() >= self.batch_size:
+            self.flush()
+        return record
+
+    def update(self, name, generated_date, hashcode, objsize, legdesc=None):
+        """ Create or change the row for name, legdesc only if new """
+
+        record = self.find(name)
+        if record is None:
+            record = Hash(item_name=name, fob_method=self.mode,
+                          legdesc=legdesc)
+        record.generated_date = generated_date
+        record.hashcode = hashcode
+        record.objsize = objsize
+        return self.save(record)
+
+    def delete(self, name):
+        """ Delete the row for name on the next flush """
+
+        self.rows[name] = None
+        self.dirty.pop(name, None)
+        self.deleted.add(name)
+        if self.pending() >= self.batch_size:
+            self.flush()
+        return None
+
+    def pending(self):
+        """ Number of rows waiting to be written """
+        return len(self.dirty) + len(self.deleted)
+
+    def flush(self):
+        """ Write pending rows in one transaction, return count """
+
+        count = self.pending()
+        if count == 0:
+            return 0
+
+        size = self.batch_size
+        deletes = sorted(self.deleted)
+        creates = [rec for rec in self.dirty.values() if rec.pk is None]
+        updates = [rec for rec in self.dirty.values() if rec.pk is not None]
+        with transaction.atomic():
+            for start in range(0, len(deletes), size):
+                Hash.objects.filter(fob_method=self.mode,
+                                    item_name__in=deletes[start:start+size]
+                                    ).delete()
+            Hash.objects.bulk_create(creates, batch_size=size)
+            Hash.objects.bulk_update(updates, FIELDS, batch_size=size)
+
+        # Only some databases return the new primary keys, fetch the
+        # rest so that a later save() of the same row is an UPDATE.
+        self.fetch_ids([rec for rec in creates if rec.pk is None])
+
+        logger.debug(f"148:Hashes {self.mode} deleted={len(deletes)} "
+                     f"created={len(creates)} updated={len(updates)}")
+        self.dirty = {}
+        self.deleted = set()
+        return count
+
+    def fetch_ids(self, records):
+        """ Set primary keys of rows created by bulk_create() """
+
+        size = self.batch_size
+        for start in range(0, len(records), size):
+            batch = {rec.item_name: rec for rec in records[start:start+size]}
+            found = Hash.objects.filter(fob_method=self.mode,
+                                        item_name__in=list(batch))
+            for name, pk in found.values_list('item_name', 'pk'):
+                batch[name].pk = pk
+        return None
+
+
+class QueryCounter():
+    """ Count SQL statements run on the default database connection """
+
+    def __init__(self, name):
+        self.name = name
+        self.count = 0
+        return None
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+    def start(self):
+        """ Start counting queries run by this thread """
+        connection.execute_wrappers.append(self)
+        return self
+
+    def stop(self):
+        """ Stop counting, return number of queries """
+        if self in connection.execute_wrappers:
+            connection.execute_wrappers.remove(self)
+        return self.count
+
+    def show(self, verbosity):
+        """ Log number of queries, print it under -v 2 """
+
+        msg = f"Database queries for {self.name}: {self.count}"
+        logger.info(f"189:{msg}")
+        if verbosity > 1:
+            print(msg)
+        return msg
+
+# end of module
@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Pooled HTTP client with per-host limits, used by DataBundle.
+
+A single requests.Session is shared, so that TCP and TLS connections
+are kept alive between bills fetched from the same state website.
+Each host has its own budget of concurrent requests, so that a slow
+state website does not use up all the workers of extract_files, and
+Legiscan.com API is not flooded.  Requests that fail with 429 or 5xx
+status codes, or connection errors, are retried with exponential
+backoff.  Latency and bytes received are counted for each host.
+
+Written by Tony Pearson, IBM, 2021
+Licensed under Apache 2.0, see LICENSE for details
+"""
+
+# System imports
+import logging
+import threading
+import time
+from urllib.parse import urlparse
+
+# Django and other third-party imports
+import certifi
+from django.conf import settings
+import requests
+from requests.adapters import HTTPAdapter
+import urllib3
+
+# Application imports
+
+# import pdb; pdb.set_trace()
+logger = logging.getLogger(__name__)
+
+DEFAULT_TIMEOUT = 60.0     # seconds to connect or wait for data
+DEFAULT_RETRIES = 3        # retries after the first attempt
+DEFAULT_BACKOFF = 1.0      # seconds, doubled after each retry
+DEFAULT_MAX_BACKOFF = 60.0  # seconds, longest wait before a retry
+DEFAULT_LIMIT = 4          # concurrent requests to any one host
+RETRY_CODES = [429, 500, 502, 503, 504]
+
+# Host names are matched by suffix, so "state.oh.us" covers
+# search-prod.lis.state.oh.us as well.
+HOST_LIMITS = {
+    'api.legiscan.com': 2,
+    'state.oh.us': 4,
+    'azleg.gov': 4,
+}
+
+# Issue 72 add ca_cert verification, bypass for Ohio
+NO_VERIFY = ['state.oh.us']
+
+
+class HostStats():
+    """ Counters for requests made to a single host """
+
+    def __init__(self, host):
+        self.host = host
+        self.requests = 0
+        self.retries = 0
+        self.errors = 0
+        self.bytes = 0
+        self.latency = 0.0
+        return None
+
+    def __repr__(self):
+        """ Representation in display format """
+
+        display = (f"{self.host}: requests={self.requests} "
+                   f"retries={self.retries} errors={self.errors} "
+                   f"bytes={self.bytes} avg={self.average():.3f}s")
+        return display
+
+    def average(self):
+        """ Average latency per request, in seconds """
+
+        avg = 0.0
+        if self.requests:
+            avg = self.latency / self.requests
+        return avg
+
+
+class HttpClient():
+    """ Shared keep-alive HTTP session with per-host concurrency limits """
+
+    def __init__(self, timeout=DEFAULT_TIMEOUT, retries=DEFAULT_RETRIES,
+                 backoff=DEFAULT_BACKOFF, host_limits=None,
+                 default_limit=DEFAULT_LIMIT,
+                 max_backoff=DEFAULT_MAX_BACKOFF):
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.host_limits = dict(HOST_LIMITS)
+        if host_limits:
+            self.host_limits.update(host_limits)
+        self.default_limit = default_limit
+
+        self.ca_cert = certifi.where()
+        pool_size = max([default_limit] + list(self.host_limits.values()))
+        adapter = HTTPAdapter(pool_connections=len(self.host_limits) + 10,
+                              pool_maxsize=pool_size)
+        self.session = requests.Session()
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+        self.lock = threading.Lock()
+        self.budgets = {}
+        self.stats = {}
+        return None
+
+    def host_key(self, url):
+        """ Group host names that share a budget of concurrent requests """
+
+        host = urlparse(url).hostname or ''
+        for suffix in self.host_limits:
+            if host == suffix or host.endswith('.' + suffix):
+                return suffix
+        return host
+
+    def budget(self, key):
+        """ Semaphore limiting concurrent requests for this host """
+
+        with self.lock:
+            if key not in self.budgets:
+                limit = self.host_limits.get(key, self.default_limit)
+                self.budgets[key] = threading.BoundedSemaphore(limit)
+                self.stats[key] = HostStats(key)
+            return self.budgets[key]
+
+    def verify(self, key):
+        """ Decide whether to verify TLS certificate for this host """
+
+        ca_cert = self.ca_cert
+        if key in NO_VERIFY:
+            ca_cert = False
+        return ca_cert
+
+    def get(self, url, params=None):
+        """ GET url, retrying 429/5xx responses with exponential backoff """
+
+        key = self.host_key(url)
+        budget = self.budget(key)
+        stats = self.stats[key]
+        ca_cert = self.verify(key)
+        if not ca_cert:
+            urllib3.disable_warnings()
+
+        delay = min(self.backoff, self.max_backoff)
+        for attempt in range(self.retries + 1):
+            last_try = attempt >= self.retries
+            response = None
+            started = time.monotonic()
+            try:
+                with budget:
+                    response = self.session.get(url, params=params,
+                                                verify=ca_cert,
+                                                timeout=self.timeout)
+            except (requests.ConnectionError, requests.Timeout) as exc:
+                self.count(stats, started, None)
+                if last_try:
+                    raise
+                logger.warning(f"150:Retry {key} after {exc}")
+            else:
+                self.count(stats, started, response)
+                if response.status_code not in RETRY_CODES or last_try:
+                    return response
+                delay = min(max(delay, self.retry_after(response)),
+                            self.max_backoff)
+                logger.warning(f"156:Retry {key} after HTTP "
+                               f"{response.status_code}")
+
+            with self.lock:
+                stats.retries += 1
+            time.sleep(delay)
+            delay = min(delay * 2, self.max_backoff)
+
+        return response
+
+    def count(self, stats, started, response):
+        """ Update latency and bytes counters for this host """
+
+        with self.lock:
+            stats.requests += 1
+            stats.latency += time.monotonic() - started
+            if response is None or not response.ok:
+                stats.errors += 1
+            if response is not None:
+                stats.bytes += len(response.content)
+        return None
+
+    @staticmethod
+    def retry_after(response):
+        """ Honor Retry-After header, if given in seconds
+
+        The caller limits the wait to max_backoff, so that a host asking
+        for an hour does not hold a worker thread that long.
+        """
+
+        seconds = 0.0
+        value = response.headers.get('Retry-After', '')
+        if value.isdigit():
+            seconds = float(value)
+        return seconds
+
+    def host_stats(self):
+        """ Return counters for all hosts contacted so far """
+
+        with self.lock:
+            return [self.stats[key] for key in sorted(self.stats)]
+
+
+_SHARED = None
+_SHARED_LOCK = threading.Lock()
+
+
+def shared_client():
+    """ Return the HttpClient shared by all DataBundle requests
+
+    Options can be set with HTTP_CLIENT in cfc_project/settings.py
+    """
+
+    global _SHARED
+    with _SHARED_LOCK:
+        if _SHARED is None:
+            options = {}
+            if settings.configured:
+                options = getattr(settings, 'HTTP_CLIENT', {})
+            _SHARED = HttpClient(**options)
+        return _SHARED
+
+# end of module
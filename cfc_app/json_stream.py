@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Stream the base64-encoded ZIP out of a Legiscan dataset JSON file.
+
+A dataset for a large session (US Congress, for example) can be several
+hundred MB.  Rather than json.loads() the whole file and decode the
+ZIP in memory, read the JSON in chunks, find the "zip" field, and
+decode it piece by piece into an output file.
+
+Written by Tony Pearson, IBM, 2021
+Licensed under Apache 2.0, see LICENSE for details
+"""
+
+# System imports
+import base64
+import logging
+import re
+
+# Django and other third-party imports
+
+# Application imports
+
+# import pdb; pdb.set_trace()
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 1024 * 1024    # 1 MB of JSON read at a time
+ZIP_REGEX = re.compile(rb'"zip"\s*:\s*"')
+STATUS_REGEX = re.compile(rb'"status"\s*:\s*"(\w*)"')
+JSON_ESCAPE = re.compile(rb'\\(.)', re.DOTALL)
+NOT_BASE64 = re.compile(rb'[^A-Za-z0-9+/=]')
+
+
+def unescape(mop):
+    """ Keep escaped "/", drop other escapes such as newline "\\n" """
+
+    char = mop.group(1)
+    if char != b'/':
+        char = b''
+    return char
+
+
+def extract_zip(json_file, zip_file, chunk_size=CHUNK_SIZE):
+    """ Decode "zip" field of dataset in json_file, write to zip_file
+
+    Returns number of bytes written, or zero if the dataset status is
+    not OK or no "zip" field was found.
+    """
+
+    status, data = None, b''
+    buffer = b''
+    while True:
+        chunk = json_file.read(chunk_size)
+        if not chunk:
+            logger.warning("43:No zip field found in dataset")
+            return 0
+        buffer += chunk
+        if status is None:
+            mop = STATUS_REGEX.search(buffer)
+            if mop:
+                status = mop.group(1)
+        mop = ZIP_REGEX.search(buffer)
+        if mop:
+            data = buffer[mop.end():]
+            break
+        # keep enough to match a field name split across chunks
+        buffer = buffer[-64:]
+
+    if status is not None and status != b'OK':
+        logger.warning(f"58:Dataset status not OK: {status}")
+        return 0
+
+    written, carry, escape, last = 0, b'', b'', False
+    while True:
+        end = data.find(b'"')
+        if end >= 0:
+            data, last = data[:end], True
+
+        # An escape sequence may be split across chunks
+        data = escape + data
+        escape = b''
+        if not last and data.endswith(b'\\'):
+            data, escape = data[:-1], b'\\'
+
+        # JSON may escape "/" as "\/", drop anything not base64
+        data = JSON_ESCAPE.sub(unescape, data)
+        data = carry + NOT_BASE64.sub(b'', data)
+        cut = len(data)
+        if not last:
+            # decode only complete 4-character groups, carry the rest
+            cut = len(data) - (len(data) % 4)
+
+        bindata = base64.b64decode(data[:cut])
+        zip_file.write(bindata)
+        written += len(bindata)
+        if last:
+            break
+
+        carry = data[cut:]
+        data = json_file.read(chunk_size)
+        if not data:
+            last = True
+
+    return written
+
+# end of module
@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Classify the impact of legislation from its extracted text.
+
+These functions do not touch the database or File/Object storage, so
+they can be run in a separate process by analyze_text --workers.
+
+The IBM Watson Natural Language Understanding API is used for this.
+See http://watson-developer-cloud.github.io/python-sdk/v3.0.2/apis/
+         ibm_watson.natural_language_understanding_v1.html for details.
+
+Written Shilpi Bhattacharyya and Tony Pearson, IBM, 2020
+Licensed under Apache 2.0, see LICENSE for details
+"""
+
+# System imports
+import logging
+import os
+import re
+
+# Django and other third-party imports
+from ibm_watson import NaturalLanguageUnderstandingV1
+from ibm_cloud_sdk_core.authenticators import IAMAuthenticator
+
+import ibm_watson.natural_language_understanding_v1 as NLU
+
+# Application imports
+from cfc_app.Oneline import Oneline
+from cfc_app.warm_state import shared_wordmap
+
+# Debug with:  import pdb; pdb.set_trace()
+logger = logging.getLogger(__name__)
+
+# Constants for IBM Watson NLU credentials in Environment Variables
+NLU_APIKEY = os.getenv('NLU_APIKEY', None)
+NLU_SERVICE_URL = os.getenv('NLU_SERVICE_URL', None)
+
+RLIMIT = 10   # number of phrases to be returned by IBM Watson NLU
+NLUST = "(NLU)"
+MAPST = "(MAP)"
+BOTH_REGEX = re.compile("[(]NLU[)](.*)[(]MAP[)](.*)")
+NLU_REGEX = re.compile("[(]NLU[)](.*)")
+MAP_REGEX = re.compile("[(]MAP[)](.*)")
+
+
+def relevance_nlu(text):
+    """ return top impact areas from extracted text using Watson NLU """
+
+    authenticator = IAMAuthenticator(NLU_APIKEY)
+    nlup = NaturalLanguageUnderstandingV1(
+        version='2019-07-12', authenticator=authenticator)
+
+    nlup.set_service_url(NLU_SERVICE_URL)
+
+    tokens = NLU.SyntaxOptionsTokens(lemma=True, part_of_speech=True)
+    syntax = NLU.SyntaxOptions(tokens=tokens, sentences=True)
+    features = NLU.Features(categories=NLU.CategoriesOptions(limit=RLIMIT),
+                            sentiment=NLU.SentimentOptions(),
+                            concepts=NLU.ConceptsOptions(limit=RLIMIT),
+                            keywords=NLU.KeywordsOptions(sentiment=True,
+                                                         limit=10),
+                            syntax=syntax)
+
+    response = nlup.analyze(features, text=text, language='en')
+
+    result = response.get_result()
+    concept = result.get("concepts")
+    return concept
+
+
+def format_rel(rel_start, revlist):
+    """ Format relevant words found for this bill """
+
+    rel, connector = rel_start, ''
+    for rev in revlist:
+        rel += connector + "'{}' => '{}'".format(rev[0], rev[1])
+        if rev[1] == "Unknown":
+            logger.debug(f'304:"{rev[0]}", "{rev[1]}"')
+        connector = ", "
+
+    logger.debug(f"303:{rel_start}: {rel}")
+
+    return rel
+
+
+def classify_impact(concept, w_map, impact_list):
+    """ Classify the impact based on relevant terms """
+
+    impact_chosen = 'None'
+    revlist = []
+    for rel in concept:
+        term = rel['text'].strip()
+        if term in w_map:
+            revlist.append([term, w_map[term]])
+        else:
+            revlist.append([term, 'Unknown'])
+
+    # Choose the most relevant impact.
+    for rel in revlist:
+        impact = rel[1]
+        if impact_chosen not in impact_list:
+            impact_chosen = impact
+
+    if impact_chosen not in impact_list:
+        impact_chosen = 'None'
+
+    return revlist, impact_chosen
+
+
+def prior_analysis(relevance, iname):
+    """ Split relevance saved by a previous run into NLU and MAP parts
+
+    Returns [rel_nlu, rel_map, impact_nlu, impact_map], with empty
+    strings for any analysis not found.
+    """
+
+    impact_nlu, impact_map = "", ""
+    rel_nlu, rel_map = "", ""
+    if iname is not None and relevance is not None:
+        mop1 = BOTH_REGEX.search(relevance)
+        mop2 = NLU_REGEX.search(relevance)
+        mop3 = MAP_REGEX.search(relevance)
+        if mop1:
+            rel_nlu = NLUST + mop1.group(1)
+            rel_map = MAPST + mop1.group(2)
+            impact_nlu = iname
+            impact_map = iname
+        elif mop2:
+            rel_nlu = NLUST + mop2.group(1)
+            impact_nlu = iname
+        elif mop3:
+            rel_map = MAPST + mop3.group(1)
+            impact_map = iname
+    return [rel_nlu, rel_map, impact_nlu, impact_map]
+
+
+def analyze_legislation(filename, extracted_lines, prior, womp,
+                        use_api=False, compare=False):
+    """ Choose the impact of a bill
+
+    Returns [relevance, impact_chosen, api_failed].  The relevance is an
+    empty string if no relevant terms were found.  api_failed is True
+    if IBM Watson NLU was requested, but failed.
+    """
+
+    extracted_text = Oneline.join_lines(extracted_lines)
+    extracted_text = extracted_text.replace('"', r'|').replace("'", r"|")
+
+    rel_nlu, rel_map, impact_nlu, impact_map = prior
+    api_failed = False
+    if use_api:
+        try:
+            concept_nlu = relevance_nlu(extracted_text)
+            revlist, impact_nlu = classify_impact(concept_nlu, womp.wordmap,
+                                                  womp.impact_list)
+            rel_nlu = format_rel(NLUST, revlist)
+        except Exception as exc:
+            logger.error(f"IBM Watson NLU failed, "
+                         f"disabling --api: {exc}")
+            use_api = False
+            api_failed = True
+
+    if (not use_api) or compare:
+        concept_map = womp.relevance(extracted_text)
+        revlist, impact_map = classify_impact(concept_map, womp.wordmap,
+                                              womp.impact_list)
+        rel_map = format_rel(MAPST, revlist)
+
+    rel = rel_nlu + rel_map
+    if (impact_nlu not in ["", "None"]
+            and (impact_map not in ["", "None"])):
+        if impact_nlu != impact_map:
+            logger.debug(f"254:Impacts don't match {filename} "
+                         f"NLU={impact_nlu} MAP={impact_map}")
+        else:
+            logger.debug(f"257:Impacts match {filename} "
+                         f"NLU={impact_nlu} MAP={impact_map}")
+    if impact_nlu != "":
+        imp_chosen = impact_nlu
+    elif impact_map != "":
+        imp_chosen = impact_map
+    else:
+        imp_chosen = "None"
+
+    return [rel, imp_chosen, api_failed]
+
+
+def analyze_source(filename, extracted_lines, prior, impact_list,
+                   use_api=False, compare=False):
+    """ Worker process: analyze_legislation() with a cached word map """
+
+    womp = shared_wordmap(impact_list)
+    return analyze_legislation(filename, extracted_lines, prior, womp,
+                               use_api=use_api, compare=compare)
+
+# end of module
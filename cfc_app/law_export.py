@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Stream all legislation in the cfc_app_law table, for staff download.
+
+The laws are read with one query, joined with their location and impact
+names, a chunk of rows at a time, and written out as CSV or JSON Lines
+as they are read, optionally compressed with gzip.  Memory use does not
+grow with the number of laws, so the full table can be downloaded from
+a web worker.
+
+Written by Tony Pearson, IBM, 2021
+Licensed under Apache 2.0, see LICENSE for details
+"""
+
+# System imports
+import csv
+import json
+import logging
+import zlib
+
+# Django and other third-party imports
+
+# Application imports
+from cfc_app.models import Law
+
+# Debug with:  import pdb; pdb.set_trace()
+logger = logging.getLogger(__name__)
+
+FIELDS = ['key', 'location', 'impact', 'title', 'summary']
+COLUMNS = ['key', 'location__longname', 'impact__iname', 'title', 'summary']
+CHUNK_ROWS = 2000          # rows fetched from the database at a time
+CHUNK_BYTES = 64 * 1024    # characters sent to the client at a time
+
+# name => [content type, file extension]
+FORMATS = {'csv': ['text/csv', 'csv'],
+           'jsonl': ['application/x-ndjson', 'jsonl']}
+
+
+class Echo():
+    """ File-like object for csv.writer that returns what is written """
+
+    @staticmethod
+    def write(value):
+        """ Return the line instead of saving it """
+        return value
+
+
+def law_rows(chunk_size=CHUNK_ROWS):
+    """ Yield [key, location, impact, title, summary] for every law """
+
+    laws = Law.objects.values_list(*COLUMNS).order_by('key')
+    yield from laws.iterator(chunk_size=chunk_size)
+
+
+def csv_lines(rows):
+    """ Yield header and one CSV line for each row """
+
+    writer = csv.writer(Echo())
+    yield writer.writerow(FIELDS)
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def jsonl_lines(rows):
+    """ Yield one JSON object per line for each row """
+
+    for row in rows:
+        yield json.dumps(dict(zip(FIELDS, row))) + '\n'
+
+
+def batched(lines, size=CHUNK_BYTES):
+    """ Join lines into chunks of about size characters """
+
+    chunk, length = [], 0
+    for line in lines:
+        chunk.append(line)
+        length += len(line)
+        if length >= size:
+            yield ''.join(chunk)
+            chunk, length = [], 0
+    if chunk:
+        yield ''.join(chunk)
+
+
+def gzip_chunks(chunks):
+    """ Compress text chunks into a gzip stream """
+
+    compressor = zlib.compressobj(wbits=31)    # 16 + 15 for gzip header
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode('UTF-8'))
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def export_laws(fmt='csv', compress=False):
+    """ Return [content, content type, filename] for this format """
+
+    content_type, extension = FORMATS[fmt]
+    filename = f"lawdump.{extension}"
+
+    if fmt == 'jsonl':
+        lines = jsonl_lines(law_rows())
+    else:
+        lines = csv_lines(law_rows())
+
+    content = batched(lines)
+    if compress:
+        content = gzip_chunks(content)
+        content_type = 'application/gzip'
+        filename += '.gz'
+    logger.debug(f"111:Exporting {filename}")
+    return [content, content_type, filename]
+
+# end of module
@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Save analyzed legislation into the cfc_app_law table in batches.
+
+Instead of several queries for each bill, Location and Impact records
+are looked up in REFERENCE_DATA, kept in memory, and each batch of laws
+is written with one bulk_create() and one bulk_update() inside a single
+transaction.  Bulk saves do not send post_save signals, so each batch
+bumps the Law DataVersion itself, and saved search results are rebuilt.
+Law.date_changed is set for new laws, and for existing laws only when
+their contents change, so the weekly digest lists only those.
+
+Written by Tony Pearson, IBM, 2021
+Licensed under Apache 2.0, see LICENSE for details
+"""
+
+# System imports
+import logging
+import time
+
+# Django and other third-party imports
+from django.db import transaction
+from django.utils import timezone
+
+# Application imports
+from cfc_app.legiscan_api import LEGISCAN_ID
+from cfc_app.models import Impact, Law, DataVersion, LAW_DATA
+from cfc_app.models import REFERENCE_DATA
+
+# Debug with:  import pdb; pdb.set_trace()
+logger = logging.getLogger(__name__)
+
+LAW_FIELDS = ['bill_id', 'doc_date', 'title', 'summary', 'location',
+              'impact', 'relevance', 'cite_url']
+SAVE_FIELDS = LAW_FIELDS + ['date_changed']
+
+
+def law_contents(law):
+    """ Values of the fields saved by LawWriter, to detect changes """
+    return [getattr(law, Law._meta.get_field(name).attname)
+            for name in LAW_FIELDS]
+
+
+class LawWriter():
+    """ Collect Law records and save them in batches """
+
+    def __init__(self, batch_size=100):
+        self.batch_size = max(batch_size, 1)
+        self.pending = {}
+        self.created = 0
+        self.updated = 0
+        self.start = time.monotonic()
+
+        state_id_table = {}
+        for state_id in LEGISCAN_ID:
+            state = LEGISCAN_ID[state_id]['code']
+            state_id_table[state] = state_id
+        self.id_table = state_id_table
+        return None
+
+    def location(self, state):
+        """ Find the Location for this state, None if not known """
+
+        state_id = self.id_table.get(state)
+        if not state_id:
+            return None
+
+        return REFERENCE_DATA.legiscan_location(state_id)
+
+    def impact(self, iname):
+        """ Find the Impact with this name """
+
+        impact = REFERENCE_DATA.impact(iname)
+        if impact is None:
+            raise Impact.DoesNotExist(f"Impact not found: {iname}")
+        return impact
+
+    def save(self, key, header, rel, impact_chosen):
+        """ Queue law to be saved, flush if the batch is full """
+
+        self.pending[key] = [header, rel, impact_chosen]
+        if len(self.pending) >= self.batch_size:
+            self.flush()
+        return None
+
+    def flush(self):
+        """ Save all pending laws in one transaction """
+
+        if not self.pending:
+            return None
+
+        now = timezone.now()
+        with transaction.atomic():
+            existing = Law.objects.in_bulk(list(self.pending),
+                                           field_name='key')
+            new_laws, old_laws = [], []
+            for key, entry in self.pending.items():
+                header, rel, impact_chosen = entry
+                if key in existing:
+                    law = existing[key]
+                    old_laws.append(law)
+                    result = 'Updated'
+                else:
+                    law = Law(key=key)
+                    new_laws.append(law)
+                    result = 'Created'
+                before = law_contents(law)
+                self.fill_law(law, header, rel, impact_chosen)
+                if law_contents(law) != before:
+                    law.date_changed = now
+                logger.info(f"390:Database record {result} for {key}")
+
+            Law.objects.bulk_create(new_laws)
+            Law.objects.bulk_update(old_laws, SAVE_FIELDS)
+            DataVersion.bump(LAW_DATA)
+
+        self.created += len(new_laws)
+        self.updated += len(old_laws)
+        self.pending = {}
+        return None
+
+    def fill_law(self, law, header, rel, impact_chosen):
+        """ Set fields of law from text file header and analysis """
+
+        law.bill_id = header['BILLID']
+        law.doc_date = header['DOCDATE']
+        if len(header['TITLE']) > 200 or len(header['SUMMARY']) > 1000:
+            logger.debug(f'358:"Too Long: {header}"')
+        law.title = header['TITLE'][:199]
+        law.summary = header['SUMMARY'][:999]
+
+        loc = self.location(law.key[:2])
+        if loc is not None:
+            law.location = loc
+
+        law.impact = self.impact(impact_chosen)
+        law.relevance = rel
+        if 'CITE' in header:
+            law.cite_url = header['CITE']
+        return law
+
+    @property
+    def rows(self):
+        """ Number of laws saved so far """
+        return self.created + self.updated
+
+    def rate(self):
+        """ Laws saved per second """
+
+        seconds = time.monotonic() - self.start
+        rows_per_sec = 0.0
+        if seconds > 0:
+            rows_per_sec = self.rows / seconds
+        return rows_per_sec
+
+# end of module
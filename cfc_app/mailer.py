@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Send search results by email from a django-q task, not the web request.
+
+The sendmail view saves a MailJob and returns its id at once, so the
+gunicorn worker is not held waiting on the SMTP server.  The task
+cfc_app.tasks.send_queued_mail claims a batch of queued jobs and sends
+them all over one connection to the email backend.  A message that
+fails is put back in the queue to be tried again later, up to
+MAIL_QUEUE['attempts'] times, then marked failed.  A job left sending
+by a task that was killed is claimed again after MAIL_QUEUE['lease']
+seconds, which counts as one of its attempts.
+
+Written by Tony Pearson, IBM, 2021
+Licensed under Apache 2.0, see LICENSE for details
+"""
+
+# System imports
+from datetime import timedelta
+import logging
+
+# Django and other third-party imports
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.db import transaction
+from django.db.models import F, Q
+from django.template.loader import render_to_string
+from django.utils import timezone
+from django_q.models import Schedule
+from django_q.tasks import async_task, schedule
+
+# Application imports
+from cfc_app.models import MailJob
+from cfc_app.search import search_results, result_laws
+
+# Debug with:  import pdb; pdb.set_trace()
+logger = logging.getLogger(__name__)
+
+MAIL_FROM = 'CFCapp@ibm.com'
+MAIL_TASK = 'cfc_app.tasks.send_queued_mail'
+SMTP_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
+LEASE_ERROR = 'Not sent within lease'
+
+
+def queue_options():
+    """ {'batch': N, 'attempts': N, 'retry': secs, 'lease': secs} """
+
+    options = {'batch': 50, 'attempts': 3, 'retry': 300, 'lease': 900}
+    options.update(getattr(settings, 'MAIL_QUEUE', {}))
+    return options
+
+
+def mail_configured():
+    """ Can mail be sent?  The SMTP backend needs EMAIL_HOST """
+    return settings.EMAIL_BACKEND != SMTP_BACKEND or bool(settings.EMAIL_HOST)
+
+
+def recipient_format(first, last, addr):
+    """ Format receiption with email address and name if available """
+    if first == '' and last == '':
+        rec = addr
+    else:
+        rec = first+' '+last+' <'+addr+'>'
+    return rec
+
+
+def results_message(job):
+    """ Email of the search results for a MailJob, see send_pending """
+
+    gen_date = job.date_added.strftime("%B %d, %Y")
+    result = search_results(job.criteria)
+    laws_found = [{'key': law.key,
+                   'location': law.location.longname,
+                   'impact': law.impact.iname,
+                   'title': law.title,
+                   'summary': law.summary}
+                  for law in result_laws(result.id_list())]
+
+    context = {'laws_found': laws_found,
+               'gen_date': gen_date,
+               'sender': job.user}
+    text_version = render_to_string(template_name='email-results.txt',
+                                    context=context)
+    html_version = render_to_string(template_name='email-results.html',
+                                    context=context)
+
+    message = EmailMultiAlternatives(
+        f"{settings.APP_NAME} --Search Results-- {gen_date}",
+        text_version, MAIL_FROM, [job.recipient])
+    message.attach_alternative(html_version, 'text/html')
+    return message
+
+
+def enqueue(delay=0):
+    """ Start a task to send queued mail, now or after delay seconds """
+
+    if delay > 0:
+        next_run = timezone.now() + timedelta(seconds=delay)
+        schedule(MAIL_TASK, schedule_type=Schedule.ONCE, repeats=1,
+                 next_run=next_run)
+        logger.debug(f"62:Mail task scheduled for {next_run}")
+    else:
+        async_task(MAIL_TASK)
+    return None
+
+
+def queue_mail(user, criteria, recipient):
+    """ Save a MailJob for these results, and start a task to send it """
+
+    job = MailJob(user=user, criteria=criteria, recipient=recipient)
+    job.save()
+    logger.info(f"73:Mail {job.id} queued for {recipient}")
+
+    # Start the task once the job is saved, so the worker can find it
+    transaction.on_commit(enqueue)
+    return job
+
+
+def claim(batch_size, options):
+    """ Mark up to batch_size queued jobs as sending, and return them
+
+    Jobs claimed more than options['lease'] seconds ago that are still
+    sending were left by a task that did not finish.  That counts as an
+    attempt, so they are claimed again, or marked failed after the last
+    attempt.
+    """
+
+    now = timezone.now()
+    ready = Q(status=MailJob.QUEUED) & (Q(retry_at__isnull=True)
+                                        | Q(retry_at__lte=now))
+    stale = Q(status=MailJob.SENDING) & (
+        Q(claimed_at__isnull=True)
+        | Q(claimed_at__lt=now - timedelta(seconds=options['lease'])))
+    with transaction.atomic():
+        expired = MailJob.objects.filter(
+            stale, attempts__gte=options['attempts'] - 1).update(
+                status=MailJob.FAILED, attempts=F('attempts') + 1,
+                error=LEASE_ERROR)
+        if expired:
+            logger.warning(f"95:Mail not sent within lease: {expired}")
+
+        jobs = MailJob.objects.select_for_update(skip_locked=True)
+        jobs = jobs.filter(ready | stale).order_by('id')
+        jobs = list(jobs.select_related('user', 'criteria')[:batch_size])
+        ids = [job.id for job in jobs]
+        MailJob.objects.filter(id__in=ids, status=MailJob.SENDING).update(
+            attempts=F('attempts') + 1, error=LEASE_ERROR)
+        MailJob.objects.filter(id__in=ids).update(
+            status=MailJob.SENDING, claimed_at=now)
+
+    for job in jobs:
+        if job.status == MailJob.SENDING:
+            job.attempts += 1
+            job.error = LEASE_ERROR
+        job.status = MailJob.SENDING
+    return jobs
+
+
+def failed(job, exc, options):
+    """ Put job back in the queue, or mark it failed after last attempt """
+
+    job.attempts += 1
+    job.error = str(exc)[:200]
+    if job.attempts < options['attempts']:
+        job.status = MailJob.QUEUED
+        job.retry_at = timezone.now() + timedelta(seconds=options['retry'])
+    else:
+        job.status = MailJob.FAILED
+    logger.warning(f"102:Mail {job.id} attempt {job.attempts} failed: {exc}")
+    return None
+
+
+def send_pending(make_message, batch_size=None):
+    """ Send a batch of queued jobs over one connection
+
+    make_message(job) returns the EmailMessage for a job.  Returns the
+    number of messages sent.  Another task is started if more jobs are
+    waiting, or scheduled if some are to be tried again later.
+    """
+
+    options = queue_options()
+    batch_size = batch_size or options['batch']
+    jobs = claim(batch_size, options)
+    if not jobs:
+        return 0
+
+    sent = 0
+    connection = get_connection(fail_silently=False)
+    try:
+        connection.open()
+    except Exception as exc:
+        for job in jobs:
+            failed(job, exc, options)
+    else:
+        try:
+            for job in jobs:
+                try:
+                    connection.send_messages([make_message(job)])
+                except Exception as exc:
+                    failed(job, exc, options)
+                else:
+                    job.status = MailJob.SENT
+                    job.date_sent = timezone.now()
+                    job.error = ''
+                    sent += 1
+        finally:
+            connection.close()
+
+    MailJob.objects.bulk_update(jobs, ['status', 'attempts', 'error',
+                                       'retry_at', 'date_sent'])
+    logger.info(f"148:Mail sent: {sent} of {len(jobs)}")
+
+    if len(jobs) == batch_size:
+        enqueue()           # there may be more waiting
+    if any(job.status == MailJob.QUEUED for job in jobs):
+        enqueue(delay=options['retry'])
+    return sent
+
+# end of module
@@ -21,45 +21,33 @@ Licensed under Apache 2.0, see LICENSE for details
 
 # System imports
 import logging
-import os
 import re
+import time
 
 # Django and other third-party imports
 from django.core.management.base import BaseCommand, CommandError
 from django.conf import settings
-from ibm_watson import NaturalLanguageUnderstandingV1
-from ibm_cloud_sdk_core.authenticators import IAMAuthenticator
-
-import ibm_watson.natural_language_understanding_v1 as NLU
 
 # Application imports
 from cfc_app.fob_storage import FobStorage
+from cfc_app.law_analysis import (analyze_legislation, analyze_source,
+                                  prior_analysis)
+from cfc_app.law_writer import LawWriter
 from cfc_app.legiscan_api import LEGISCAN_ID
 from cfc_app.log_time import LogTime
-from cfc_app.models import Location, Impact, Law
+from cfc_app.models import Law, REFERENCE_DATA
 from cfc_app.Oneline import Oneline
 from cfc_app.show_progress import ShowProgress
-from cfc_app.word_map import WordMap
+from cfc_app.warm_state import shared_wordmap
+from cfc_app.work_pool import WorkPool
 
 # Debug with:  import pdb; pdb.set_trace()
 logger = logging.getLogger(__name__)
 
-# Constants for IBM Watson NLU credentials in Environment Variables
-NLU_APIKEY = os.getenv('NLU_APIKEY', None)
-NLU_SERVICE_URL = os.getenv('NLU_SERVICE_URL', None)
-
 NameRegex = re.compile(r"^(\w\w-\w*-Y\d*).")
 keyRegex = re.compile(r"^\w\w-(.*)-")
 
 
-RLIMIT = 10   # number of phrases to be returned by IBM Watson NLU
-NLUST = "(NLU)"
-MAPST = "(MAP)"
-BOTH_REGEX = re.compile("[(]NLU[)](.*)[(]MAP[)](.*)")
-NLU_REGEX = re.compile("[(]NLU[)](.*)")
-MAP_REGEX = re.compile("[(]MAP[)](.*)")
-
-
 class AnalyzeTextError(CommandError):
     """ customized error for this command. """
     pass
@@ -84,11 +72,12 @@ class Command(BaseCommand):
         self.use_api = False
         self.after = None
         self.limit = 10
-        state_id_table = {}
-        for state_id in LEGISCAN_ID:
-            state = LEGISCAN_ID[state_id]['code']
-            state_id_table[state] = state_id
-        self.id_table = state_id_table
+        self.workers = 0
+        self.batch = 100
+        self.pool = None
+        self.writer = None
+        self.priors = {}
+        self.dot = ShowProgress()
 
         self.verbosity = 1
         self.skip = False
@@ -109,6 +98,10 @@ class Command(BaseCommand):
         parser.add_argument("--after", help="Start after this item name")
         parser.add_argument("--limit", type=int, default=self.limit,
                             help="number of entries to analyze per state")
+        parser.add_argument("--workers", type=int, default=self.workers,
+                            help="Number of parallel analysis workers")
+        parser.add_argument("--batch", type=int, default=self.batch,
+                            help="Number of laws saved per transaction")
 
         return None
 
@@ -128,6 +121,8 @@ class Command(BaseCommand):
             self.compare = True
 
         self.limit = options['limit']
+        self.workers = max(options['workers'], 0)
+        self.batch = max(options['batch'], 1)
 
         if options['api']:
             self.use_api = True
@@ -135,24 +130,39 @@ class Command(BaseCommand):
         self.verbosity = options['verbosity']
         logger.debug(f"134:Options {options}")
 
-        impacts = Impact.objects.all().exclude(iname='None')
-        impact_list = []
-        for imp in impacts:
-            impact_list.append(imp.iname)
+        impact_list = [imp.iname for imp in REFERENCE_DATA.impacts()]
         self.impact_list = impact_list
 
-        self.womp = WordMap(RLIMIT)
-        self.womp.load_csv(impact_list)
+        self.womp = shared_wordmap(impact_list)
+
+        self.writer = LawWriter(self.batch)
+        start = time.monotonic()
+        if self.workers > 0:
+            self.pool = WorkPool(self.workers, self.fetch_text,
+                                 analyze_source, self.finish_text)
+        try:
+            self.process_locations(options['state'])
+        finally:
+            if self.pool:
+                self.pool.close(cancel=True)
+                self.pool = None
+
+        self.show_rate(time.monotonic() - start)
+        timing.end_time(options['verbosity'])
+        return None
+
+    def process_locations(self, only_state):
+        """ Analyze text files for each location with a Legiscan_id """
 
-        locations = Location.objects.filter(legiscan_id__gt=0)
-        locations = locations.order_by('hierarchy')
+        locations = [loc for loc in REFERENCE_DATA.locations()
+                     if loc.legiscan_id > 0]
         for loc in locations:
             state_id = loc.legiscan_id
             if state_id > 0:
                 state = LEGISCAN_ID[state_id]['code']
 
-            if options['state']:
-                if state != options['state']:
+            if only_state:
+                if state != only_state:
                     continue
 
             logger.info(f"150:Processing: {loc.longname} ({state})")
@@ -165,217 +175,145 @@ class Command(BaseCommand):
                 logger.error(err_msg, exc_info=True)
                 raise AnalyzeTextError(err_msg) from exc
 
-        timing.end_time(options['verbosity'])
         return None
 
+    def show_rate(self, seconds):
+        """ Report number of laws saved per second """
+
+        rate = 0.0
+        if seconds > 0:
+            rate = self.writer.rows / seconds
+        rate_msg = (f"Laws saved: {self.writer.rows} "
+                    f"(created {self.writer.created}, "
+                    f"updated {self.writer.updated}) in "
+                    f"{seconds:.1f} seconds ({rate:.2f} rows/sec)")
+        logger.info(f"186:{rate_msg}")
+        if self.verbosity:
+            print(rate_msg)
+        return None
+
+    def limit_reached(self):
+        """ Check --limit, counting bills still in the worker pool """
+
+        if self.pool:
+            self.count += self.pool.poll()
+            self.count += self.pool.wait_below(self.pool.backlog)
+            if self.limit > 0:
+                while (self.pool.pending
+                       and self.count + self.pool.pending >= self.limit):
+                    self.count += self.pool.poll(block=True)
+                return self.count + self.pool.pending >= self.limit
+
+        return self.limit > 0 and self.count >= self.limit
+
+    def load_priors(self, state):
+        """ Read relevance of laws analyzed by previous runs """
+
+        priors = {}
+        if self.skip or self.compare:
+            laws = Law.objects.filter(key__startswith=state)
+            laws = laws.values_list('key', 'relevance', 'impact__iname')
+            for key, relevance, iname in laws:
+                priors[key] = prior_analysis(relevance, iname)
+        return priors
+
     def process_state(self, state):
         """ process specific state of United States """
 
         cursor = self.after
         items = self.fob.list_items(prefix=state, suffix=".txt",
                                     after=cursor, limit=0)
+        self.priors = self.load_priors(state)
 
-        dot = ShowProgress()
+        self.dot = ShowProgress()
         self.count = 0
         items.sort()
         for filename in items:
+            if self.limit_reached():
+                break
+
+            key = filename.replace(".txt", "")
+            prior = self.priors.get(key, prior_analysis(None, None))
+            if self.skip and (prior[2] != ""):
+                logger.debug(f"209:Skipping {filename}")
+                continue
+
+            if self.pool:
+                self.pool.submit({'filename': filename, 'prior': prior})
+                continue
+
             textdata = self.fob.download_text(filename)
 
             header = Oneline.Oneline_parse_header(textdata)
             if 'BILLID' in header:
                 bill_id = header['BILLID']
                 logger.debug(f"231:bill_id={bill_id} {filename}")
-                self.process_legislation(filename, textdata, header)
+                self.process_legislation(filename, textdata, header, prior)
                 if self.verbosity:
-                    dot.show()
-                if self.limit > 0 and self.count >= self.limit:
-                    break
+                    self.dot.show()
             else:
                 logger.info(f"238:No bill_id found, removing: {filename}")
                 self.fob.remove_item(filename)
                 continue
 
-        dot.end()
+        # Finish any bills for this state still in the worker pool
+        if self.pool:
+            self.count += self.pool.drain()
+        self.writer.flush()
+
+        self.dot.end()
         return None
 
-    def process_legislation(self, filename, extracted_lines, header):
+    def process_legislation(self, filename, extracted_lines, header, prior):
         """ Process individual bill """
 
-        extracted_text = Oneline.join_lines(extracted_lines)
-        extracted_text = extracted_text.replace('"', r'|').replace("'", r"|")
-
-        skipping = False
-        key = filename.replace(".txt", "")
-        impact_nlu, impact_map = "", ""
-        rel_nlu, rel_map = "", ""
-        if self.skip or self.compare:
-            logger.debug(f"212:Reading {key}")
-            law = None
-            laws = Law.objects.filter(key=key)
-            if laws is not None and len(laws)>0:
-                law = laws[0]
-            if (law is not None
-                    and (law.impact is not None)
-                    and law.relevance is not None):
-                mop1 = BOTH_REGEX.search(law.relevance)
-                mop2 = NLU_REGEX.search(law.relevance)
-                mop3 = MAP_REGEX.search(law.relevance)
-                if mop1:
-                    rel_nlu = NLUST + mop1.group(1)
-                    rel_map = MAPST + mop1.group(2)
-                    impact_nlu = law.impact.iname
-                    impact_map = law.impact.iname
-                elif mop2:
-                    rel_nlu = NLUST + mop2.group(1)
-                    impact_nlu = law.impact.iname
-                elif mop3:
-                    rel_map = MAPST + mop3.group(1)
-                    impact_map = law.impact.iname
-                if self.skip and (impact_nlu != ""):
-                    logger.debug(f"209:Skipping {filename}")
-                    skipping = True
-
-        if not skipping:
-            self.count += 1
-            if self.use_api:
-                try:
-                    concept_nlu = self.relevance_nlu(extracted_text)
-                    revlist, impact_nlu = self.classify_impact(concept_nlu)
-                    rel_nlu = self.format_rel(NLUST, revlist)
-                except Exception as exc:
-                    logger.error(f"IBM Watson NLU failed, "
-                                 f"disabling --api: {exc}")
-                    self.use_api = False
-
-            if (not self.use_api) or self.compare:
-                concept_map = self.womp.relevance(extracted_text)
-                revlist, impact_map = self.classify_impact(concept_map)
-                rel_map = self.format_rel(MAPST, revlist)
-
-            rel = rel_nlu + rel_map
-            if (impact_nlu not in ["", "None"]
-                    and (impact_map not in ["", "None"])):
-                if impact_nlu != impact_map:
-                    logger.debug(f"254:Impacts don't match {filename} "
-                                 f"NLU={impact_nlu} MAP={impact_map}")
-                else:
-                    logger.debug(f"257:Impacts match {filename} "
-                                 f"NLU={impact_nlu} MAP={impact_map}")
-            if impact_nlu != "":
-                imp_chosen = impact_nlu
-            elif impact_map != "":
-                imp_chosen = impact_map
-            else:
-                imp_chosen = "None"
-
-            if rel:
-                logger.debug(f"229:Filename {filename} Impact={imp_chosen}")
-                self.save_law(key, header, rel, imp_chosen)
-
+        self.count += 1
+        rel, imp_chosen, api_failed = analyze_legislation(
+            filename, extracted_lines, prior, self.womp,
+            use_api=self.use_api, compare=self.compare)
+        self.save_result(filename, header, rel, imp_chosen, api_failed)
         return None
 
-    @staticmethod
-    def relevance_nlu(text):
-        """ return top impact areas from extracted text using Watson NLU """
-
-        authenticator = IAMAuthenticator(NLU_APIKEY)
-        nlup = NaturalLanguageUnderstandingV1(
-            version='2019-07-12', authenticator=authenticator)
+    def fetch_text(self, job):
+        """ Worker thread: download text file and parse its header """
 
-        nlup.set_service_url(NLU_SERVICE_URL)
+        filename = job['filename']
+        textdata = self.fob.download_text(filename)
 
-        tokens = NLU.SyntaxOptionsTokens(lemma=True, part_of_speech=True)
-        syntax = NLU.SyntaxOptions(tokens=tokens, sentences=True)
-        features = NLU.Features(categories=NLU.CategoriesOptions(limit=RLIMIT),
-                                sentiment=NLU.SentimentOptions(),
-                                concepts=NLU.ConceptsOptions(limit=RLIMIT),
-                                keywords=NLU.KeywordsOptions(sentiment=True,
-                                                             limit=10),
-                                syntax=syntax)
+        header = Oneline.Oneline_parse_header(textdata)
+        if 'BILLID' not in header:
+            logger.info(f"238:No bill_id found, removing: {filename}")
+            self.fob.remove_item(filename)
+            return None
 
-        response = nlup.analyze(features, text=text, language='en')
+        logger.debug(f"231:bill_id={header['BILLID']} {filename}")
+        job['header'] = header
+        return [filename, textdata, job['prior'], self.impact_list,
+                self.use_api, self.compare]
 
-        result = response.get_result()
-        concept = result.get("concepts")
-        return concept
+    def finish_text(self, job, result):
+        """ Main thread: queue analyzed bill to be saved """
 
-    def format_rel(self, rel_start, revlist):
-        """ Save relevant words found for this bill """
+        if result is None:
+            return 0
 
-        rel, connector = rel_start, ''
-        for rev in revlist:
-            rel += connector + "'{}' => '{}'".format(rev[0], rev[1])
-            if rev[1] == "Unknown":
-                logger.debug(f'304:"{rev[0]}", "{rev[1]}"')
-            connector = ", "
+        rel, imp_chosen, api_failed = result
+        self.save_result(job['filename'], job['header'], rel, imp_chosen,
+                         api_failed)
+        if self.verbosity:
+            self.dot.show()
+        return 1
 
-        logger.debug(f"303:{rel_start}: {rel}")
-
-        return rel
-
-    def classify_impact(self, concept):
-        """ Classify the impact based on relevant terms """
-
-        impact_chosen = 'None'
-        revlist = []
-        w_map = self.womp.wordmap
-        for rel in concept:
-            term = rel['text'].strip()
-            if term in w_map:
-                revlist.append([term, w_map[term]])
-            else:
-                revlist.append([term, 'Unknown'])
-
-        # Choose the most relevant impact.
-        for rel in revlist:
-            impact = rel[1]
-            if impact_chosen not in self.impact_list:
-                impact_chosen = impact
-
-        if impact_chosen not in self.impact_list:
-            impact_chosen = 'None'
-
-        return revlist, impact_chosen
-
-    def save_law(self, key, header, rel, impact_chosen):
+    def save_result(self, filename, header, rel, imp_chosen, api_failed):
         """ Save the results in cfc_app_law database table """
 
-        # If record exists, check if this is newer..
-        doc_date = header['DOCDATE']
-        # import pdb; pdb.set_trace()
-        if Law.objects.filter(key=key).exists():
-            logger.debug(f'343:"Key={key}"')
-            law = Law.objects.get(key=key)
-            result = 'Updated'
-        # otherwise, this is a new record.
-        else:
-            law = Law()
-            law.key = key
-            result = 'Created'
-
-        law.bill_id = header['BILLID']
-        law.doc_date = doc_date
-        if len(header['TITLE'])>200 or len(header['SUMMARY'])>1000:
-            logger.debug(f'358:"Too Long: {header}"')
-        law.title = header['TITLE'][:199]
-        law.summary = header['SUMMARY'][:999]
-
-        state = key[:2]
-        if state in self.id_table:
-            state_id = self.id_table[state]
-            if state_id:
-                loc = Location.objects.get(legiscan_id=state_id)
-                law.location = loc
-
-        imp = Impact.objects.get(iname=impact_chosen)
-        law.impact = imp
-
-        law.relevance = rel
-        if 'CITE' in header:
-            law.cite_url = header['CITE']
-        law.save()
-
-        logger.info(f"390:Database record {result} for {key}")
+        if api_failed:
+            self.use_api = False
+
+        if rel:
+            key = filename.replace(".txt", "")
+            logger.debug(f"229:Filename {filename} Impact={imp_chosen}")
+            self.writer.save(key, header, rel, imp_chosen)
         return None
 
 # End of module
@@ -0,0 +1,447 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Compare old and new implementations of performance-sensitive code.
+
+Invoke with:  python manage.py benchmark wordmap acronyms oneline html
+Specify --help for details on parameters available.
+
+The sample corpus is built from the titles and summaries of the
+legislation found in the /sources directory.  Use --file to add
+extracted TXT files, such as cfc_app/testdata/pdf_to_text_sample.txt,
+for a more realistic bill length.
+
+The html benchmark uses the HTML bills stored in File/Object storage,
+up to --limit of them, instead of the sample corpus.
+
+The digest benchmark is only run when named.  It adds --profiles
+made-up users with profiles, and made-up laws changed this week, in a
+transaction that is rolled back at the end.  The old way, one search
+for each profile, is timed for --limit profiles and estimated for the
+rest; the new way, send_digest() in cfc_app/digest.py, is timed for all
+of them, sending to the locmem email backend.
+
+Written by Tony Pearson, IBM, 2021
+Licensed under Apache 2.0, see LICENSE for details
+"""
+
+# System imports
+import csv
+from datetime import timedelta
+import glob
+import json
+import logging
+import os
+import random
+import re
+import time
+import tracemalloc
+
+# Django and other third-party imports
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core import mail
+from django.core.mail import get_connection
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+# Application imports
+from cfc_app.digest import (changed_laws, law_index, match_criteria,
+                            profile_criteria, send_digest, FIRST_DAYS)
+from cfc_app.fob_storage import FobStorage
+from cfc_app.models import (Location, Impact, Criteria, Law, Digest,
+                            LOCATION_TREE, REFERENCE_DATA)
+from cfc_app.Oneline import Oneline
+from cfc_app.text_convert import parse_html, parse_html_soup
+from cfc_app.word_map import WordMap
+from users.models import Profile
+
+# Debug with:  import pdb; pdb.set_trace()
+logger = logging.getLogger(__name__)
+
+RLIMIT = 10   # same as analyze_text
+IMPACTS = ['Healthcare', 'Safety', 'Environment', 'Transportation', 'Jobs',
+           'Education']   # from sources/cfc-seed.json
+DIGEST_LAWS = 2000      # made-up laws changed this week
+DIGEST_CRITERIA = 8     # made-up impact sets for each location
+BULK_SIZE = 5000        # made-up rows inserted per query
+LOCMEM = 'django.core.mail.backends.locmem.EmailBackend'
+
+
+class BenchmarkError(CommandError):
+    """ customized error for this command. """
+    pass
+
+
+def sample_corpus():
+    """ Titles and summaries of legislation in /sources directory """
+
+    corpus = []
+    for jsonname in sorted(glob.glob(os.path.join(settings.SOURCE_ROOT,
+                                                  '*.json'))):
+        with open(jsonname, 'r') as jsonfile:
+            records = json.load(jsonfile)
+        if not isinstance(records, list):
+            continue
+        for record in records:
+            if record.get('model') == 'cfc_app.law':
+                fields = record['fields']
+                corpus.append(fields['title'] + ' ' + fields['summary'])
+
+    for csvname in sorted(glob.glob(os.path.join(settings.SOURCE_ROOT,
+                                                 '*.csv'))):
+        with open(csvname, 'r', newline='') as csvfile:
+            for row in csv.DictReader(csvfile):
+                if 'title' in row and 'key' in row:
+                    corpus.append(row['title'] + ' ' + row.get('summary', ''))
+
+    return corpus
+
+
+def old_scan_extract(womp, extracted_text, category_list):
+    """ WordMap.scan_extract before the single-pass matcher """
+
+    relterms, concept = {}, []
+    for rel in category_list:
+        term = rel[0]
+        rec = re.compile(r"\b"+term+r"\b", re.IGNORECASE)
+        matches = rec.findall(extracted_text)
+        if matches:
+            relterms[term] = len(matches)
+
+    num = 0
+    for term, count in sorted(relterms.items(), key=lambda item: item[1],
+                              reverse=True):
+        concept.append({'text': term, 'Reason': womp.wordmap[term]})
+        num += 1
+        if num >= womp.rlimit:
+            break
+
+    return concept
+
+
+def old_common_acronyms(line):
+    """ Oneline.common_acronyms before the rules were compiled """
+
+    newline = line.replace(r'\x91', '')
+    newline = re.sub(r"H.\s*B.\s*No.\s*(\d)", r"HB\1", newline)
+    newline = re.sub(r"S.\s*B.\s*No.\s*(\d)", r"SB\1", newline)
+    newline = re.sub(r"H.\s*R.\s*No.\s*(\d)", r"HR\1", newline)
+    newline = re.sub(r"S.\s*R.\s*No.\s*(\d)", r"SR\1", newline)
+    newline = re.sub(r"C.\s*R.\s*No.\s*(\d)", r"CR\1", newline)
+    newline = re.sub(r"J.\s*R.\s*No.\s*(\d)", r"JR\1", newline)
+    newline = re.sub(r"H.\s*B.\s*(\d)", r"HB\1", newline)
+    newline = re.sub(r"S.\s*B.\s*(\d)", r"SB\1", newline)
+    newline = re.sub(r"Am.\sSub.", r"Am-Sub", newline)
+    newline = re.sub(r"(st|nd|rd|th) G.A.", r"\1-GA ", newline)
+    newline = re.sub(r"(Sec|Sub|SEC)[.]\s*([0-9]+)", r" \1#\2 ", newline)
+    newline = re.sub(r"[0-9]+[-][0-9]+[.][0-9]+", r" ", newline)
+    newline = re.sub(r"[(][0-9]+[.][ 0-9]+[)]", r" ", newline)
+    newline = re.sub(r"[0-9]+[.][0-9]+[,]? and [0-9]+[.][0-9]+",
+                     r" ", newline)
+    newline = re.sub(r"[0-9]+[.][0-9]+\s*[,]", r" ", newline)
+    newline = re.sub(r"[.]\s+([0-9]{1,2})[.]\s", r". (\1) ", newline)
+    newline = re.sub(r"ection[s]?\s*and\s*[Ss]ection[s]?",
+                     r"ections", newline)
+    newline = re.sub(r"\s+([,;:])", r"\1", newline)
+    newline = re.sub(r"\s+", " ", newline)
+    return newline
+
+
+class OldOneline():
+    """ Oneline.add_text before the chunk list, one copy per line """
+
+    def __init__(self):
+        self.oneline = ''
+
+    def add_text(self, line):
+        newline = line.replace('\u2011', '-').replace('\u2013', '-')
+        newline = newline.replace('\u2019', '-')
+        newlines = newline.splitlines()
+        newline2 = ' '.join(newlines)
+        self.oneline += newline2 + ' '
+        return self
+
+
+class Command(BaseCommand):
+    """ Command handler for benchmark """
+
+    help = ("Time old and new implementations against the sample corpus "
+            "in the /sources directory, and verify both give the same "
+            "results. ")
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.corpus = []
+        self.repeat = 1
+        self.limit = 100
+        self.profiles = 100000
+        self.verbosity = 1
+        self.benchmarks = {'wordmap': self.bench_wordmap,
+                           'acronyms': self.bench_acronyms,
+                           'oneline': self.bench_oneline,
+                           'html': self.bench_html,
+                           'digest': self.bench_digest}
+        return None
+
+    def add_arguments(self, parser):
+        """ add arguments for parsing """
+
+        parser.add_argument("names", nargs='*',
+                            help="Benchmarks to run: "
+                                 + ", ".join(self.benchmarks))
+        parser.add_argument("--file", action="append", default=[],
+                            help="Add text file to the corpus")
+        parser.add_argument("--repeat", type=int, default=self.repeat,
+                            help="Number of times to process the corpus")
+        parser.add_argument("--limit", type=int, default=self.limit,
+                            help="Number of HTML bills for html benchmark, "
+                                 "or profiles searched one at a time for "
+                                 "digest benchmark")
+        parser.add_argument("--profiles", type=int, default=self.profiles,
+                            help="Number of made-up profiles for digest "
+                                 "benchmark")
+        return None
+
+    def handle(self, *args, **options):
+        """ handle benchmark command """
+
+        self.verbosity = options['verbosity']
+        self.repeat = max(options['repeat'], 1)
+        self.limit = max(options['limit'], 1)
+        self.profiles = max(options['profiles'], 1)
+
+        names = options['names'] or [name for name in self.benchmarks
+                                     if name != 'digest']
+        for name in names:
+            if name not in self.benchmarks:
+                raise BenchmarkError(f"Unknown benchmark: {name}")
+
+        self.corpus = sample_corpus()
+        for filename in options['file']:
+            with open(filename, 'r', errors='ignore') as textfile:
+                self.corpus.append(textfile.read())
+
+        chars = sum(len(doc) for doc in self.corpus)
+        print(f"Corpus: {len(self.corpus)} documents, {chars} characters")
+
+        for name in names:
+            self.benchmarks[name]()
+        return None
+
+    def timed(self, func, corpus=None):
+        """ Run func over the corpus, return [seconds, results] """
+
+        if corpus is None:
+            corpus = self.corpus
+        results = []
+        started = time.perf_counter()
+        for _ in range(self.repeat):
+            results = [func(doc) for doc in corpus]
+        seconds = time.perf_counter() - started
+        return seconds, results
+
+    def report(self, name, old_secs, new_secs, same, corpus=None):
+        """ Show timing of old versus new """
+
+        if corpus is None:
+            corpus = self.corpus
+        docs = len(corpus) * self.repeat
+        speedup = old_secs / new_secs if new_secs else 0.0
+        print(f"{name}: old {old_secs:.3f}s ({docs/old_secs:.1f} docs/sec) "
+              f"new {new_secs:.3f}s ({docs/new_secs:.1f} docs/sec) "
+              f"speedup {speedup:.1f}x")
+        if not same:
+            raise BenchmarkError(f"{name}: old and new results differ")
+        return None
+
+    def bench_wordmap(self):
+        """ WordMap.scan_extract per-term regex versus TermMatcher """
+
+        womp = WordMap(RLIMIT)
+        womp.load_csv(IMPACTS)
+        lists = [womp.primary, womp.secondary, womp.tertiary]
+
+        started = time.perf_counter()
+        for category_list in lists:
+            womp.term_matcher(category_list)
+        if self.verbosity > 1:
+            print(f"Matchers built in {time.perf_counter()-started:.3f}s")
+
+        def old(doc):
+            return [old_scan_extract(womp, doc, clist) for clist in lists]
+
+        def new(doc):
+            return [womp.scan_extract(doc, clist) for clist in lists]
+
+        old_secs, old_results = self.timed(old)
+        new_secs, new_results = self.timed(new)
+        self.report('wordmap', old_secs, new_secs, old_results == new_results)
+        return None
+
+    def bench_acronyms(self):
+        """ Oneline.common_acronyms regex passes versus compiled rules """
+
+        old_secs, old_results = self.timed(old_common_acronyms)
+        new_secs, new_results = self.timed(Oneline.common_acronyms)
+        self.report('acronyms', old_secs, new_secs,
+                    old_results == new_results)
+        return None
+
+    def bench_oneline(self):
+        """ Oneline.add_text string copies versus chunk list """
+
+        def build(text_line, doc):
+            for line in doc.splitlines():
+                text_line.add_text(line)
+            return text_line.oneline
+
+        def old(doc):
+            return build(OldOneline(), doc)
+
+        def new(doc):
+            return build(Oneline(nltk_loaded=True), doc)
+
+        tracemalloc.start()
+        old_secs, old_results = self.timed(old)
+        old_peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+        tracemalloc.start()
+        new_secs, new_results = self.timed(new)
+        new_peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+        print(f"oneline: peak memory old {old_peak/1024:.0f} KiB "
+              f"new {new_peak/1024:.0f} KiB")
+        self.report('oneline', old_secs, new_secs,
+                    old_results == new_results)
+        return None
+
+    def bench_html(self):
+        """ parse_html single pass versus BeautifulSoup tree """
+
+        fob = FobStorage(settings.FOB_METHOD)
+        names = fob.list_items(suffix='.html', limit=self.limit)
+        bills = [fob.download_binary(name).decode('UTF-8', errors='ignore')
+                 for name in names]
+        if not bills:
+            raise BenchmarkError("No HTML bills found in File/Object storage")
+        chars = sum(len(bill) for bill in bills)
+        print(f"HTML: {len(bills)} bills, {chars} characters")
+
+        def old(bill):
+            return parse_html_soup(bill, Oneline(nltk_loaded=True)).oneline
+
+        def new(bill):
+            return parse_html(bill, Oneline(nltk_loaded=True)).oneline
+
+        old_secs, old_results = self.timed(old, bills)
+        new_secs, new_results = self.timed(new, bills)
+        self.report('html', old_secs, new_secs, old_results == new_results,
+                    bills)
+        return None
+
+    def bench_digest(self):
+        """ One search per profile versus digest matching all at once """
+
+        with transaction.atomic():
+            until = self.make_profiles(self.profiles)
+            since = Digest.last_until() or until - timedelta(days=FIRST_DAYS)
+            sample = Profile.objects.filter(
+                user__username__startswith='digest-')
+            sample = list(sample.select_related('criteria__location')
+                          .order_by('id')[:self.limit])
+
+            def old(profile):
+                crit = profile.criteria
+                laws = Law.objects.filter(
+                    location__in=crit.location.ancestors(),
+                    impact__in=crit.impacts.all(),
+                    date_changed__gt=since, date_changed__lte=until)
+                return sorted(laws.values_list('id', flat=True))
+
+            old_secs, old_results = self.timed(old, sample)
+
+            connection = get_connection(LOCMEM)
+            started = time.perf_counter()
+            digest = send_digest(until=until, connection=connection)
+            new_secs = time.perf_counter() - started
+            mail.outbox = []
+
+            matched = match_criteria(profile_criteria(),
+                                     law_index(changed_laws(since, until)))
+            new_results = [sorted(matched.get(profile.criteria_id, []))
+                           for profile in sample] * self.repeat
+
+            # Leave the database as it was
+            transaction.set_rollback(True)
+        LOCATION_TREE.clear()
+        REFERENCE_DATA.clear()
+
+        per_profile = old_secs / (len(sample) * self.repeat)
+        old_total = per_profile * digest.profiles
+        speedup = old_total / new_secs if new_secs else 0.0
+        print(f"digest: old {old_secs:.3f}s for {len(sample)} profiles, "
+              f"about {old_total:.1f}s for {digest.profiles}; "
+              f"new {new_secs:.3f}s for {digest.profiles} profiles "
+              f"({digest.profiles/new_secs:.1f} profiles/sec) "
+              f"speedup {speedup:.1f}x")
+        print(f"digest: {digest.laws} laws, {digest.criteria} criteria, "
+              f"{digest.sent} messages sent")
+        if old_results != new_results:
+            raise BenchmarkError("digest: old and new results differ")
+        return None
+
+    def make_profiles(self, count):
+        """ Add count made-up profiles and laws, return time added """
+
+        started = time.perf_counter()
+        if Location.objects.filter(legiscan_id__gt=0).count() == 0:
+            Location.load_defaults()
+        if Impact.objects.count() == 0:
+            Impact.load_defaults()
+        REFERENCE_DATA.clear()
+        locations = REFERENCE_DATA.locations(include_world=True)
+        impacts = REFERENCE_DATA.impacts()
+        rand = random.Random(count)
+
+        laws = []
+        for num in range(DIGEST_LAWS):
+            loc = rand.choice(locations)
+            key = f"{loc.shortname.upper()[:2]}-DIG{num:06d}-0000-Y2021"
+            laws.append(Law(key=key, title=f"Digest law {num}",
+                            summary="Digest summary", location=loc,
+                            impact=rand.choice(impacts)))
+        Law.objects.bulk_create(laws, batch_size=BULK_SIZE)
+
+        criteria = []
+        for loc in locations:
+            for _ in range(DIGEST_CRITERIA):
+                chosen = rand.sample(impacts, rand.randint(1, len(impacts)))
+                criteria.append(Criteria.find_or_create(loc, chosen))
+
+        for start in range(0, count, BULK_SIZE):
+            users = [User(username=f"digest-{num:07d}", first_name='Digest',
+                          last_name=str(num),
+                          email=f"digest-{num}@example.com")
+                     for num in range(start, min(start + BULK_SIZE, count))]
+            User.objects.bulk_create(users)
+
+        # bulk_create does not set the ids on SQLite, so read them back
+        user_ids = User.objects.filter(
+            username__startswith='digest-').values_list('id', flat=True)
+        profiles = []
+        for user_id in user_ids.iterator():
+            crit = rand.choice(criteria)
+            profiles.append(Profile(user_id=user_id, criteria=crit,
+                                    location_id=crit.location_id))
+        Profile.objects.bulk_create(profiles, batch_size=BULK_SIZE)
+
+        print(f"Added {count} profiles and {DIGEST_LAWS} laws in "
+              f"{time.perf_counter() - started:.1f} seconds")
+        return timezone.now()
+
+# end of module
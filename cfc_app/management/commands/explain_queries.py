@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Show query plans and timings of the queries used to search legislation.
+
+Invoke with:  python manage.py explain_queries --synthetic 1000000
+Specify --help for details on parameters available.
+
+Each query made by the results page, analyze_text, extract_files and
+the HashStore is run against the database configured, SQLite or
+PostgreSQL, and its EXPLAIN output is shown with the number of rows
+and the time taken.  Use this to check that the indexes on cfc_app_law
+and cfc_app_hash are used, after a schema change or database upgrade.
+
+--synthetic N adds N made-up laws, and a hash code for each, before the
+queries are run.  Everything is done in one transaction that is rolled
+back at the end, so nothing is saved to the database.
+
+Written by Tony Pearson, IBM, 2021
+Licensed under Apache 2.0, see LICENSE for details
+"""
+
+# System imports
+import logging
+import random
+import time
+
+# Django and other third-party imports
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+# Application imports
+from cfc_app.law_export import COLUMNS
+from cfc_app.log_time import LogTime
+from cfc_app.models import (Location, Impact, Law, Hash, LOCATION_TREE,
+                            REFERENCE_DATA)
+
+# Debug with:  import pdb; pdb.set_trace()
+logger = logging.getLogger(__name__)
+
+PAGE_SIZE = 10     # same as NUM_LAWS_PER_PAGE in views
+
+
+class ExplainError(CommandError):
+    """ customized error for this command. """
+    pass
+
+
+class Command(BaseCommand):
+    """ Command handler for explain_queries """
+
+    help = ("Run the queries used to search legislation, showing the "
+            "query plan, rows found and time taken for each.  Specify "
+            "--synthetic to add made-up laws first, in a transaction "
+            "that is rolled back at the end.")
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.verbosity = 1
+        self.repeat = 5
+        self.batch = 10000
+        self.analyze = False
+        return None
+
+    def add_arguments(self, parser):
+        """ add arguments for parsing """
+
+        parser.add_argument("--synthetic", type=int, default=0,
+                            help="Number of made-up laws to add first")
+        parser.add_argument("--repeat", type=int, default=self.repeat,
+                            help="Times to run each query")
+        parser.add_argument("--batch", type=int, default=self.batch,
+                            help="Made-up laws inserted per query")
+        parser.add_argument("--analyze", action="store_true",
+                            help="Run EXPLAIN ANALYZE (PostgreSQL only)")
+        return None
+
+    def handle(self, *args, **options):
+        """ handle explain_queries command """
+
+        timing = LogTime("explain_queries")
+        timing.start_time(options['verbosity'])
+
+        self.verbosity = options['verbosity']
+        self.repeat = max(options['repeat'], 1)
+        self.batch = max(options['batch'], 1)
+        self.analyze = options['analyze']
+        if self.analyze and connection.vendor != 'postgresql':
+            raise ExplainError("--analyze is only supported on PostgreSQL")
+
+        print(f"Database: {connection.vendor}")
+        with transaction.atomic():
+            if Location.objects.filter(legiscan_id__gt=0).count() == 0:
+                Location.load_defaults()
+            if Impact.objects.count() == 0:
+                Impact.load_defaults()
+
+            if options['synthetic'] > 0:
+                self.make_laws(options['synthetic'])
+
+            self.analyze_tables()
+            print(f"Laws: {Law.objects.count()}, "
+                  f"hash codes: {Hash.objects.count()}")
+            for name, queryset in self.queries():
+                self.explain(name, queryset)
+
+            # Leave the database as it was
+            transaction.set_rollback(True)
+        LOCATION_TREE.clear()
+        REFERENCE_DATA.clear()
+
+        timing.end_time(options['verbosity'])
+        return None
+
+    def make_laws(self, count):
+        """ Add count made-up laws, spread over locations and impacts """
+
+        started = time.perf_counter()
+        locations = list(Location.objects.filter(legiscan_id__gt=0))
+        impacts = list(Impact.objects.all())
+        rand = random.Random(count)
+        for start in range(0, count, self.batch):
+            laws, hashes = [], []
+            for num in range(start, min(start + self.batch, count)):
+                loc = rand.choice(locations)
+                key = f"{loc.shortname.upper()[:2]}-SYN{num:07d}-0000-Y2021"
+                laws.append(Law(key=key, title=f"Synthetic law {num}",
+                                summary="Synthetic summary",
+                                location=loc, impact=rand.choice(impacts)))
+                hashes.append(Hash(item_name=f"{key}.pdf",
+                                   fob_method=settings.FOB_METHOD,
+                                   generated_date=settings.LONG_AGO,
+                                   hashcode='0' * 32, objsize=num))
+            Law.objects.bulk_create(laws)
+            Hash.objects.bulk_create(hashes)
+            if self.verbosity > 1:
+                print(f"Added {start + len(laws)} of {count} laws")
+
+        print(f"Added {count} laws in "
+              f"{time.perf_counter() - started:.1f} seconds")
+        return None
+
+    @staticmethod
+    def analyze_tables():
+        """ Update table statistics, so plans reflect the data added """
+
+        with connection.cursor() as cursor:
+            for table in [Law._meta.db_table, Hash._meta.db_table]:
+                cursor.execute(f"ANALYZE {table}")
+        return None
+
+    @staticmethod
+    def queries():
+        """ Yield [name, queryset] for each query made by the app """
+
+        law = Law.objects.order_by('-id').first()
+        if law is None:
+            raise ExplainError("No laws found, specify --synthetic")
+
+        state = law.key[:2]
+        location = law.location or Location.objects.filter(
+            legiscan_id__gt=0).first()
+        impacts = list(Impact.objects.exclude(iname='None')[:2])
+
+        # search.search_results, then one page of views.results
+        search = Law.objects.filter(location__in=location.ancestors(),
+                                    impact__in=impacts)
+        search = search.order_by().values_list('key', 'id')
+        yield ['search', search]
+
+        page_ids = [law_id for _, law_id in sorted(search)][:PAGE_SIZE]
+        yield ['results page', Law.objects.filter(
+            id__in=page_ids).select_related('location', 'impact')]
+
+        # analyze_text and extract_files
+        yield ['state laws', Law.objects.filter(key__startswith=state)]
+        yield ['law by key', Law.objects.filter(key=law.key)]
+
+        # HashStore.load() and HashStore.find()
+        yield ['state hashes', Hash.objects.filter(
+            fob_method=settings.FOB_METHOD,
+            item_name__startswith=f"{state}-")]
+        yield ['hash by name', Hash.objects.filter(
+            item_name=f"{law.key}.pdf", fob_method=settings.FOB_METHOD)]
+
+        # lawdump
+        yield ['lawdump', Law.objects.values_list(*COLUMNS).order_by('key')]
+
+    def explain(self, name, queryset):
+        """ Show the plan and timing of one query """
+
+        if self.analyze:
+            plan = queryset.explain(analyze=True)
+        else:
+            plan = queryset.explain()
+
+        times = []
+        rows = 0
+        for _ in range(self.repeat):
+            started = time.perf_counter()
+            rows = sum(1 for _ in queryset.iterator())
+            times.append(time.perf_counter() - started)
+
+        best, mean = min(times), sum(times) / len(times)
+        msg = (f"{name}: {rows} rows, best {best * 1000:.1f} ms, "
+               f"mean {mean * 1000:.1f} ms")
+        logger.info(f"190:{msg}")
+        print(msg)
+        if self.verbosity > 1:
+            print(f"   {queryset.query}")
+        for line in plan.splitlines():
+            print(f"   {line}")
+        return None
+
+# end of module
@@ -17,41 +17,48 @@ import base64
 import datetime as DT
 import json
 import logging
-import re
+import os
 import tempfile
+import threading
+import time
 import zipfile
 
 # Django and other third-party imports
-from bs4 import BeautifulSoup
 from django.core.management.base import BaseCommand, CommandError
 from django.conf import settings
-import nltk
 from titlecase import titlecase
 
 
 # Application imports
 from cfc_app.bill_detail import BillDetail
+from cfc_app.bill_index import BillIndex, BILL_REGEX
 from cfc_app.data_bundle import DataBundle
 from cfc_app.fob_storage import FobStorage
 from cfc_app.fob_helper import FobHelper
+from cfc_app.hash_store import HashStore, QueryCounter
+from cfc_app.http_client import shared_client
+from cfc_app.json_stream import extract_zip
 from cfc_app.legiscan_api import LegiscanAPI, LEGISCAN_ID, LegiscanError
 from cfc_app.log_time import LogTime
-from cfc_app.models import Law, Location, Hash, save_source_hash
-from cfc_app.Oneline import Oneline, Oneline_add_header
-from cfc_app.pdf_to_text import PDFtoText
+from cfc_app.models import Law, Location, save_source_hash
+from cfc_app.Oneline import Oneline
 from cfc_app.show_progress import ShowProgress
+from cfc_app.text_cache import TextCache
+from cfc_app.text_convert import (convert_source, extract_body, parse_html,
+                                  parse_intermediate, text_with_header,
+                                  EXTRACTOR_VERSION)
+from cfc_app.warm_state import ensure_punkt
+from cfc_app.work_pool import WorkPool
 
 # Debug with:   import pdb; pdb.set_trace()
 logger = logging.getLogger(__name__)
 
-PARSER = "lxml"
 TITLE_LIMIT = 200
 SUMMARY_LIMIT = 1000
+HEADER_CHUNK = 4096    # bytes read at a time to find end of TXT header
 
 # Put the original file name, doc date, title and summary ahead of text
 
-billRegex = re.compile(r"^([A-Z]{2})/\d\d\d\d-(\d\d\d\d).*/bill/(\w*).json$")
-
 ###############################################
 #  Support functions
 ###############################################
@@ -87,11 +94,22 @@ class Command(BaseCommand):
         self.skip = False
         self.state_count = 0
         self.verbosity = 1  # System default is dots and error messages only
-        nltk.download('punkt')
+        ensure_punkt()
         self.nltk_loaded = True
         self.after = None
         self.now = DT.datetime.today().date()
         self.fromyear = self.now.year - 2  # Back three years 2018, 2019, 2020
+        self.workers = 0
+        self.pool = None
+        self.api_lock = threading.Lock()
+        self.bill_count = 0
+        self.incremental = False
+        self.hashes = HashStore()
+        self.text_names = set()
+        self.pdf_workers = 0
+        self.pdf_pages = 0
+        self.pdf_seconds = 0
+        self.cache = None
         return None
 
     def add_arguments(self, parser):
@@ -106,6 +124,24 @@ class Command(BaseCommand):
                             help="Number of bills to extract per state")
         parser.add_argument("--skip", action="store_true",
                             help="Skip files already in File/Object storage")
+        parser.add_argument("--workers", type=int, default=self.workers,
+                            help="Number of parallel fetch/convert workers")
+        parser.add_argument("--incremental", action="store_true",
+                            help="Only process bills whose Legiscan "
+                                 "change_hash has changed")
+        parser.add_argument("--pdf-workers", type=int,
+                            default=self.pdf_workers,
+                            help="Split pages of long PDFs across processes"
+                                 " (without --workers)")
+        parser.add_argument("--pdf-pages", type=int, default=self.pdf_pages,
+                            help="Stop converting a PDF after this many "
+                                 "pages, 0 for no limit")
+        parser.add_argument("--pdf-seconds", type=int,
+                            default=self.pdf_seconds,
+                            help="Stop converting a PDF after this many "
+                                 "seconds, 0 for no limit.  Checked "
+                                 "between pages, a page that hangs is "
+                                 "only stopped with --pdf-workers")
 
         return None
 
@@ -114,6 +150,7 @@ class Command(BaseCommand):
 
         timing = LogTime("extract_files")
         timing.start_time(options['verbosity'])
+        queries = QueryCounter("extract_files").start()
 
         try:
             self.parse_options(options)
@@ -128,6 +165,32 @@ class Command(BaseCommand):
 
         locations = Location.objects.filter(legiscan_id__gt=0)
 
+        cache_dir = os.getenv('TEXT_CACHE', None)
+        if cache_dir:
+            self.cache = TextCache(cache_dir, EXTRACTOR_VERSION)
+            self.cache.purge()
+
+        start = time.monotonic()
+        if self.workers > 0:
+            self.pool = WorkPool(self.workers, self.fetch_source,
+                                 convert_source, self.finish_bill)
+        try:
+            self.process_locations(locations)
+        finally:
+            if self.pool:
+                self.pool.close(cancel=True)
+                self.pool = None
+            self.hashes.flush()
+            queries.stop()
+
+        self.show_rate(time.monotonic() - start)
+        queries.show(self.verbosity)
+        timing.end_time(options['verbosity'])
+        return None
+
+    def process_locations(self, locations):
+        """ Extract files for each location with a Legiscan_id """
+
         for loc in locations:
             self.loc = loc
 
@@ -143,14 +206,53 @@ class Command(BaseCommand):
                 logger.info(f"194:Processing: {loc.longname} ({state})")
                 self.process_location(state)
 
-        timing.end_time(options['verbosity'])
         return None
 
+    def show_rate(self, seconds):
+        """ Report number of bills processed per second """
+
+        rate = 0.0
+        if seconds > 0:
+            rate = self.bill_count / seconds
+        rate_msg = (f"Bills processed: {self.bill_count} in "
+                    f"{seconds:.1f} seconds ({rate:.2f} bills/sec)")
+        logger.info(f"210:{rate_msg}")
+        if self.verbosity:
+            print(rate_msg)
+
+        if self.cache:
+            cache_msg = self.cache.show_stats()
+            logger.info(f"212:{cache_msg}")
+            if self.verbosity:
+                print(cache_msg)
+
+        # Show latency and bytes fetched from each state website
+        for stats in shared_client().host_stats():
+            logger.info(f"216:HTTP {stats}")
+            if self.verbosity > 1:
+                print(stats)
+        return None
+
+    def limit_reached(self):
+        """ Check --limit, counting bills still in the worker pool """
+
+        if self.pool:
+            self.state_count += self.pool.poll()
+            self.state_count += self.pool.wait_below(self.pool.backlog)
+            if self.limit > 0:
+                while (self.pool.pending
+                       and self.state_count + self.pool.pending >= self.limit):
+                    self.state_count += self.pool.poll(block=True)
+                return self.state_count + self.pool.pending >= self.limit
+
+        return self.limit > 0 and self.state_count >= self.limit
+
     def process_location(self, state):
         """ Extract files for this state """
 
         self.state_count = 0
         found_list = self.fobhelp.dataset_items(state)
+        self.load_state_items(state)
 
         sessions = []
         found_list.sort(reverse=True)
@@ -178,7 +280,7 @@ class Command(BaseCommand):
             if self.verbosity:
                 self.dot.show()
 
-            if self.limit > 0 and self.state_count >= self.limit:
+            if self.limit_reached():
                 break
             session_id, json_name = session_detail
             logger.debug(f"234:Session_id={session_id} JSON={json_name}")
@@ -189,6 +291,11 @@ class Command(BaseCommand):
                 logger.error(err_msg, exc_info=True)
                 raise ExtractTextError(err_msg) from exc
 
+        # Finish any bills for this state still in the worker pool
+        if self.pool:
+            self.state_count += self.pool.drain()
+        self.hashes.flush()
+
         return None
 
     def parse_options(self, options):
@@ -216,82 +323,128 @@ class Command(BaseCommand):
         if options["after"]:
             self.after = options["after"]
 
+        self.workers = max(options['workers'], 0)
+        self.pdf_workers = max(options['pdf_workers'], 0)
+        self.pdf_pages = max(options['pdf_pages'], 0)
+        self.pdf_seconds = max(options['pdf_seconds'], 0)
+
+        # The bill index decides which bills to skip, including bills
+        # whose text exists but whose change_hash has changed.
+        if options['incremental']:
+            self.incremental = True
+            self.skip = False
+
         return None
 
     def process_json(self, json_name):
         """ Process CC-Dataset-NNNN.json file """
 
         logger.debug(f"209:Checking JSON: {json_name}")
-        json_str = self.fob.download_text(json_name)
 
-        source_hash = Hash.find_item_name(json_name)
+        source_hash = self.hashes.find(json_name)
 
         zip_name = json_name.replace('.json', '.zip')
-        target_hash = Hash.find_item_name(zip_name)
+        target_hash = self.hashes.find(zip_name)
         if target_hash is None:
-            target_hash = Hash(item_name=zip_name,
-                               fob_method=settings.FOB_METHOD,
-                               generated_date=source_hash.generated_date,
-                               hashcode=source_hash.hashcode,
-                               objsize=source_hash.objsize,
-                               legdesc=source_hash.legdesc)
+            target_hash = self.hashes.update(zip_name,
+                                             source_hash.generated_date,
+                                             source_hash.hashcode,
+                                             source_hash.objsize,
+                                             legdesc=source_hash.legdesc)
             logger.debug(f"Hashcode for {zip_name} saved.")
-            target_hash.save()
 
         # If the ZIP file already exists, use it, otherwise create it.
+        # The ZIP is decoded from the JSON a chunk at a time into a
+        # temporary file, so only one bill at a time is held in memory.
 
-        msg_bytes = b""
         if (self.fob.item_exists(zip_name)
                 and source_hash.generated_date <= target_hash.generated_date):
-            msg_bytes = self.fob.download_binary(zip_name)
+            with self.fob.open_binary(zip_name) as zip_file:
+                self.process_zip(zip_file, json_name, source_hash.hashcode)
         else:
-            package = json.loads(json_str)
-            if package['status'] == 'OK':
-                dataset = package['dataset']
-                mimedata = dataset['zip'].encode('UTF-8')
-                msg_bytes = base64.b64decode(mimedata)
-                self.fob.upload_binary(msg_bytes, zip_name)
-
-        if msg_bytes:
-            self.process_zip(msg_bytes)
+            with tempfile.TemporaryFile(suffix='.zip',
+                                        prefix='tmp-') as temp_zip:
+                with self.fob.open_binary(json_name,
+                                          seekable=False) as json_file:
+                    zip_size = extract_zip(json_file, temp_zip)
+                if zip_size:
+                    temp_zip.seek(0)
+                    self.fob.upload_file(temp_zip, zip_name)
+                    temp_zip.seek(0)
+                    self.process_zip(temp_zip, json_name,
+                                     source_hash.hashcode)
 
         self.dot.end()
         return None
 
-    def process_zip(self, msg_bytes):
-        """ Process ZIP package in temporary file """
-
-        with tempfile.NamedTemporaryFile(suffix='.zip', prefix='tmp-',
-                                         delete=True) as temp_zip:
-            temp_zip.write(msg_bytes)
-            temp_zip.seek(0)
-
-            with zipfile.ZipFile(temp_zip.name, 'r') as zipf:
-                namelist = zipf.namelist()
-
-                for path in namelist:
-
-                    if self.limit > 0 and self.state_count >= self.limit:
-                        break
-                    mop = billRegex.search(path)
-                    if mop:
-                        logger.debug(f"315:PATH name: {path}")
-                        json_data = zipf.read(path).decode('UTF-8',
-                                                           errors='ignore')
-                        logger.debug(f"320:JD: {json_data[:75]}")
-                        processed = self.process_source(json_data)
-                        self.state_count += processed
-
-                        # Verbosity: -v 0 no dots, -v 1 normal dots
-                        #            -v 2 dots + path every 100 entries
-                        #            -v 3 print every path that matches
-                        if self.verbosity:
-                            self.dot.show()
-                            if (((self.verbosity == 2)
-                                 and (self.state_count > 0)
-                                 and (self.state_count % 100 == 0))
-                                    or self.verbosity == 3):
-                                print(path)
+    def load_state_items(self, state):
+        """ Read hash codes and TXT item names for state, in bulk """
+
+        prefix = f"{state}-"
+        self.hashes.load(prefix)
+        if self.incremental:
+            self.text_names = set(self.fob.list_items(prefix=prefix,
+                                                      suffix='.txt', limit=0))
+        logger.debug(f"332:{state} hashes={len(self.hashes.rows)} "
+                     f"texts={len(self.text_names)}")
+        return None
+
+    def bill_index(self, zipf, json_name, dataset_hash):
+        """ Load the bill index for this dataset, or build it """
+
+        index_name = json_name.replace('.json', '.idx')
+        index = None
+        if self.fob.item_exists(index_name):
+            index = BillIndex.from_json(self.fob.download_text(index_name))
+
+        if index is None or index.dataset_hash != dataset_hash:
+            logger.info(f"345:Building bill index {index_name}")
+            index = BillIndex.from_zip(zipf, dataset_hash)
+            self.fob.upload_text(index.to_json(), index_name)
+        return index
+
+    def process_zip(self, zip_file, json_name=None, dataset_hash=None):
+        """ Process ZIP package, one bill at a time """
+
+        try:
+            zipf = zipfile.ZipFile(zip_file, 'r')
+        except zipfile.BadZipFile as exc:
+            logger.error(f"312:Unable to open ZIP: {exc}")
+            return None
+
+        with zipf:
+            namelist = zipf.namelist()
+            if self.incremental and json_name:
+                index = self.bill_index(zipf, json_name, dataset_hash)
+                namelist = index.changed_paths(self.hashes.rows,
+                                               self.text_names,
+                                               self.fromyear, self.after)
+                logger.info(f"367:{json_name}: {len(namelist)} of "
+                            f"{len(index.bills)} bills changed")
+
+            for path in namelist:
+
+                if self.limit_reached():
+                    break
+                mop = BILL_REGEX.search(path)
+                if mop:
+                    logger.debug(f"315:PATH name: {path}")
+                    json_data = zipf.read(path).decode('UTF-8',
+                                                       errors='ignore')
+                    logger.debug(f"320:JD: {json_data[:75]}")
+                    processed = self.process_source(json_data)
+                    self.state_count += processed
+
+                    # Verbosity: -v 0 no dots, -v 1 normal dots
+                    #            -v 2 dots + path every 100 entries
+                    #            -v 3 print every path that matches
+                    if self.verbosity:
+                        self.dot.show()
+                        if (((self.verbosity == 2)
+                             and (self.state_count > 0)
+                             and (self.state_count % 100 == 0))
+                                or self.verbosity == 3):
+                            print(path)
         return None
 
     def process_source(self, json_data):
@@ -367,8 +520,7 @@ class Command(BaseCommand):
                 processed = 0
                 skipping = True
             else:
-                textdata = self.fob.download_text(text_name)
-                headers = Oneline.Oneline_parse_header(textdata)
+                headers = self.read_text_header(text_name)
                 if ('CITE' in headers
                         and headers['CITE'][:8] != 'Legiscan'
                         and headers['CITE'][-7:] != 'general'):
@@ -384,12 +536,29 @@ class Command(BaseCommand):
 
         return processed
 
+    def read_text_header(self, text_name):
+        """ Parse header of existing TXT file, without reading it all """
+
+        chunks, found = [], False
+        with self.fob.open_binary(text_name, seekable=False) as infile:
+            while not found:
+                chunk = infile.read(HEADER_CHUNK)
+                if not chunk:
+                    break
+                chunks.append(chunk)
+                found = b'_TEXT_' in b''.join(chunks[-2:])
+
+        textdata = b''.join(chunks).decode('UTF-8', errors='ignore')
+        if found:
+            textdata = textdata[:textdata.index('_TEXT_') + 6]
+        return Oneline.Oneline_parse_header(textdata)
+
     def process_bill(self, detail):
         """ process individual PDF/HTML bill """
 
         key = detail.key
         detail.bill_name = self.fobhelp.bill_text_name(key, detail.extension)
-        bill_hash = Hash.find_item_name(detail.bill_name)
+        bill_hash = self.hashes.find(detail.bill_name)
         logger.debug(f"345:bill_name={detail.bill_name} bill_hash={bill_hash}")
 
         # If the source PDF/HTML exists, and the hash code matches,
@@ -401,34 +570,116 @@ class Command(BaseCommand):
             # read the existing PDF/HTML file we have in File/Object store
             fob_source = True
 
+        # With --workers, the fetch and conversion are done in the
+        # worker pool, and finish_bill() counts the bill when done.
+        if self.pool:
+            self.pool.submit([detail, bill_hash, fob_source])
+            return 0
+
         processed = 0
-        bindata = None
-        source_file = detail.bill_name
+        bindata = self.read_source(detail, fob_source)
+
+        # Convert PDF/HTML to text, unless this source is in the cache
+        if bindata and detail.extension in ['html', 'pdf']:
+            body = self.cached_body(detail, bindata)
+            complete = False
+            if body is None:
+                body, complete = extract_body(detail, bindata,
+                                              self.pdf_pages,
+                                              self.pdf_seconds,
+                                              self.pdf_workers)
+            if body is not None:
+                text_name = self.fobhelp.bill_text_name(key, 'txt')
+                self.write_file(text_with_header(detail, body), text_name)
+                if complete:
+                    self.cache_body(detail, body)
+            processed = 1
+
+        # If successful, save the hash code to the cfc_app_hash table
+        if processed:
+            save_source_hash(bill_hash, detail, store=self.hashes)
+            self.dot.show()
+            self.bill_count += 1
+        else:
+            logger.error(f"435:Failure processing source: "
+                         f"{self.source_file(detail, fob_source)}")
+        return processed
+
+    def read_source(self, detail, fob_source):
+        """ Read PDF/HTML from File/Object storage, or fetch from state """
 
         if fob_source:
             logger.debug(f"361:Reading existing: {detail.bill_name}")
             bindata = self.fob.download_binary(detail.bill_name)
-            source_file = "{} ({})".format(detail.bill_name,
-                                           settings.FOB_METHOD)
         else:
             logger.debug(f"414:Fetch from state: {detail.bill_name}")
             bindata = self.fetch_state_link(detail)
+        return bindata
 
-        # For HTML, convert to text.  Othewise leave binary for PDF.
-        if bindata and detail.extension == 'html':
-            textdata = bindata.decode('UTF-8', errors='ignore')
-            self.process_html(key, detail, textdata)
-            processed = 1
-        elif bindata and detail.extension == 'pdf':
-            self.process_pdf(detail, bindata)
+    @staticmethod
+    def source_file(detail, fob_source):
+        """ Describe where the PDF/HTML source came from """
+
+        source_file = detail.bill_name
+        if fob_source:
+            source_file = "{} ({})".format(detail.bill_name,
+                                           settings.FOB_METHOD)
+        return source_file
+
+    def fetch_source(self, job):
+        """ Worker thread: read the PDF/HTML source for this bill """
+
+        detail, _, fob_source = job
+        bindata = self.read_source(detail, fob_source)
+        payload = None
+        if bindata and detail.extension in ['html', 'pdf']:
+            body = self.cached_body(detail, bindata)
+            if body is not None:
+                bindata = b''    # no need to send it to convert_source
+            payload = [detail, bindata, self.pdf_pages, self.pdf_seconds,
+                       body]
+        return payload
+
+    def cached_body(self, detail, bindata):
+        """ Text extracted from these same bytes before, None if not """
+
+        body = None
+        if self.cache:
+            detail.source_key = TextCache.source_key(bindata)
+            body = self.cache.get(detail.extension, detail.source_key)
+        return body
+
+    def cache_body(self, detail, body):
+        """ Save extracted text for the next time this source is seen """
+
+        if self.cache and detail.source_key:
+            self.cache.put(detail.extension, detail.source_key, body)
+        return None
+
+    def finish_bill(self, job, result):
+        """ Main thread: save text and hash code for a converted bill """
+
+        detail, _, fob_source = job
+        processed = 0
+        if result is not None:
+            textdata, body = result
+            if body is not None:
+                self.cache_body(detail, body)
+            if textdata:
+                text_name = self.fobhelp.bill_text_name(detail.key, 'txt')
+                logger.info(f"478:Writing: {text_name}")
+                self.fob.upload_text(textdata, text_name)
             processed = 1
 
-        # If successful, save the hash code to the cfc_app_hash table
         if processed:
-            save_source_hash(bill_hash, detail)
+            # The row may have been created since the job was submitted
+            bill_hash = self.hashes.find(detail.bill_name)
+            save_source_hash(bill_hash, detail, store=self.hashes)
             self.dot.show()
+            self.bill_count += 1
         else:
-            logger.error(f"435:Failure processing source: {source_file}")
+            logger.error(f"435:Failure processing source: "
+                         f"{self.source_file(detail, fob_source)}")
         return processed
 
     def fetch_state_link(self, detail):
@@ -458,11 +709,21 @@ class Command(BaseCommand):
             if self.verbosity > 2:
                 print(saving_msg)
 
-        elif self.api_limit > 0 and self.leg.api_ok:
+        elif self.reserve_api_call():
             bindata = self.fetch_legiscan_api(detail)
 
         return bindata
 
+    def reserve_api_call(self):
+        """ Count against --api limit, shared by all worker threads """
+
+        reserved = False
+        with self.api_lock:
+            if self.api_limit > 0 and self.leg.api_ok:
+                self.api_limit -= 1
+                reserved = True
+        return reserved
+
     def fetch_legiscan_api(self, detail):
         """ Fetch from Legiscan API using getBillText command """
 
@@ -471,7 +732,6 @@ class Command(BaseCommand):
                        f"doc_id={detail.doc_id}")
         response = self.leg.get_bill_text(detail.doc_id)
         detail.cite_url = detail.url
-        self.api_limit -= 1
         if response:
             json_data = json.loads(response)
             json_text = json_data['text']
@@ -481,46 +741,13 @@ class Command(BaseCommand):
 
         return bindata
 
-    def process_html(self, key, detail, billtext):
-        """ Process HTML source file of legislation """
-
-        text_name = self.fobhelp.bill_text_name(key, 'txt')
-
-        text_line = Oneline(nltk_loaded=True)
-        Oneline_add_header(text_line, detail)
-
-        self.parse_html(billtext, text_line)
-        self.write_file(text_line, text_name)
-
-        return self
-
-    def write_file(self, text_line, text_name):
+    def write_file(self, textdata, text_name):
         """ Write text file as series of full sentences  """
 
-        text_line.split_sentences()
         logger.info(f"478:Writing: {text_name}")
-        self.fob.upload_text(text_line.oneline, text_name)
+        self.fob.upload_text(textdata, text_name)
         return
 
-    def process_pdf(self, detail, msg_bytes):
-        """ Parse PDF file to extract text """
-
-        logger.debug(f"485:key={detail.key}")
-        input_str = ""
-
-        detail.bill_name = self.fobhelp.bill_text_name(detail.key, 'pdf')
-        miner = PDFtoText(detail.bill_name, msg_bytes)
-        input_str = miner.convert_to_text()
-
-        if input_str:
-            text_name = self.fobhelp.bill_text_name(detail.key, 'txt')
-            text_line = Oneline(nltk_loaded=True)
-            Oneline_add_header(text_line, detail)
-            self.parse_intermediate(input_str, text_line)
-            self.write_file(text_line, text_name)
-
-        return self
-
     def fetch_bill(self, bill, key):
         """ If not available from the state, fetch from Legiscan.com API """
 
@@ -558,39 +785,13 @@ class Command(BaseCommand):
     def parse_html(self, in_line, out_line):
         """ Use BeautifulSoup libraries to parse HTML """
 
-        soup = BeautifulSoup(in_line, PARSER)
-        title = soup.find('title')
-        if title:
-            out_line.add_text(title.string)
-
-        sections = soup.findAll("span", {"class": "SECHEAD"})
-        for section in sections:
-            rawtext = section.string
-            if rawtext:
-                lines = rawtext.splitlines()
-                header = " ".join(lines)
-                out_line.add_text(header)
-
-        paragraphs = soup.findAll("p")
-        for paragraph in paragraphs:
-            prg = paragraph.string
-            if prg:
-                prg = re.sub(r"^([0-9]{1,2})[.] ", r"(\1) ", prg)
-                prg = re.sub(r"^([A-Za-z])[.] ", r"(\1) ", prg)
-                out_line.add_text(prg)
-
+        parse_html(in_line, out_line)
         return self
 
     def parse_intermediate(self, input_string, output_line):
         """ Parse the intermediate file from pdf_to_text conversion """
 
-        lines = input_string.splitlines()
-        for line in lines:
-            newline = line.replace('B I L L', 'BILL')
-            newline = newline.strip()
-            # Remove lines that only contain blanks or line numbers only
-            if newline != '' and not newline.isdigit():
-                output_line.add_text(newline)
+        parse_intermediate(input_string, output_line)
         return self
 
 # end of module
@@ -9,17 +9,22 @@ Licensed under Apache 2.0, see LICENSE for details
 """
 
 # System imports
+import concurrent.futures as CF
 import datetime as DT
-import hashlib
 import logging
+import os
 
 # Django and other third-party imports
 from django.core.management.base import BaseCommand, CommandError
 
 # Application imports
 from cfc_app.fob_storage import FobStorage
+from cfc_app.fob_transfer import TransferCheckpoint, copy_item, hash_item
+from cfc_app.hash_store import HashStore, QueryCounter
 from cfc_app.log_time import LogTime
-from cfc_app.models import Hash, delete_if_exists
+from cfc_app.models import Hash
+from cfc_app.sync_plan import (SyncPlan, ADD, UPDATE, VERIFY, HASH,
+                               TOUCH)
 
 # Debug with:  import pdb; pdb.set_trace()
 logger = logging.getLogger(__name__)
@@ -63,7 +68,10 @@ class Command(BaseCommand):
         self.maxget = None
         self.count = 0
         self.ops = None
+        self.workers = 4
         self.now = DT.datetime.today().date()
+        self.hashes = {'FILE': HashStore('FILE'),
+                       'OBJECT': HashStore('OBJECT')}
         return None
 
     def add_arguments(self, parser):
@@ -81,6 +89,13 @@ class Command(BaseCommand):
                             help="Number of puts from OBJECT storage")
         parser.add_argument("--skip", action="store_true",
                             help="Skip copy if target exists already")
+        parser.add_argument("--workers", type=int, default=self.workers,
+                            help="Number of items transferred in parallel")
+        parser.add_argument("--dryrun", action="store_true",
+                            help="Show what would be done, change nothing")
+        parser.add_argument("--checkpoint",
+                            help="File to record progress, to resume an "
+                                 "interrupted copy")
         return None
 
     def handle(self, *args, **options):
@@ -88,6 +103,7 @@ class Command(BaseCommand):
 
         timing = LogTime("fob_sync")
         timing.start_time(options['verbosity'])
+        queries = QueryCounter("fob_sync").start()
 
         self.parse_options(options)
 
@@ -142,6 +158,8 @@ class Command(BaseCommand):
         print('Number of GET requests from OBJECT:    ', get_count)
         print(' ')
 
+        queries.stop()
+        queries.show(options['verbosity'])
         timing.end_time(options['verbosity'])
         return None
 
@@ -164,6 +182,7 @@ class Command(BaseCommand):
         self.maxdel = min(options['maxdel'], self.maxlimit)
         self.maxput = min(options['maxput'], self.maxlimit)
         self.maxget = min(options['maxget'], self.maxlimit)
+        self.workers = max(options['workers'], 1)
         logger.debug(f"--maxdel {self.maxdel}, --maxget {self.maxget} "
                      f"--maxput {self.maxput} ")
 
@@ -198,17 +217,33 @@ class Command(BaseCommand):
         else:
             raise FobSyncError('Invalid combination of parameters')
 
+        plan = SyncPlan(found_in, but_not_in, self.hashes)
+        plan.plan_deletes(item_list, other_list, maxcount)
+        if self.ops['dryrun']:
+            plan.show(self.ops['verbosity'])
+            return
+
         self.count = 0
-        for name in item_list:
-            if name not in other_list:
-                remove_from.remove_item(name)
-                delete_if_exists(name, mode=found_in)
-                logger.info(f"Removed from {found_in}: {name}")
-                self.count += 1
-                if self.count >= maxcount:
-                    break
+        store = self.hashes[found_in]
+        for item in plan.items:
+            remove_from.remove_item(item.name)
+            store.delete(item.name)
+            logger.info(f"Removed from {found_in}: {item.name}")
+            self.count += 1
+
+        store.flush()
         return
 
+    def checkpoint_name(self, from_fob, to_fob):
+        """ Checkpoint file for this direction of copy """
+
+        ckname = self.ops['checkpoint']
+        if ckname is None:
+            # Names starting with "." are not listed as FILE items
+            ckname = os.path.join(self.fob_file.filesys,
+                                  f".fob_sync-{from_fob}-{to_fob}.json")
+        return ckname
+
     def copy_items(self, maxcount, options, from_fob=None, to_fob=None):
         """ copy items from_fob to_fob if target does not exist,
             or date/hash indicates copy is needed. """
@@ -226,63 +261,127 @@ class Command(BaseCommand):
         else:
             raise CommandError('Invalid combination of parameters')
 
+        checkpoint = TransferCheckpoint(self.checkpoint_name(from_fob,
+                                                             to_fob))
+        plan = SyncPlan(from_fob, to_fob, self.hashes)
+        plan.plan_copies(item_list, other_list, maxcount,
+                         prefix=options['prefix'], skip=options['skip'],
+                         done=checkpoint.load())
+        if options['dryrun']:
+            plan.show(options['verbosity'])
+            return None
+
+        # Work through the plan a window at a time, so that no more
+        # items are hashed than needed to reach maxcount copies.
         self.count = 0
-        for name in item_list:
-            source_hash = Hash.find_item_name(name, mode=from_fob)
-            if source_hash is None:
-                bindata = read_from.fob.download_binary(name)
-                new_hashcode = hashlib.md5(bindata).hexdigest()
-                source_hash = Hash(item_name=name, fob_method=from_fob,
-                                   generated_date=self.now,
-                                   hashcode=new_hashcode, objsize=len(bindata),
-                                   legdesc=GENDESC)
-                logger.debug(f"239:Hashcode for {name} for {from_fob} saved.")
-                source_hash.save()
-
-            target_hash = Hash.find_item_name(name, mode=to_fob)
-
-            if target_hash is None:
-                target_hash = Hash(item_name=name, fob_method=to_fob,
-                                   generated_date=source_hash.generated_date,
-                                   hashcode=source_hash.hashcode,
-                                   objsize=source_hash.objsize,
-                                   legdesc=source_hash.desc)
-                if target_hash.legdesc == GENDESC:
-                    target_hash.legdesc = COPYDESC
-                logger.debug(f"252:Hashcode for {name} for {to_fob} saved.")
-                target_hash.save()
-
-            if name not in other_list:
-
-                bindata = read_from.fob.download_binary(name)
-                write_to.fob.upload_binary(bindata, name)
-                self.count += 1
-
-                logger.info(f"File {name} copied to {to_fob}")
-
-            elif options['skip']:
-                logger.debug(f"File {name} exists in both places, skipping")
+        window = self.workers * 4
+        with CF.ThreadPoolExecutor(max_workers=self.workers) as pool:
+            for start in range(0, len(plan.items), window):
+                self.copy_window(pool, plan.items[start:start+window],
+                                 maxcount, read_from, write_to, checkpoint)
+                if self.count >= maxcount:
+                    break
 
-            else:
-                # If both exist, copy source to target if newer
-                if source_hash.generated_date > target_hash.generated_date:
-
-                    # If hashcodes the same, just update generated date
-                    if source_hash.hashcode != target_hash.hashcode:
-                        bindata = read_from.fob.download_binary(name)
-                        write_to.fob.upload_binary(bindata, name)
-                        target_hash.hashcode = source_hash.hashcode
-                        target_hash.objsize = source_hash.objsize
-                        logger.info(f"Item {name} copied to {to_fob}")
-                        self.count += 1
-                    target_hash.generated_date = source_hash.generated_date
-                    target_hash.save()
-
-            if self.count >= maxcount:
-                break
+        checkpoint.clear()
+        return None
 
+    def copy_window(self, pool, items, maxcount, read_from, write_to,
+                    checkpoint):
+        """ Hash and copy this window of plan items using the thread pool """
+
+        # Items to be copied are hashed while they are copied, the
+        # rest are hashed first if there is no source hash yet.
+        futures = {}
+        for item in items:
+            if item.action in [VERIFY, HASH]:
+                future = pool.submit(hash_item, read_from.fob, item.name)
+                futures[future] = item
+
+        for future in CF.as_completed(futures):
+            item = futures[future]
+            hashcode, objsize = future.result()
+            item.source_hash = self.save_source_hash(
+                item.name, read_from.method, hashcode, objsize)
+            if item.action == VERIFY:
+                if (item.target_hash is not None
+                        and item.target_hash.hashcode != hashcode):
+                    item.action = UPDATE
+                else:
+                    item.action = TOUCH
+            elif item.target_hash is None:
+                item.action = TOUCH
+
+        futures = {}
+        for item in items:
+            if item.action in [ADD, UPDATE]:
+                if self.count + len(futures) >= maxcount:
+                    break
+                future = pool.submit(copy_item, read_from.fob,
+                                     write_to.fob, item.name)
+                futures[future] = item
+            elif item.action == TOUCH:
+                self.save_target_hash(item.name, write_to.method,
+                                      item.source_hash, item.target_hash)
+
+        copied = []
+        for future in CF.as_completed(futures):
+            item = futures[future]
+            hashcode, objsize = future.result()
+            source_hash = item.source_hash
+            if source_hash is None:
+                source_hash = self.save_source_hash(
+                    item.name, read_from.method, hashcode, objsize)
+            elif source_hash.hashcode != hashcode:
+                logger.warning(f"Item {item.name} hashcode {hashcode} does "
+                               f"not match {source_hash.hashcode}")
+
+            self.save_target_hash(item.name, write_to.method, source_hash,
+                                  item.target_hash, copied=True)
+            copied.append([item.name, hashcode, objsize])
+            self.count += 1
+            logger.info(f"File {item.name} copied to {write_to.method}")
+
+        # Save the hash codes first, so that a resumed run never skips
+        # an item whose cfc_app_hash rows were not saved
+        self.hashes[read_from.method].flush()
+        self.hashes[write_to.method].flush()
+        for name, hashcode, objsize in copied:
+            checkpoint.record(name, hashcode, objsize)
         return None
 
+    def save_source_hash(self, name, from_fob, hashcode, objsize):
+        """ Save hashcode of source item not already in cfc_app_hash """
+
+        source_hash = self.hashes[from_fob].update(name, self.now,
+                                                   hashcode, objsize,
+                                                   legdesc=GENDESC)
+        logger.debug(f"239:Hashcode for {name} for {from_fob} saved.")
+        return source_hash
+
+    def save_target_hash(self, name, to_fob, source_hash, target_hash,
+                         copied=False):
+        """ Create or update target hashcode from source hashcode """
+
+        if target_hash is None:
+            target_hash = Hash(item_name=name, fob_method=to_fob,
+                               generated_date=source_hash.generated_date,
+                               hashcode=source_hash.hashcode,
+                               objsize=source_hash.objsize,
+                               legdesc=source_hash.legdesc)
+            if target_hash.legdesc == GENDESC:
+                target_hash.legdesc = COPYDESC
+            logger.debug(f"252:Hashcode for {name} for {to_fob} saved.")
+            self.hashes[to_fob].save(target_hash)
+
+        elif copied or (source_hash.generated_date
+                        > target_hash.generated_date):
+            target_hash.hashcode = source_hash.hashcode
+            target_hash.objsize = source_hash.objsize
+            target_hash.generated_date = source_hash.generated_date
+            self.hashes[to_fob].save(target_hash)
+
+        return target_hash
+
     def get_list(self, fob):
         """ Get list of items that match criteria. """
 
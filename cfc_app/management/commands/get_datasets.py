@@ -24,9 +24,10 @@ from django.core.management.base import BaseCommand, CommandError
 # Application imports
 from cfc_app.fob_storage import FobStorage
 from cfc_app.fob_helper import FobHelper
+from cfc_app.hash_store import HashStore, QueryCounter
 from cfc_app.legiscan_api import LegiscanAPI, LEGISCAN_ID, LegiscanError
 from cfc_app.log_time import LogTime
-from cfc_app.models import Location, Hash, save_entry_to_hash
+from cfc_app.models import Location, save_entry_to_hash
 from cfc_app.bill_detail import date_type
 
 
@@ -87,6 +88,7 @@ class Command(BaseCommand):
         self.fromyear = self.now.year - 2  # Back three years 2018, 2019, 2020
         self.frequency = 7
         self.state = None
+        self.hashes = HashStore()
         return None
 
     def add_arguments(self, parser):
@@ -106,6 +108,7 @@ class Command(BaseCommand):
         # otherwise, call Legiscan API to fetch a new one
         timing = LogTime("get_datasets")
         timing.start_time(options['verbosity'])
+        queries = QueryCounter("get_datasets").start()
 
         if options['api']:
             self.use_api = True
@@ -151,7 +154,10 @@ class Command(BaseCommand):
 
         # Show status of all files we expect to have now
         self.datasets_found(states)
+        self.hashes.flush()
 
+        queries.stop()
+        queries.show(options['verbosity'])
         timing.end_time(options['verbosity'])
         return None
 
@@ -239,6 +245,7 @@ class Command(BaseCommand):
     def fetch_dataset(self, state, state_id):
         """ Fetch dataset for specific legislative session """
 
+        self.hashes.load(f"{state}-Dataset-")
         for entry in self.datasetlist:
             if entry['state_id'] == state_id:
                 session_id = entry['session_id']
@@ -255,7 +262,7 @@ class Command(BaseCommand):
         if self.fob.item_exists(session_name):
             entry_date = date_type(entry['dataset_date'])
             hashcode, hashdate = '', settings.LONG_AGO
-            ds_hash = Hash.find_item_name(session_name)
+            ds_hash = self.hashes.find(session_name)
             if ds_hash:
                 hashcode = ds_hash.hashcode
                 hashdate = ds_hash.generated_date
@@ -288,6 +295,7 @@ class Command(BaseCommand):
 
             state, state_id = state_data[0], state_data[1]
             found_list = self.fobhelp.dataset_items(state)
+            self.hashes.load(f"{state}-Dataset-")
             for entry in self.datasetlist:
                 if (entry['state_id'] == state_id
                         and entry['year_end'] >= self.fromyear):
@@ -298,7 +306,8 @@ class Command(BaseCommand):
                         show_results(entry)
                         self.stdout.write(self.style.SUCCESS(
                             'Found session dataset: '+session_name))
-                        save_entry_to_hash(session_name, entry)
+                        save_entry_to_hash(session_name, entry,
+                                           store=self.hashes)
                     else:
                         self.stdout.write(self.style.WARNING(
                             'Item not found: '+session_name))
@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Merge Criteria rows that have the same location and impacts.
+
+Invoke with:  python manage.py merge_criteria
+Specify --help for details on parameters available.
+
+Before Criteria had a signature column, each search saved a new row,
+even for a location and impacts searched before.  This command reads all
+criteria and their impacts with two queries, keeps one row for each
+signature, moves profiles and mail jobs of the others to it, and deletes
+the rest, a batch of rows per query.  Run it once after 'migrate' adds
+the signature column, and again at any time to clean up rows saved by
+Django admin, which does not set the signature.
+
+Written by Tony Pearson, IBM, 2021
+Licensed under Apache 2.0, see LICENSE for details
+"""
+
+# System imports
+from collections import defaultdict
+import logging
+
+# Django and other third-party imports
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Case, IntegerField, Value, When
+from django.db.models.signals import post_delete
+
+# Application imports
+from cfc_app.log_time import LogTime
+from cfc_app.models import (Criteria, DataVersion, MailJob, CRITERIA_DATA,
+                            criteria_changed, criteria_signature)
+from users.models import Profile
+
+# Debug with:  import pdb; pdb.set_trace()
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    """ Command handler for merge_criteria """
+
+    help = ("Merge Criteria rows with the same location and impacts, "
+            "moving profiles to the row kept, and set the signature of "
+            "each row.  Specify --dry-run to only count them.")
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.batch = 500
+        self.verbosity = 1
+        return None
+
+    def add_arguments(self, parser):
+        """ add arguments for parsing """
+
+        parser.add_argument("--dry-run", action="store_true",
+                            help="Count duplicates, but change nothing")
+        parser.add_argument("--batch", type=int, default=self.batch,
+                            help="Rows changed per query")
+        return None
+
+    def handle(self, *args, **options):
+        """ handle merge_criteria command """
+
+        timing = LogTime("merge_criteria")
+        timing.start_time(options['verbosity'])
+
+        self.verbosity = options['verbosity']
+        self.batch = max(options['batch'], 1)
+
+        with transaction.atomic():
+            merges, signatures = self.plan(self.find_groups())
+            moved = self.move_profiles(merges)
+            self.move_mail_jobs(merges)
+            self.delete_duplicates(merges)
+            self.set_signatures(signatures)
+            if merges or signatures:
+                DataVersion.bump(CRITERIA_DATA)
+
+            if options['dry_run']:
+                transaction.set_rollback(True)
+
+        msg = (f"Duplicates merged: {len(merges)}, "
+               f"profiles moved: {moved}, "
+               f"signatures set: {len(signatures)}")
+        if options['dry_run']:
+            msg += " (dry run, nothing changed)"
+        logger.info(f"86:{msg}")
+        print(msg)
+
+        timing.end_time(options['verbosity'])
+        return None
+
+    @staticmethod
+    def find_groups():
+        """ {signature: [[criteria id, signature saved], ...]} """
+
+        impacts = defaultdict(list)
+        links = Criteria.impacts.through.objects.values_list(
+            'criteria_id', 'impact_id')
+        for crit_id, impact_id in links.iterator():
+            impacts[crit_id].append(impact_id)
+
+        groups = defaultdict(list)
+        rows = Criteria.objects.values_list(
+            'id', 'location_id', 'signature').order_by('id')
+        for crit_id, location_id, saved in rows.iterator():
+            signature = criteria_signature(location_id, impacts[crit_id])
+            groups[signature].append([crit_id, saved])
+        return groups
+
+    @staticmethod
+    def plan(groups):
+        """ Return {duplicate id: id kept} and {id kept: new signature} """
+
+        merges, signatures = {}, {}
+        for signature, members in groups.items():
+            # Keep the row that has this signature already, or the oldest
+            keep, saved = members[0]
+            for crit_id, crit_saved in members:
+                if crit_saved == signature:
+                    keep, saved = crit_id, crit_saved
+            for crit_id, _ in members:
+                if crit_id != keep:
+                    merges[crit_id] = keep
+            if saved != signature:
+                signatures[keep] = signature
+        return [merges, signatures]
+
+    def batches(self, ids):
+        """ Split ids into lists of batch size """
+
+        ids = sorted(ids)
+        for start in range(0, len(ids), self.batch):
+            yield ids[start:start + self.batch]
+
+    def move_rows(self, model, merges):
+        """ Point rows of model at the criteria kept, one query per batch """
+
+        moved = 0
+        for chunk in self.batches(merges):
+            kept = Case(*[When(criteria_id=crit_id,
+                               then=Value(merges[crit_id]))
+                          for crit_id in chunk],
+                        output_field=IntegerField())
+            moved += model.objects.filter(
+                criteria_id__in=chunk).update(criteria=kept)
+        return moved
+
+    def move_profiles(self, merges):
+        """ Point profiles at the criteria kept """
+
+        moved = self.move_rows(Profile, merges)
+        if self.verbosity > 1:
+            print(f"Profiles moved: {moved}")
+        return moved
+
+    def move_mail_jobs(self, merges):
+        """ Point mail jobs at the criteria kept, so they are not deleted """
+
+        moved = self.move_rows(MailJob, merges)
+        if self.verbosity > 1:
+            print(f"Mail jobs moved: {moved}")
+        return moved
+
+    def delete_duplicates(self, merges):
+        """ Delete duplicates, their impacts and saved search results """
+
+        # Bump CRITERIA_DATA once, not for each row deleted
+        post_delete.disconnect(criteria_changed, sender=Criteria)
+        try:
+            for chunk in self.batches(merges):
+                Criteria.objects.filter(id__in=chunk).delete()
+                if self.verbosity > 1:
+                    print(f"Deleted {len(chunk)} duplicates")
+        finally:
+            post_delete.connect(criteria_changed, sender=Criteria)
+        return None
+
+    def set_signatures(self, signatures):
+        """ Save the signature of each criteria kept """
+
+        # Clear them first, so no row briefly has another row's signature
+        for chunk in self.batches(signatures):
+            Criteria.objects.filter(id__in=chunk).update(signature=None)
+
+        rows = [Criteria(id=crit_id, signature=signature)
+                for crit_id, signature in signatures.items()]
+        Criteria.objects.bulk_update(rows, ['signature'],
+                                     batch_size=self.batch)
+        return None
+
+# end of module
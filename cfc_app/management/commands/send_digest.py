@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Email the weekly digest of new and changed laws to profile users.
+
+Invoke with:  python manage.py send_digest
+Specify --help for details on parameters available.
+
+Run after analyze_text, as the last step of weekly.sh, or by the
+d_send_digest task.  Each profile user with an email address gets one
+message listing the laws added or changed since the last digest that
+match the location and impacts of their profile.  See cfc_app/digest.py.
+
+Written by Tony Pearson, IBM, 2021
+Licensed under Apache 2.0, see LICENSE for details
+"""
+
+# System imports
+import logging
+
+# Django and other third-party imports
+from django.core.management.base import BaseCommand, CommandError
+
+# Application imports
+from cfc_app.digest import send_digest
+from cfc_app.log_time import LogTime
+from cfc_app.mailer import mail_configured, queue_options
+
+# Debug with:  import pdb; pdb.set_trace()
+logger = logging.getLogger(__name__)
+
+
+class DigestError(CommandError):
+    """ customized error for this command. """
+    pass
+
+
+class Command(BaseCommand):
+    """ Command handler for send_digest """
+
+    help = ("Email each profile user the laws added or changed since the "
+            "last digest that match their profile.  Specify --dry-run "
+            "to only count the messages.")
+
+    def add_arguments(self, parser):
+        """ add arguments for parsing """
+
+        parser.add_argument("--dry-run", action="store_true",
+                            help="Count messages, but send nothing")
+        parser.add_argument("--batch", type=int,
+                            default=queue_options()['batch'],
+                            help="Messages sent per call to the backend")
+        return None
+
+    def handle(self, *args, **options):
+        """ handle send_digest command """
+
+        timing = LogTime("send_digest")
+        timing.start_time(options['verbosity'])
+
+        dry_run = options['dry_run']
+        if not dry_run and not mail_configured():
+            raise DigestError("Email not configured, set EMAIL_HOST")
+
+        digest = send_digest(dry_run=dry_run,
+                             batch_size=max(options['batch'], 1))
+        print(f"Laws changed: {digest.laws}, criteria matched: "
+              f"{digest.criteria}, profiles: {digest.profiles}")
+        if not dry_run:
+            print(f"Messages sent: {digest.sent}, failed: {digest.failed} "
+                  f"(queued to be sent again)")
+
+        timing.end_time(options['verbosity'])
+        return None
+
+# end of module
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Run Django-Q cluster with NLTK punkt and word map already loaded.
+
+This replaces "manage.py qcluster" for background tasks in tasks.py.
+The shared state in cfc_app/warm_state.py is loaded once, before the
+cluster workers are forked, so each scheduled extract_files or
+analyze_text task starts without downloading NLTK data or parsing
+wordmap.csv again.  Jobs are taken from the Django ORM broker set in
+Q_CLUSTER in settings.py.
+
+Invoke with:  python manage.py warm_worker
+Specify --help for details on parameters available.
+
+Written by Tony Pearson, IBM, 2021
+Licensed under Apache 2.0, see LICENSE for details
+"""
+
+# System imports
+import logging
+
+# Django and other third-party imports
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django_q.brokers import get_broker
+from django_q.cluster import Cluster
+
+# Application imports
+from cfc_app.models import Impact
+from cfc_app.warm_state import warm_up
+
+# Debug with:  import pdb; pdb.set_trace()
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    """ Command handler for warm_worker """
+
+    help = ("Load NLTK punkt tokenizer and wordmap.csv once, then run "
+            "the Django-Q cluster to process background tasks.")
+
+    def add_arguments(self, parser):
+        """ add arguments for parsing """
+
+        parser.add_argument("--run-once", action="store_true",
+                            help="Warm up, start the cluster, then stop")
+        return None
+
+    def handle(self, *args, **options):
+        """ handle warm_worker command """
+
+        impacts = Impact.objects.all().exclude(iname='None')
+        impact_list = [imp.iname for imp in impacts]
+
+        timings = warm_up(impact_list)
+        warm_msg = (f"Warm start in {timings['total']:.2f} seconds "
+                    f"(punkt {timings['punkt']:.2f}, "
+                    f"wordmap {timings['wordmap']:.2f})")
+        logger.info(f"58:{warm_msg}")
+        if options['verbosity']:
+            print(warm_msg)
+
+        # Workers are forked from this process, and must not share
+        # its database connections.
+        connections.close_all()
+
+        cluster = Cluster(get_broker())
+        cluster.start()
+        if options['run_once']:
+            cluster.stop()
+        return None
+
+# end of module
@@ -0,0 +1,35 @@
+# Generated by Django 3.1.14 on 2026-10-17 12:45
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cfc_app', '0014_auto_20210303_0242'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DataVersion',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=40, unique=True)),
+                ('version', models.PositiveIntegerField(default=0)),
+                ('date_changed', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='SearchResult',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('crtext', models.CharField(max_length=200, null=True)),
+                ('version', models.PositiveIntegerField(default=0)),
+                ('numlaws', models.PositiveIntegerField(default=0)),
+                ('law_ids', models.TextField(blank=True)),
+                ('date_added', models.DateTimeField(auto_now=True)),
+                ('criteria', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='result', to='cfc_app.criteria')),
+            ],
+        ),
+    ]
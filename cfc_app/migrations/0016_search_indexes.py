@@ -0,0 +1,21 @@
+# Generated by Django 3.1.14 on 2026-10-17 12:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cfc_app', '0015_dataversion_searchresult'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='hash',
+            index=models.Index(fields=['fob_method', 'item_name'], name='hash_prefix_idx', opclasses=['varchar_pattern_ops', 'varchar_pattern_ops']),
+        ),
+        migrations.AddIndex(
+            model_name='law',
+            index=models.Index(fields=['location', 'impact', 'key', 'id'], name='law_search_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.1.14 on 2026-10-17 12:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cfc_app', '0016_search_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='criteria',
+            name='signature',
+            field=models.CharField(blank=True, max_length=200, null=True, unique=True),
+        ),
+    ]
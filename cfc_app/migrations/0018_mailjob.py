@@ -0,0 +1,31 @@
+# Generated by Django 3.1.14 on 2026-10-17 13:03
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('cfc_app', '0017_criteria_signature'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MailJob',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('recipient', models.CharField(max_length=320)),
+                ('status', models.CharField(db_index=True, default='queued', max_length=10)),
+                ('attempts', models.PositiveSmallIntegerField(default=0)),
+                ('error', models.CharField(blank=True, max_length=200)),
+                ('retry_at', models.DateTimeField(blank=True, null=True)),
+                ('date_added', models.DateTimeField(auto_now_add=True)),
+                ('date_sent', models.DateTimeField(blank=True, null=True)),
+                ('criteria', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='mail_jobs', to='cfc_app.criteria')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='mail_jobs', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+    ]
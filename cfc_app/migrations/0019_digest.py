@@ -0,0 +1,42 @@
+# Generated by Django 3.1.14 on 2026-10-17 13:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cfc_app', '0018_mailjob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Digest',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('since', models.DateTimeField()),
+                ('until', models.DateTimeField()),
+                ('laws', models.PositiveIntegerField(default=0)),
+                ('criteria', models.PositiveIntegerField(default=0)),
+                ('profiles', models.PositiveIntegerField(default=0)),
+                ('sent', models.PositiveIntegerField(default=0)),
+                ('failed', models.PositiveIntegerField(default=0)),
+                ('date_added', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'ordering': ['-until'],
+            },
+        ),
+        # Added as NULL first, so existing laws are not all counted as
+        # changed today by the first digest
+        migrations.AddField(
+            model_name='law',
+            name='date_changed',
+            field=models.DateTimeField(db_index=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='law',
+            name='date_changed',
+            field=models.DateTimeField(auto_now=True, db_index=True, null=True),
+        ),
+    ]
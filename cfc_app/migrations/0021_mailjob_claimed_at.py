@@ -0,0 +1,18 @@
+# Generated by Django 3.1.14 on 2026-10-17 13:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cfc_app', '0019_digest'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='mailjob',
+            name='claimed_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
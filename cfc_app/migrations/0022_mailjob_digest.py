@@ -0,0 +1,19 @@
+# Generated by Django 3.1.14 on 2026-10-17 13:33
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cfc_app', '0021_mailjob_claimed_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='mailjob',
+            name='digest',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='mail_jobs', to='cfc_app.digest'),
+        ),
+    ]
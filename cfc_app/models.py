@@ -11,13 +11,43 @@ Licensed under Apache 2.0, see LICENSE for details
 # System imports
 import datetime as DT
 import logging
+import time
 
 # Django and other third-party imports
-from django.db import models
+from django.db import IntegrityError, connection, models, transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
 from django.conf import settings
+from django.utils import timezone
 
 LEFT_CORNER = u"\u2514\u2500\u2002"
 LEFT_PAD = u"\u2002\u2002\u2002\u2002"
+LAW_DATA = 'law'    # DataVersion bumped when Law, Location, Impact change
+CRITERIA_DATA = 'criteria'  # ... when Criteria or Profile rows change
+TREE_MAX_AGE = 300  # seconds a process keeps locations saved elsewhere
+
+# On PostgreSQL, follow parent_id up to 'world', which is its own parent,
+# or down from a location, each in a single recursive query.
+ANCESTOR_CTE = """
+WITH RECURSIVE chain(id, parent_id, depth) AS (
+    SELECT id, parent_id, 0 FROM cfc_app_location WHERE id = %s
+  UNION ALL
+    SELECT loc.id, loc.parent_id, chain.depth + 1
+    FROM cfc_app_location loc JOIN chain ON loc.id = chain.parent_id
+    WHERE chain.parent_id <> chain.id AND chain.depth < 10
+)
+SELECT loc.* FROM cfc_app_location loc JOIN chain ON loc.id = chain.id
+ORDER BY chain.depth"""
+
+DESCENDANT_CTE = """
+WITH RECURSIVE tree(id) AS (
+    SELECT id FROM cfc_app_location WHERE parent_id = %s AND id <> %s
+  UNION
+    SELECT loc.id FROM cfc_app_location loc JOIN tree
+    ON loc.parent_id = tree.id AND loc.id <> loc.parent_id
+)
+SELECT * FROM cfc_app_location WHERE id IN (SELECT id FROM tree)
+ORDER BY hierarchy"""
 
 # import pdb; pdb.set_trace()
 logger = logging.getLogger(__name__)
@@ -68,6 +98,39 @@ class Location(models.Model):
         loc_string = self.padding() + self.longname
         return loc_string
 
+    def ancestors(self):
+        """ This location, its parent, and so on up to 'world' """
+        return LOCATION_TREE.ancestors(self)
+
+    def descendants(self):
+        """ All locations below this one, in hierarchy order """
+        return LOCATION_TREE.descendants(self)
+
+    def ancestor_query(self):
+        """ Read this location and its ancestors, in one query """
+
+        if connection.vendor == 'postgresql':
+            return list(Location.objects.raw(ANCESTOR_CTE, [self.id]))
+
+        # Elsewhere, find the parents by the prefixes of the hierarchy,
+        # so 'world.usa.az' finds 'world.usa' and 'world'.
+        parts = self.hierarchy.split('.')
+        paths = ['.'.join(parts[:num]) for num in range(len(parts) - 1, 0, -1)]
+        found = {loc.hierarchy: loc
+                 for loc in Location.objects.filter(hierarchy__in=paths)}
+        return [self] + [found[path] for path in paths if path in found]
+
+    def descendant_query(self):
+        """ Read all locations below this one, in one query """
+
+        if connection.vendor == 'postgresql':
+            return list(Location.objects.raw(DESCENDANT_CTE,
+                                             [self.id, self.id]))
+
+        below = Location.objects.filter(
+            hierarchy__startswith=self.hierarchy + '.')
+        return list(below.order_by('hierarchy'))
+
     @staticmethod
     def load_defaults():
         """ set location defaults if cfc_seed.json not used
@@ -111,6 +174,60 @@ class Location(models.Model):
         ohio.save()
         return None
 
+
+class LocationTree():
+    """ Ancestors and descendants of each location, kept in memory
+
+    Each list is read with one query the first time it is needed, and
+    kept until a Location is saved or deleted by this process, or for
+    TREE_MAX_AGE seconds, so that changes made by other processes are
+    seen as well.
+    """
+
+    def __init__(self, max_age=TREE_MAX_AGE):
+        self.max_age = max_age
+        self.clear()
+        return None
+
+    def clear(self):
+        """ Forget all locations read so far """
+
+        self.chains = {}
+        self.trees = {}
+        self.loaded = time.monotonic()
+        return None
+
+    def expire(self):
+        """ Clear the cache if it is older than max_age """
+
+        if time.monotonic() - self.loaded > self.max_age:
+            self.clear()
+        return None
+
+    def ancestors(self, location):
+        """ [location, parent, ..., world] """
+
+        self.expire()
+        chain = self.chains.get(location.id)
+        if chain is None:
+            chain = location.ancestor_query()
+            self.chains[location.id] = chain
+        return list(chain)
+
+    def descendants(self, location):
+        """ Locations below location """
+
+        self.expire()
+        tree = self.trees.get(location.id)
+        if tree is None:
+            tree = location.descendant_query()
+            self.trees[location.id] = tree
+        return list(tree)
+
+
+LOCATION_TREE = LocationTree()
+
+
 class Impact(models.Model):
     """A location helps filter which legislation to look at."""
 
@@ -148,6 +265,104 @@ class Impact(models.Model):
         return None
 
 
+class ReferenceData():
+    """ Impact and Location rows, kept in memory
+
+    Both tables are small and rarely change, but are read by every
+    search and profile form, and for each law saved by analyze_text.
+    All rows of a table are read with one query the first time they are
+    needed, and kept until an Impact or Location is saved or deleted by
+    this process, or for TREE_MAX_AGE seconds.
+    """
+
+    def __init__(self, max_age=TREE_MAX_AGE):
+        self.max_age = max_age
+        self.clear()
+        return None
+
+    def clear(self):
+        """ Forget all rows read so far """
+
+        self.impact_rows = None
+        self.location_rows = None
+        self.loaded = time.monotonic()
+        return None
+
+    def expire(self):
+        """ Clear the cache if it is older than max_age """
+
+        if time.monotonic() - self.loaded > self.max_age:
+            self.clear()
+        return None
+
+    def impact_index(self):
+        """ {'all': [impacts], 'id': {id: impact}, 'name': {...}} """
+
+        self.expire()
+        index = self.impact_rows
+        if index is None:
+            rows = list(Impact.objects.order_by('date_added'))
+            index = {'all': rows,
+                     'id': {imp.id: imp for imp in rows},
+                     'name': {imp.iname: imp for imp in rows}}
+            self.impact_rows = index
+        return index
+
+    def location_index(self):
+        """ {'all': [locations], 'id': {id: location}, ...} """
+
+        self.expire()
+        index = self.location_rows
+        if index is None:
+            rows = list(Location.objects.order_by('hierarchy'))
+            index = {'all': rows,
+                     'id': {loc.id: loc for loc in rows},
+                     'short': {loc.shortname: loc for loc in rows},
+                     'legiscan': {loc.legiscan_id: loc for loc in rows
+                                  if loc.legiscan_id > 0}}
+            self.location_rows = index
+        return index
+
+    def impacts(self, include_none=False):
+        """ Impacts in the order added, without 'None' unless asked """
+
+        rows = self.impact_index()['all']
+        if include_none:
+            return list(rows)
+        return [imp for imp in rows if imp.iname != 'None']
+
+    def impact(self, iname):
+        """ Impact with this name, None if not found """
+        return self.impact_index()['name'].get(iname)
+
+    def impact_id(self, impact_id):
+        """ Impact with this id, None if not found """
+        return self.impact_index()['id'].get(impact_id)
+
+    def locations(self, include_world=False):
+        """ Locations in hierarchy order, without 'world' unless asked """
+
+        rows = self.location_index()['all']
+        if include_world:
+            return list(rows)
+        return [loc for loc in rows if loc.shortname != 'world']
+
+    def location(self, shortname):
+        """ Location with this shortname, None if not found """
+        return self.location_index()['short'].get(shortname)
+
+    def location_id(self, location_id):
+        """ Location with this id, None if not found """
+        return self.location_index()['id'].get(location_id)
+
+    def legiscan_location(self, legiscan_id):
+        """ Location with this Legiscan state id, None if not found """
+        return self.location_index()['legiscan'].get(legiscan_id)
+
+
+REFERENCE_DATA = ReferenceData()
+
+
 class Criteria(models.Model):
     """ Criteria of anonymous or user-profile search """
 
@@ -164,6 +379,11 @@ class Criteria(models.Model):
 
     impacts = models.ManyToManyField(Impact)
 
+    # Location id and sorted impact ids, see criteria_signature().  Rows
+    # saved before this column was added are NULL until merge_criteria.
+    signature = models.CharField(max_length=200, null=True, blank=True,
+                                 unique=True)
+
     def __str__(self):
         """Return a string representation of the model."""
         key = str(self.id)
@@ -177,6 +397,32 @@ class Criteria(models.Model):
         self.crtext = crit_text
         return self.crtext
 
+    @staticmethod
+    def find_or_create(location, impacts):
+        """ Criteria for this location and impacts, saved if new
+
+        Searches and profiles with the same location and impacts share
+        one Criteria row, and so share its saved search results.
+        """
+
+        impacts = sorted(impacts, key=lambda imp: (imp.date_added, imp.id))
+        signature = criteria_signature(location.id,
+                                       [imp.id for imp in impacts])
+        crit = Criteria.objects.filter(signature=signature).first()
+        if crit is not None:
+            return crit
+
+        crit = Criteria(location=location, signature=signature,
+                        crtext=criteria_string(location, impacts))
+        try:
+            with transaction.atomic():
+                crit.save()
+                crit.impacts.set(impacts)
+        except IntegrityError:
+            # Saved by another request since the lookup above
+            crit = Criteria.objects.get(signature=signature)
+        return crit
+
 
 def criteria_string(location, impact_list):
     """ Combine location and impacts into a single text string """
@@ -186,19 +432,17 @@ def criteria_string(location, impact_list):
     return crit_text
 
 
+def criteria_signature(location_id, impact_ids):
+    """ Canonical text for a location and set of impacts: '3:2-5-6' """
+    impact_text = '-'.join(str(num) for num in sorted(set(impact_ids)))
+    return f"{location_id or 0}:{impact_text}"
+
+
 def find_criteria_id(crit_text):
     """ Find criteria entry that matches location and impacts """
-    crit_id = 0
-    crits = Criteria.objects.all()
-    if crits:
-        for crit in crits:
-            crit_string = criteria_string(crit.location,
-                                          crit.impacts.all())
-            if crit_string == crit_text:
-                crit_id = crit.id
-                break
-
-    return crit_id
+    crit_id = Criteria.objects.filter(crtext=crit_text).values_list(
+        'id', flat=True).order_by('id').first()
+    return crit_id or 0
 
 
 def impact_seq(impact_list):
@@ -219,6 +463,15 @@ class Law(models.Model):
         app_label = 'cfc_app'
         verbose_name_plural = "laws"  # plural of legislation
         ordering = ['key']
+        indexes = [
+            # Search by location and impacts for the key and id of the
+            # laws found, without reading the table itself.  The ids are
+            # sorted by key in search_results, see search.py.
+            models.Index(fields=['location', 'impact', 'key', 'id'],
+                         name='law_search_idx'),
+        ]
+        # key__startswith needs no index of its own.  On PostgreSQL,
+        # Django adds a varchar_pattern_ops index for the unique key.
 
     key = models.CharField(max_length=25, null=False,
                            unique=True, default=get_default_law_key)
@@ -240,6 +493,11 @@ class Law(models.Model):
 
     cite_url = models.URLField(max_length=200, null=True)
 
+    # When the law was added or its contents last changed, for the weekly
+    # digest.  Laws saved before this column was added are NULL.
+    date_changed = models.DateTimeField(auto_now=True, null=True,
+                                        db_index=True)
+
     def __str__(self):
         """Return a string representation of the model."""
         law_string = str(self.title)
@@ -253,6 +511,201 @@ class Law(models.Model):
         return law_string
 
 
+class DataVersion(models.Model):
+    """ Version of a set of tables, bumped each time their rows change """
+
+    class Meta:
+        """ set application label """
+        app_label = 'cfc_app'
+
+    name = models.CharField(max_length=40, unique=True)
+    version = models.PositiveIntegerField(default=0)
+    date_changed = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        """Return a string representation of the model."""
+        return f'{self.name} v{self.version}'
+
+    @staticmethod
+    def current(name=LAW_DATA):
+        """ Current version, 0 if never changed """
+
+        version = DataVersion.objects.filter(name=name).values_list(
+            'version', flat=True).first()
+        return version or 0
+
+    @staticmethod
+    def bump(name=LAW_DATA):
+        """ Increase the version, so results saved before are rebuilt """
+
+        changed = DataVersion.objects.filter(name=name).update(
+            version=models.F('version') + 1, date_changed=timezone.now())
+        if not changed:
+            DataVersion.objects.get_or_create(name=name,
+                                              defaults={'version': 1})
+        return None
+
+
+class SearchResult(models.Model):
+    """ Laws found for a Criteria, kept until the Law data changes """
+
+    class Meta:
+        """ set application label """
+        app_label = 'cfc_app'
+
+    criteria = models.OneToOneField('cfc_app.Criteria',
+                                    related_name='result',
+                                    on_delete=models.CASCADE)
+
+    # Criteria text and DataVersion of LAW_DATA when the search was run
+    crtext = models.CharField(max_length=200, null=True)
+    version = models.PositiveIntegerField(default=0)
+
+    numlaws = models.PositiveIntegerField(default=0)
+    law_ids = models.TextField(blank=True)    # comma-separated, in key order
+    date_added = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        """Return a string representation of the model."""
+        return f'{self.criteria_id} v{self.version} ({self.numlaws} laws)'
+
+    def is_current(self, criteria, version):
+        """ Can these results be shown for criteria as it is now? """
+        return self.crtext == criteria.crtext and self.version == version
+
+    def id_list(self):
+        """ Law ids found, in key order """
+        return [int(law_id) for law_id in self.law_ids.split(',') if law_id]
+
+
+class MailJob(models.Model):
+    """ Search results or a digest to be emailed by a django-q task """
+
+    QUEUED = 'queued'
+    SENDING = 'sending'
+    SENT = 'sent'
+    FAILED = 'failed'
+
+    class Meta:
+        """ set application label """
+        app_label = 'cfc_app'
+
+    user = models.ForeignKey(settings.AUTH_USER_MODEL,
+                             related_name='mail_jobs',
+                             on_delete=models.CASCADE)
+
+    criteria = models.ForeignKey('cfc_app.Criteria',
+                                 related_name='mail_jobs',
+                                 on_delete=models.CASCADE)
+
+    # Set for a weekly digest message to be tried again, see digest.py
+    digest = models.ForeignKey('cfc_app.Digest', null=True, blank=True,
+                               related_name='mail_jobs',
+                               on_delete=models.CASCADE)
+
+    recipient = models.CharField(max_length=320)
+    status = models.CharField(max_length=10, default=QUEUED, db_index=True)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    error = models.CharField(max_length=200, blank=True)
+    retry_at = models.DateTimeField(null=True, blank=True)
+    # When a task set status to sending.  A job still sending after
+    # MAIL_QUEUE['lease'] seconds is claimed again, see mailer.claim()
+    claimed_at = models.DateTimeField(null=True, blank=True)
+    date_added = models.DateTimeField(auto_now_add=True)
+    date_sent = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        """Return a string representation of the model."""
+        return f'{self.id} {self.recipient} ({self.status})'
+
+    def state(self):
+        """ Status handle shown to the user, as a dict """
+        return {'id': self.id, 'status': self.status,
+                'attempts': self.attempts, 'error': self.error,
+                'date_sent': self.date_sent}
+
+
+class Digest(models.Model):
+    """ Weekly digest of new and changed laws emailed to profile users """
+
+    class Meta:
+        """ set application label and ordering """
+        app_label = 'cfc_app'
+        ordering = ['-until']
+
+    # Laws with date_changed after since, up to until, were included
+    since = models.DateTimeField()
+    until = models.DateTimeField()
+
+    laws = models.PositiveIntegerField(default=0)
+    criteria = models.PositiveIntegerField(default=0)
+    profiles = models.PositiveIntegerField(default=0)
+    sent = models.PositiveIntegerField(default=0)
+    failed = models.PositiveIntegerField(default=0)
+    date_added = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        """Return a string representation of the model."""
+        return f'{self.until:%Y-%m-%d} ({self.sent} sent)'
+
+    @staticmethod
+    def last_until():
+        """ End of the most recent digest, None if never run """
+        return Digest.objects.values_list('until', flat=True).first()
+
+
+@receiver(post_save, sender=Law)
+@receiver(post_delete, sender=Law)
+@receiver(post_save, sender=Location)
+@receiver(post_delete, sender=Location)
+@receiver(post_save, sender=Impact)
+@receiver(post_delete, sender=Impact)
+def law_data_changed(sender, **kwargs):
+    """ Saved search results are out of date when laws change """
+
+    if sender is None and kwargs is None:   # Eliminate pylint errors
+        pass
+
+    DataVersion.bump(LAW_DATA)
+
+
+@receiver(post_save, sender=Criteria)
+@receiver(post_delete, sender=Criteria)
+@receiver(m2m_changed, sender=Criteria.impacts.through)
+def criteria_changed(sender, **kwargs):
+    """ Cached pages listing criteria are out of date """
+
+    if sender is None and kwargs is None:   # Eliminate pylint errors
+        pass
+
+    if kwargs.get('action', 'post_').startswith('post_'):
+        DataVersion.bump(CRITERIA_DATA)
+
+
+@receiver(post_save, sender=Location)
+@receiver(post_delete, sender=Location)
+def location_changed(sender, **kwargs):
+    """ Read ancestors and descendants again after a Location changes """
+
+    if sender is None and kwargs is None:   # Eliminate pylint errors
+        pass
+
+    LOCATION_TREE.clear()
+
+
+@receiver(post_save, sender=Impact)
+@receiver(post_delete, sender=Impact)
+@receiver(post_save, sender=Location)
+@receiver(post_delete, sender=Location)
+def reference_changed(sender, **kwargs):
+    """ Read Impact and Location rows again after either changes """
+
+    if sender is None and kwargs is None:   # Eliminate pylint errors
+        pass
+
+    REFERENCE_DATA.clear()
+
+
 class Hash(models.Model):
     """ Track hash codes of files stored in FOB_Storage """
 
@@ -263,6 +716,13 @@ class Hash(models.Model):
         verbose_name_plural = "hashcodes"  # plural of hash
         ordering = ['item_name']
         unique_together = ('item_name', 'fob_method',)
+        indexes = [
+            # HashStore.load() reads all items of a prefix and fob_method
+            models.Index(fields=['fob_method', 'item_name'],
+                         name='hash_prefix_idx',
+                         opclasses=['varchar_pattern_ops',
+                                    'varchar_pattern_ops']),
+        ]
 
     item_name = models.CharField(max_length=255, null=False)
     fob_method = models.CharField(max_length=6, null=False)
@@ -292,8 +752,8 @@ def delete_if_exists(name, mode=settings.FOB_METHOD):
     return None
 
 
-def save_source_hash(bill_hash, detail):
-    """ Save hashcode to cfc_app_hash table """
+def save_source_hash(bill_hash, detail, store=None):
+    """ Save hashcode to cfc_app_hash table, or to HashStore if given """
 
     if bill_hash is None:
         bill_hash = Hash()
@@ -304,38 +764,41 @@ def save_source_hash(bill_hash, detail):
         bill_hash.hashcode = detail.hashcode
         bill_hash.objsize = detail.doc_size
         logger.debug(f"302:INSERT cfc_app_law: {detail.bill_name}")
-        bill_hash.save()
 
     else:
         bill_hash.generated_date = detail.doc_date
         bill_hash.hashcode = detail.hashcode
         bill_hash.objsize = detail.doc_size
         logger.debug(f"309:UPDATE cfc_app_law: {detail.bill_name}")
-        bill_hash.save()
 
+    if store is None:
+        bill_hash.save()
+    else:
+        store.save(bill_hash)
     return None
 
 
-def save_entry_to_hash(session_name, entry):
-    """ Save hashcode in cfc_app_hash database table """
+def save_entry_to_hash(session_name, entry, store=None):
+    """ Save hashcode in cfc_app_hash table, or to HashStore if given """
+
+    if store is None:
+        find_hash = Hash.find_item_name(session_name)
+    else:
+        find_hash = store.find(session_name)
 
-    find_hash = Hash.find_item_name(session_name)
     if find_hash is None:
         find_hash = Hash()
         find_hash.item_name = session_name
         find_hash.fob_method = settings.FOB_METHOD
         find_hash.legdesc = entry['session_name']
-        find_hash.generated_date = entry['dataset_date']
-        find_hash.hashcode = entry['dataset_hash']
-        find_hash.objsize = entry['dataset_size']
-        find_hash.save()
+    find_hash.generated_date = entry['dataset_date']
+    find_hash.hashcode = entry['dataset_hash']
+    find_hash.objsize = entry['dataset_size']
 
-    else:
-        find_hash.generated_date = entry['dataset_date']
-        find_hash.hashcode = entry['dataset_hash']
-        find_hash.objsize = entry['dataset_size']
+    if store is None:
         find_hash.save()
-
+    else:
+        store.save(find_hash)
     return None
 
 # end of module
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Cache rendered pages in the Django cache configured in settings.CACHES.
+
+Each page is kept under a key made from the view name, the user, and
+the arguments of the view, such as the search criteria and page number
+of results.  The current DataVersion of the data shown is used as the
+cache version, so when analyze_text saves laws, or criteria and
+profiles change, the pages saved before are no longer found, and are
+rendered again.  Old versions expire with the cache TIMEOUT.
+
+Hits and misses are counted in the cache itself, so that health/ shows
+the hit ratio of all workers sharing a file or Redis cache.
+
+Written by Tony Pearson, IBM, 2021
+Licensed under Apache 2.0, see LICENSE for details
+"""
+
+# System imports
+import functools
+import hashlib
+import logging
+
+# Django and other third-party imports
+from django.conf import settings
+from django.core.cache import cache
+
+# Application imports
+from cfc_app.models import DataVersion, LAW_DATA
+
+# Debug with:  import pdb; pdb.set_trace()
+logger = logging.getLogger(__name__)
+
+STATS_KEY = 'page-stats'
+
+
+def page_key(request, name, parts):
+    """ Cache key for this view, user and view arguments """
+
+    user = request.user
+    who = f"{user.pk or 0}:{int(user.is_staff)}"
+    text = ':'.join([name, who] + [str(part) for part in parts])
+    digest = hashlib.md5(text.encode('UTF-8')).hexdigest()
+    return f"page:{name}:{digest}"
+
+
+def page_number(request):
+    """ Page of results asked for, '1' if not a number """
+
+    page = request.GET.get('page', '1')
+    if not page.isdigit():
+        page = '1'
+    return page
+
+
+def count(name):
+    """ Add one to the hits or misses counted in the cache """
+
+    key = f"{STATS_KEY}:{name}"
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, 1, timeout=None)
+    return None
+
+
+def cache_stats():
+    """ Cache backend, hits, misses and hit ratio of cached pages """
+
+    names = [f"{STATS_KEY}:hits", f"{STATS_KEY}:misses"]
+    found = cache.get_many(names)
+    hits, misses = [found.get(name, 0) for name in names]
+    ratio = 0.0
+    if hits + misses > 0:
+        ratio = round(hits / (hits + misses), 4)
+    backend = settings.CACHES['default']['BACKEND']
+    return {'backend': backend.rsplit('.', 1)[-1],
+            'hits': hits, 'misses': misses, 'ratio': ratio}
+
+
+def clear_stats():
+    """ Start counting hits and misses again """
+
+    cache.delete_many([f"{STATS_KEY}:hits", f"{STATS_KEY}:misses"])
+    return None
+
+
+def cached_page(name, data=LAW_DATA, key_parts=None):
+    """ Decorator to cache the page rendered by a view
+
+    The page is rendered again when the DataVersion named by data
+    changes.  key_parts(request, *args) may return more values for the
+    key, such as the page number, in addition to the view arguments.
+    Only successful GET requests are cached.
+    """
+
+    def decorator(view):
+
+        @functools.wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method != 'GET':
+                return view(request, *args, **kwargs)
+
+            parts = list(args) + [kwargs[arg] for arg in sorted(kwargs)]
+            if key_parts:
+                parts += key_parts(request, *args, **kwargs)
+            key = page_key(request, name, parts)
+            version = DataVersion.current(data)
+
+            response = cache.get(key, version=version)
+            if response is not None:
+                count('hits')
+                return response
+
+            count('misses')
+            response = view(request, *args, **kwargs)
+            if response.status_code == 200 and not response.streaming:
+                cache.set(key, response, version=version)
+                logger.debug(f"118:Cached {name} {key} v{version}")
+            return response
+
+        return wrapper
+
+    return decorator
+
+# end of module
@@ -30,6 +30,9 @@ Modified slightly from PDFminer.six example by Tony Pearson, IBM, 2020
 # SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
 
 # System imports
+import logging
+import multiprocessing
+import time
 
 # Django and other third-party imports
 from io import BytesIO, StringIO
@@ -40,33 +43,154 @@ from pdfminer.pdfdocument import PDFDocument
 from pdfminer.pdfinterp import PDFResourceManager, PDFPageInterpreter
 from pdfminer.pdfpage import PDFPage
 from pdfminer.pdfparser import PDFParser
+from pdfminer.pdftypes import resolve1
+
+# Debug with:   import pdb; pdb.set_trace()
+logger = logging.getLogger(__name__)
+
+PARALLEL_PAGES = 40    # PDFs shorter than this are not worth splitting
+PARALLEL_GRACE = 5     # seconds to start worker processes, see max_seconds
+
+
+def convert_page_range(binary_input, first, last, max_seconds=0):
+    """ Worker process: return [text, truncated] for pages first..last-1 """
+
+    miner = PDFtoText('', binary_input, max_seconds=max_seconds)
+    text = ''.join(miner.iter_pages(first, last))
+    return [text, miner.truncated]
 
 
 class PDFtoText():
     """
     Class to handle PDF files
+
+    max_pages and max_seconds limit the work done on a single PDF, so
+    that one pathological document cannot stall a run.  Zero means no
+    limit.  If a limit is reached, the pages converted so far are kept,
+    and truncated is set to True.
+
+    max_seconds is checked between pages, so a single page that never
+    finishes converting is not stopped by iter_pages.  convert_parallel
+    also waits no longer than max_seconds, plus PARALLEL_GRACE, for the
+    worker processes, and terminates any still running.
     """
 
-    def __init__(self, input_name, binary_input):
+    def __init__(self, input_name, binary_input, max_pages=0, max_seconds=0):
         """ Set save input file name """
         self.input_name = input_name
         self.binary_input = binary_input
+        self.max_pages = max_pages
+        self.max_seconds = max_seconds
+        self.truncated = False
         return None
 
-    def convert_to_text(self):
-        """ Set save input file name """
-        input_io = BytesIO(self.binary_input)
+    def page_count(self):
+        """ Number of pages, from the document catalog """
+        with BytesIO(self.binary_input) as in_file:
+            doc = PDFDocument(PDFParser(in_file))
+            pages = resolve1(doc.catalog['Pages'])
+            count = resolve1(pages['Count'])
+        return count
+
+    def over_budget(self, pageno, started):
+        """ Check page and time limits before converting page pageno """
+        reason = None
+        if self.max_pages and pageno >= self.max_pages:
+            reason = f"{self.max_pages} pages"
+        elif (self.max_seconds
+                and time.monotonic() - started >= self.max_seconds):
+            reason = f"{self.max_seconds} seconds"
+
+        if reason:
+            self.truncated = True
+            logger.warning(f"84:Stopped {self.input_name} at page "
+                           f"{pageno+1}, limit {reason}")
+        return reason is not None
+
+    def iter_pages(self, first=0, last=None):
+        """ Yield the text of each page, as soon as it is converted
+
+        Each page ends with a form feed, so joining the pages gives the
+        same text as converting the whole document at once.
+        """
+        started = time.monotonic()
         output_string = StringIO()
-        with input_io as in_file:
+        with BytesIO(self.binary_input) as in_file:
             parser = PDFParser(in_file)
             doc = PDFDocument(parser)
             rsrcmgr = PDFResourceManager()
             device = TextConverter(rsrcmgr, output_string, laparams=LAParams())
             interpreter = PDFPageInterpreter(rsrcmgr, device)
-            for page in PDFPage.create_pages(doc):
+            for pageno, page in enumerate(PDFPage.create_pages(doc)):
+                if pageno < first:
+                    continue
+                if last is not None and pageno >= last:
+                    break
+                if self.over_budget(pageno, started):
+                    break
                 interpreter.process_page(page)
+                yield output_string.getvalue()
+                output_string.seek(0)
+                output_string.truncate()
+        return None
 
-        return output_string.getvalue()
+    def convert_to_text(self, workers=0):
+        """ Convert all pages, splitting long PDFs across worker processes """
+        if workers > 1:
+            total = self.page_count()
+            count = total
+            if self.max_pages:
+                count = min(total, self.max_pages)
+            if count >= PARALLEL_PAGES:
+                textdata = self.convert_parallel(workers, count)
+                if count < total:
+                    self.over_budget(count, time.monotonic())
+                return textdata
+
+        return ''.join(self.iter_pages())
+
+    def convert_parallel(self, workers, count):
+        """ Convert page ranges in a process pool, join them in order """
+        step = -(-count // workers)
+        ranges = [[first, min(first + step, count)]
+                  for first in range(0, count, step)]
+
+        deadline = None
+        if self.max_seconds:
+            deadline = time.monotonic() + self.max_seconds + PARALLEL_GRACE
+
+        texts = []
+        # Use "spawn" so that child processes do not inherit the locks
+        # and database connections of the caller, same as WorkPool.
+        # A Pool is used, rather than a ProcessPoolExecutor, so that
+        # workers stuck on a page can be terminated.
+        procs = multiprocessing.get_context('spawn').Pool(len(ranges))
+        try:
+            results = [procs.apply_async(convert_page_range,
+                                         (self.binary_input, first, last,
+                                          self.max_seconds))
+                       for first, last in ranges]
+            for (first, last), result in zip(ranges, results):
+                timeout = None
+                if deadline is not None:
+                    timeout = max(deadline - time.monotonic(), 0)
+                try:
+                    text, truncated = result.get(timeout)
+                except multiprocessing.TimeoutError:
+                    logger.warning(f"171:Stopped {self.input_name} at page "
+                                   f"{first+1}, limit {self.max_seconds} "
+                                   f"seconds")
+                    text, truncated = '', True
+                texts.append(text)
+                if truncated:
+                    # Pages after a gap would not make sense
+                    self.truncated = True
+                    break
+        finally:
+            procs.terminate()
+            procs.join()
+
+        return ''.join(texts)
 
 
 if __name__ == "__main__":
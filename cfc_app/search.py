@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+cfc_app/search.py -- Find the laws for a search criteria
+
+The ids of the laws found are saved in a SearchResult, so that paging
+through the results, downloading them or sending them by email does not
+run the search again.  Used by the results views and the mailer task.
+
+Written by Tony Pearson, IBM, 2021
+Licensed under Apache 2.0, see LICENSE for details
+"""
+
+# System imports
+import logging
+
+# Django and other third-party imports
+
+# Application imports
+from cfc_app.models import Law, DataVersion, SearchResult, LAW_DATA
+
+# Debug with:  import pdb; pdb.set_trace()
+logger = logging.getLogger(__name__)
+
+LAW_CHUNK = 500           # Laws read per query, below SQLite variable limit
+
+
+def search_results(criteria):
+    """ Laws found for criteria, searched again only if data changed """
+
+    version = DataVersion.current(LAW_DATA)
+    result = SearchResult.objects.filter(criteria=criteria).first()
+    if result is not None and result.is_current(criteria, version):
+        return result
+
+    # Ancestor-search, laws for the location and all its parents
+    loc_list = criteria.location.ancestors()
+    impact_list = criteria.impacts.all()
+
+    laws_list = Law.objects.filter(location__in=loc_list)
+    laws_list = laws_list.filter(impact__in=impact_list)
+
+    # Sorted by key here, not by ORDER BY, so that the query reads only
+    # law_search_idx.  With ORDER BY key, SQLite scans the whole table in
+    # key order instead.
+    rows = laws_list.order_by().values_list('key', 'id')
+    law_ids = [law_id for _, law_id in sorted(rows)]
+
+    logger.debug(f"47:Search {criteria.id} v{version}: {len(law_ids)} laws")
+    result, _ = SearchResult.objects.update_or_create(
+        criteria=criteria,
+        defaults={'crtext': criteria.crtext, 'version': version,
+                  'numlaws': len(law_ids),
+                  'law_ids': ','.join(str(law_id) for law_id in law_ids)})
+    return result
+
+
+def result_laws(law_ids):
+    """ Law records for these ids, with location and impact, in order """
+
+    laws = []
+    for start in range(0, len(law_ids), LAW_CHUNK):
+        chunk = Law.objects.filter(id__in=law_ids[start:start+LAW_CHUNK])
+        laws.extend(chunk.select_related('location', 'impact'))
+    return laws
+
+# end of module
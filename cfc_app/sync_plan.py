@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Sync Plan -- Decide what fob_sync needs to delete, copy or re-hash
+
+Both listings are turned into sets, and all the cfc_app_hash rows for
+both FILE and OBJECT are read into a HashStore with one query each, so
+the plan is made in one pass over the item names.  fob_sync saves the
+hash codes of the plan items back through the same stores.  The plan
+can be printed with --dryrun, or applied by fob_sync.
+
+Each item in a copy plan has one of these actions:
+
+    add      not in target, copy it
+    update   source is newer and hash codes differ, copy it
+    verify   no source hash code yet, hash the source, then copy it
+             if it differs from the target
+    hash     no source hash code yet, --skip, hash the source only
+    touch    hash codes agree, save the target hash code and date
+
+Written by Tony Pearson, IBM, 2021
+Licensed under Apache 2.0, see LICENSE for details
+"""
+# System imports
+import logging
+
+# Django and other third-party imports
+
+# Application imports
+from cfc_app.hash_store import HashStore
+
+# import pdb; pdb.set_trace()
+logger = logging.getLogger(__name__)
+
+ADD = 'add'
+UPDATE = 'update'
+VERIFY = 'verify'
+HASH = 'hash'
+TOUCH = 'touch'
+DELETE = 'delete'
+
+COPY_ACTIONS = [ADD, UPDATE]
+
+
+def load_hashes(store, names, prefix=None):
+    """ Return {item_name: Hash} for these names, in one query """
+
+    store.load(prefix or '')
+    hashes = {}
+    for name in names:
+        record = store.rows.get(name)
+        if record is not None:
+            hashes[name] = record
+    return hashes
+
+
+class SyncItem():
+    """ One action of the plan """
+
+    def __init__(self, name, action, source_hash=None, target_hash=None):
+        self.name = name
+        self.action = action
+        self.source_hash = source_hash
+        self.target_hash = target_hash
+        return None
+
+    def __str__(self):
+        return f"{self.action:7} {self.name}"
+
+
+class SyncPlan():
+    """ Actions to make target storage look like source storage """
+
+    def __init__(self, from_fob, to_fob, stores=None):
+        self.from_fob = from_fob
+        self.to_fob = to_fob
+        self.stores = stores
+        if stores is None:
+            self.stores = {from_fob: HashStore(from_fob),
+                           to_fob: HashStore(to_fob)}
+        self.items = []
+        return None
+
+    def add(self, name, action, source_hash=None, target_hash=None):
+        """ Add action to the plan """
+
+        self.items.append(SyncItem(name, action, source_hash, target_hash))
+        return self
+
+    def counts(self):
+        """ Return {action: number of items} """
+
+        counts = {}
+        for item in self.items:
+            counts[item.action] = counts.get(item.action, 0) + 1
+        return counts
+
+    def show(self, verbosity=1):
+        """ Print the plan, listing each item if verbosity > 1 """
+
+        print(f"Plan from {self.from_fob} to {self.to_fob}:")
+        if verbosity > 1:
+            for item in self.items:
+                print('  ', item)
+        for action, count in sorted(self.counts().items()):
+            print(f"   {action:7} {count}")
+        return self
+
+    def plan_deletes(self, item_list, other_list, maxcount):
+        """ Delete items in item_list but not in other_list """
+
+        other_set = set(other_list)
+        for name in item_list:
+            if len(self.items) >= maxcount:
+                break
+            if name not in other_set:
+                self.add(name, DELETE)
+        return self
+
+    def plan_copies(self, item_list, other_list, maxcount, prefix=None,
+                    skip=False, done=None):
+        """ Copy items in item_list that are missing or out of date
+
+        done is {name: hashcode} of items copied by an interrupted run,
+        skipped if the source hash code is still the same.  No more than
+        maxcount add/update actions are planned.
+        """
+
+        done = done or {}
+        names = set(item_list)
+        other_set = set(other_list)
+        source_hashes = load_hashes(self.stores[self.from_fob], names,
+                                    prefix)
+        target_hashes = load_hashes(self.stores[self.to_fob], names, prefix)
+
+        copies = 0
+        for name in item_list:
+            if copies >= maxcount:
+                break
+            source_hash = source_hashes.get(name)
+            if (name in done and source_hash is not None
+                    and source_hash.hashcode == done[name]):
+                continue
+
+            target_hash = target_hashes.get(name)
+            action = None
+            if name not in other_set:
+                action = ADD
+            elif source_hash is None:
+                action = HASH if skip else VERIFY
+            elif skip:
+                if target_hash is None:
+                    action = TOUCH
+            elif target_hash is None:
+                action = TOUCH
+            elif source_hash.generated_date > target_hash.generated_date:
+                if source_hash.hashcode != target_hash.hashcode:
+                    action = UPDATE
+                else:
+                    action = TOUCH
+
+            if action:
+                self.add(name, action, source_hash, target_hash)
+                if action in COPY_ACTIONS:
+                    copies += 1
+
+        logger.debug(f"176:Plan {self.from_fob} to {self.to_fob} "
+                     f"{self.counts()}")
+        return self
+
+# end of module
@@ -17,10 +17,12 @@ from contextlib import redirect_stdout
 # Django and other third-party imports
 from django.core.management import call_command
 from django.conf import settings
+from django_q.tasks import async_task
 
 
 # Application imports
-
+from cfc_app.digest import retry_message
+from cfc_app.mailer import results_message, send_pending
 
 # Debugging options
 # return HttpResponse({variable to inspect})
@@ -34,6 +36,13 @@ logger = logging.getLogger(__name__)
 #########################
 
 
+def queued_message(job):
+    """ Search results, or a digest saved by a failed batch """
+    if job.digest_id:
+        return retry_message(job)
+    return results_message(job)
+
+
 def gen_output_name(cmd):
     today = datetime.now()
     gen_date = today.strftime("%Y-%m-%d")
@@ -81,10 +90,26 @@ def c_analyze_text():
         with redirect_stdout(outfile):
             call_command(cmd, '--api', '--skip', '--compare')
 
+    # Email the laws added or changed to profile users
+    async_task('cfc_app.tasks.d_send_digest')
+
     logger.info(f"84:task ended: c_analyze_text")
     return
 
 
+def d_send_digest():
+    logger.info(f"91:task started: d_send_digest")
+
+    cmd = 'send_digest'
+    logpath = gen_output_name(cmd)
+    with open(logpath, 'a+') as outfile:
+        with redirect_stdout(outfile):
+            call_command(cmd)
+
+    logger.info(f"99:task ended: d_send_digest")
+    return
+
+
 def fob_stats():
     logger.info(f"89:task started: fob_stats")
 
@@ -109,3 +134,13 @@ def fob_sync():
 
     logger.info(f"110:task ended: fob_sync")
     return
+
+
+def send_queued_mail():
+    logger.info(f"115:task started: send_queued_mail")
+
+    # Started by the sendmail view or send_digest, see cfc_app/mailer.py
+    sent = send_pending(queued_message)
+
+    logger.info(f"120:task ended: send_queued_mail, {sent} sent")
+    return sent
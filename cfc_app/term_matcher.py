@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Count whole-word, case-insensitive hits of many terms in one pass.
+
+WordMap used to compile  r"\\b" + term + r"\\b"  for each of the terms
+in wordmap.csv, for every bill, and scan the text once per term.  This
+builds an Aho-Corasick automaton once, and scans the text once.
+
+The counts are the same as re.findall() for each term: matches must be
+on a word boundary at both ends, and the matches of any one term do not
+overlap, but matches of different terms may.  Terms that contain regex
+special characters, such as "401(k)" or "U.S. Route 202", are still
+matched with their own compiled regex, as before.
+
+Written by Tony Pearson, IBM, 2021
+Licensed under Apache 2.0, see LICENSE for details
+"""
+
+# System imports
+from collections import deque
+import logging
+import re
+
+# Django and other third-party imports
+
+# Application imports
+
+# import pdb; pdb.set_trace()
+logger = logging.getLogger(__name__)
+
+REGEX_SPECIAL = set('.^$*+?{}[]\\|()')
+
+# re.IGNORECASE also matches these characters to ASCII letters
+CASE_FOLD = str.maketrans({'İ': 'i', 'ı': 'i',
+                           'ſ': 's', 'K': 'k'})
+
+WORD_CHAR = re.compile(r'\w')
+
+
+def is_literal(term):
+    """ True if the term can be matched without the regex engine """
+
+    return (term != '' and term.isascii()
+            and not REGEX_SPECIAL.intersection(term))
+
+
+def term_regex(term):
+    """ Regex used by WordMap for each term """
+    return re.compile(r"\b"+term+r"\b", re.IGNORECASE)
+
+
+def count_terms_regex(text, regex_list):
+    """ Count matches one term at a time, given [term, regex] pairs """
+
+    counts = {}
+    for term, rec in regex_list:
+        matches = rec.findall(text)
+        if matches:
+            counts[term] = len(matches)
+    return counts
+
+
+class TermMatcher():
+    """ Aho-Corasick automaton for a list of terms """
+
+    def __init__(self, terms):
+        self.terms = list(terms)
+        self.goto = [{}]
+        self.fail = [0]
+        self.output = [[]]
+        self.lengths = []
+        self.regex_list = []
+        self.literals = []
+
+        for term in self.terms:
+            if is_literal(term):
+                self.add_pattern(term.lower(), len(self.literals))
+                self.literals.append(term)
+                self.lengths.append(len(term))
+            else:
+                self.regex_list.append([term, term_regex(term)])
+
+        self.build_links()
+        logger.debug(f"89:TermMatcher literal={len(self.literals)} "
+                     f"regex={len(self.regex_list)} "
+                     f"states={len(self.goto)}")
+        return None
+
+    def add_pattern(self, pattern, index):
+        """ Add pattern to the trie """
+
+        node = 0
+        for char in pattern:
+            nxt = self.goto[node].get(char)
+            if nxt is None:
+                nxt = len(self.goto)
+                self.goto.append({})
+                self.fail.append(0)
+                self.output.append([])
+                self.goto[node][char] = nxt
+            node = nxt
+        self.output[node].append(index)
+        return None
+
+    def build_links(self):
+        """ Breadth-first pass to set failure links and outputs """
+
+        queue = deque(self.goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for char, child in self.goto[node].items():
+                queue.append(child)
+                state = self.fail[node]
+                while state and char not in self.goto[state]:
+                    state = self.fail[state]
+                link = self.goto[state].get(char, 0)
+                self.fail[child] = link
+                self.output[child] = self.output[child] + self.output[link]
+        return None
+
+    def count(self, text):
+        """ Return {term: count} for terms found in text """
+
+        lowered = text.translate(CASE_FOLD).lower()
+        if len(lowered) != len(text):
+            # Case folding changed the offsets, fall back to regex
+            regex_list = [[term, term_regex(term)] for term in self.literals]
+            counts = count_terms_regex(text, regex_list)
+        else:
+            counts = self.scan(text, lowered)
+
+        counts.update(count_terms_regex(text, self.regex_list))
+        return counts
+
+    def scan(self, text, lowered):
+        """ Single pass over lowered text, boundaries checked on text """
+
+        goto, fail, output = self.goto, self.fail, self.output
+        lengths = self.lengths
+        found = [0] * len(self.literals)
+        last_end = [0] * len(self.literals)
+
+        node = 0
+        for pos, char in enumerate(lowered):
+            while node and char not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(char, 0)
+            if not output[node]:
+                continue
+
+            end = pos + 1
+            for index in output[node]:
+                start = end - lengths[index]
+                if start < last_end[index]:
+                    continue    # overlaps previous match of this term
+                if (self.boundary(text, start)
+                        and self.boundary(text, end)):
+                    found[index] += 1
+                    last_end[index] = end
+
+        counts = {}
+        for index, hits in enumerate(found):
+            if hits:
+                counts[self.literals[index]] = hits
+        return counts
+
+    @staticmethod
+    def boundary(text, pos):
+        """ Same as regex \\b at this position of text """
+
+        before = pos > 0 and WORD_CHAR.match(text, pos - 1) is not None
+        after = WORD_CHAR.match(text, pos) is not None
+        return before != after
+
+# end of module
@@ -10,6 +10,7 @@ Licensed under Apache 2.0, see LICENSE for details
 
 # System imports
 # Django and other third-party imports
+from django.core.cache import cache
 from django.test import SimpleTestCase
 from django.test import Client
 from django.core.management import call_command
@@ -33,7 +34,8 @@ class HealthEndpointTests(SimpleTestCase):
 
         response = self.client.get('/health/')
         self.assertEqual(response.status_code, 200)
-        self.assertContains(response, '{"status": "UP"}')
+        self.assertEqual(response.json()['status'], 'UP')
+        self.assertIn('ratio', response.json()['cache'])
 
     def test_health_status_redirects(self):
         """ Test that '/health' is redirected to '/health/' with RC=301 """
@@ -44,6 +46,10 @@ class HealthEndpointTests(SimpleTestCase):
 class LocationsEndpointTests(TestCase):
     """ Locations Endpoint use to show all supported locations """
 
+    def setUp(self):
+        # Pages cached by an earlier test, rolled back since
+        cache.clear()
+
     def test_locations_template(self):
         """ Test that locations uses 'locations.html' template """
 
@@ -60,6 +66,10 @@ class LocationsEndpointTests(TestCase):
 class ImpactsEndpointTests(TestCase):
     """ Impacts Endpoint used to show the impact areas """
 
+    def setUp(self):
+        # Pages cached by an earlier test, rolled back since
+        cache.clear()
+
     def test_locations_template(self):
         """ Test that impacts uses 'impacts.html' template """
 
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+cfc_app/tests_cache.py -- Test content-addressed cache of extracted text
+
+Written by Tony Pearson, IBM, 2021
+Licensed under Apache 2.0, see LICENSE for details
+"""
+
+# System imports
+import os
+import tempfile
+
+# Django and other third-party imports
+from django.test import SimpleTestCase
+
+# Application imports
+from cfc_app.bill_detail import BillDetail
+from cfc_app.text_cache import TextCache
+from cfc_app.text_convert import convert_source
+
+HTML = b"<html><title>HB 1</title><p>1. Schools shall report.</p></html>"
+
+
+def html_detail():
+    """ Bill detail with the fields used by the TXT header """
+    detail = BillDetail()
+    detail.bill_name, detail.extension = 'AZ-HB1-1234-Y2021.html', 'html'
+    detail.bill_id, detail.doc_date = 1234, '2021-01-15'
+    detail.hashcode, detail.cite_url = 'a' * 32, 'https://example.com/hb1'
+    detail.title, detail.summary = 'Schools', 'Reporting by schools'
+    return detail
+
+
+class TextCacheTests(SimpleTestCase):
+    """ Hits, misses, versions and eviction """
+
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.dirname = self.tempdir.name
+
+    def tearDown(self):
+        self.tempdir.cleanup()
+
+    def test_hit_and_miss(self):
+        cache = TextCache(self.dirname, {'html': 1, 'pdf': 1})
+        key = TextCache.source_key(HTML)
+        self.assertIsNone(cache.get('html', key))
+        cache.put('html', key, 'Extracted text ')
+        self.assertEqual(cache.get('html', key), 'Extracted text ')
+        self.assertIsNone(cache.get('pdf', key))
+        self.assertEqual(cache.stats['hits'], 1)
+        self.assertEqual(cache.stats['misses'], 2)
+
+    def test_version_bump(self):
+        key = TextCache.source_key(HTML)
+        cache = TextCache(self.dirname, {'html': 1, 'pdf': 1})
+        cache.put('html', key, 'html text')
+        cache.put('pdf', key, 'pdf text')
+
+        # Directories not named <extension>-v<version> are not removed
+        for name in ['backup', 'txt-v1', 'html-v1-old']:
+            os.makedirs(os.path.join(self.dirname, name))
+
+        cache = TextCache(self.dirname, {'html': 2, 'pdf': 1})
+        self.assertEqual(cache.purge(), ['html-v1'])
+        self.assertEqual(sorted(os.listdir(self.dirname)),
+                         ['backup', 'html-v1-old', 'pdf-v1', 'txt-v1'])
+        self.assertIsNone(cache.get('html', key))
+        self.assertEqual(cache.get('pdf', key), 'pdf text')
+
+    def test_overwrite(self):
+        cache = TextCache(self.dirname, {'pdf': 1})
+        key = TextCache.source_key(HTML)
+        cache.put('pdf', key, 'x' * 10)
+        cache.put('pdf', key, 'y' * 4)
+        self.assertEqual(cache.size, 4)
+        self.assertEqual(TextCache(self.dirname, {'pdf': 1}).size, 4)
+
+    def test_eviction(self):
+        cache = TextCache(self.dirname, {'pdf': 1}, max_bytes=25)
+        for num in range(3):
+            cache.put('pdf', f"{num:064d}", 'x' * 10)
+            path = cache.entry_path('pdf', f"{num:064d}")
+            os.utime(path, (num, num))
+        self.assertEqual(cache.stats['evictions'], 1)
+        self.assertIsNone(cache.get('pdf', f"{0:064d}"))
+        self.assertLessEqual(cache.size, 25)
+
+    def test_cached_body(self):
+        textdata, body = convert_source(html_detail(), HTML)
+        self.assertIn("_TEXT_", textdata)
+        self.assertEqual(convert_source(html_detail(), b'', body=body),
+                         [textdata, None])
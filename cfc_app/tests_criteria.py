@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+cfc_app/tests_criteria.py -- Test shared criteria and merge_criteria
+
+Written by Tony Pearson, IBM, 2021
+Licensed under Apache 2.0, see LICENSE for details
+"""
+
+# System imports
+from contextlib import redirect_stdout
+import io
+
+# Django and other third-party imports
+from django.contrib.auth.models import AnonymousUser, User
+from django.core.management import call_command
+from django.db import connection
+from django.test import RequestFactory, TestCase
+from django.test.utils import CaptureQueriesContext
+
+# Application imports
+from cfc_app.models import (Location, Impact, Criteria, MailJob,
+                            SearchResult, criteria_signature,
+                            find_criteria_id)
+from cfc_app.views import search
+
+
+class CriteriaTests(TestCase):
+    """ One Criteria row for each location and set of impacts """
+
+    @classmethod
+    def setUpTestData(cls):
+        Location.load_defaults()
+        Impact.load_defaults()
+        cls.arizona = Location.objects.get(shortname='az')
+        cls.ohio = Location.objects.get(shortname='oh')
+        cls.jobs = Impact.objects.get(iname='Jobs')
+        cls.safety = Impact.objects.get(iname='Safety')
+
+    def make_duplicate(self, location, impacts):
+        """ Criteria saved the old way, without a signature """
+        crit = Criteria(location=location)
+        crit.save()
+        crit.impacts.set(impacts)
+        crit.set_text()
+        crit.save()
+        return crit
+
+    def merge(self, *args):
+        out = io.StringIO()
+        with redirect_stdout(out):
+            call_command('merge_criteria', *args)
+        return out.getvalue()
+
+    def test_signature(self):
+        self.assertEqual(criteria_signature(3, [6, 2, 5, 2]), '3:2-5-6')
+        self.assertEqual(criteria_signature(None, []), '0:')
+
+    def test_find_or_create(self):
+        crit = Criteria.find_or_create(self.arizona, [self.jobs, self.safety])
+        self.assertEqual(crit.crtext, 'world.usa.az-Safety-Jobs')
+        self.assertEqual(
+            crit.signature,
+            criteria_signature(self.arizona.id, [self.jobs.id,
+                                                 self.safety.id]))
+
+        with self.assertNumQueries(1):
+            again = Criteria.find_or_create(self.arizona,
+                                            [self.safety, self.jobs])
+        self.assertEqual(again.id, crit.id)
+        self.assertEqual(find_criteria_id('world.usa.az-Safety-Jobs'),
+                         crit.id)
+        self.assertEqual(find_criteria_id('world.usa.oh-Jobs'), 0)
+
+    def test_search_reuses_criteria(self):
+        factory = RequestFactory()
+        ids = []
+        for _ in range(2):
+            request = factory.post('/search/', {
+                'location': self.ohio.id,
+                'impacts': [self.jobs.id, self.safety.id]})
+            request.user = AnonymousUser()
+            response = search(request)
+            self.assertEqual(response.status_code, 302)
+            ids.append(response.url)
+        self.assertEqual(ids[0], ids[1])
+        self.assertEqual(Criteria.objects.count(), 1)
+
+    def test_merge(self):
+        first = self.make_duplicate(self.arizona, [self.jobs])
+        second = self.make_duplicate(self.arizona, [self.jobs])
+        third = self.make_duplicate(self.arizona, [self.jobs])
+        other = self.make_duplicate(self.ohio, [self.jobs, self.safety])
+        SearchResult(criteria=second, law_ids='1,2', numlaws=2).save()
+        profile = User.objects.create(username='tester').profile
+        profile.criteria = third
+        profile.save()
+
+        output = self.merge()
+        self.assertIn('Duplicates merged: 2, profiles moved: 1, '
+                      'signatures set: 2', output)
+        self.assertEqual(sorted(Criteria.objects.values_list('id', flat=True)),
+                         [first.id, other.id])
+        self.assertEqual(SearchResult.objects.count(), 0)
+        profile.refresh_from_db()
+        self.assertEqual(profile.criteria_id, first.id)
+
+        found = Criteria.find_or_create(self.arizona, [self.jobs])
+        self.assertEqual(found.id, first.id)
+
+        self.assertIn('Duplicates merged: 0, profiles moved: 0, '
+                      'signatures set: 0', self.merge())
+
+    def test_merge_keeps_mail_jobs(self):
+        first = self.make_duplicate(self.ohio, [self.safety])
+        second = self.make_duplicate(self.ohio, [self.safety])
+        user = User.objects.create(username='mailer')
+        job = MailJob(user=user, criteria=second, recipient='a@example.com')
+        job.save()
+
+        self.merge()
+        job.refresh_from_db()
+        self.assertEqual(job.criteria_id, first.id)
+        self.assertEqual(job.status, MailJob.QUEUED)
+
+    def test_merge_keeps_signed_row(self):
+        self.make_duplicate(self.ohio, [self.jobs])
+        signed = Criteria.find_or_create(self.ohio, [self.jobs])
+        self.merge()
+        self.assertEqual(list(Criteria.objects.values_list('id', flat=True)),
+                         [signed.id])
+
+    def test_dry_run(self):
+        self.make_duplicate(self.ohio, [self.safety])
+        self.make_duplicate(self.ohio, [self.safety])
+        output = self.merge('--dry-run')
+        self.assertIn('Duplicates merged: 1', output)
+        self.assertEqual(Criteria.objects.count(), 2)
+        self.assertFalse(Criteria.objects.exclude(signature=None).exists())
+
+    def test_merge_in_batches(self):
+        def count_queries(copies):
+            for _ in range(copies):
+                self.make_duplicate(self.arizona, [self.safety])
+            with CaptureQueriesContext(connection) as queries:
+                self.merge('--batch', '100')
+            Criteria.objects.all().delete()
+            return len(queries)
+
+        self.assertEqual(count_queries(3), count_queries(30))
@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+cfc_app/tests_digest.py -- Test weekly digest of new and changed laws
+
+Written by Tony Pearson, IBM, 2021
+Licensed under Apache 2.0, see LICENSE for details
+"""
+
+# System imports
+from contextlib import redirect_stdout
+from datetime import timedelta
+import io
+from unittest.mock import patch
+
+# Django and other third-party imports
+from django.contrib.auth.models import User
+from django.core import mail
+from django.core.mail.backends import locmem
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+# Application imports
+from cfc_app.digest import (changed_laws, law_index, match_criteria,
+                            profile_criteria, send_digest)
+from cfc_app.law_writer import LawWriter
+from cfc_app.models import (Location, Impact, Law, Digest, MailJob,
+                            REFERENCE_DATA)
+from cfc_app.tasks import send_queued_mail
+
+LOCMEM = 'django.core.mail.backends.locmem.EmailBackend'
+REFUSED = 'cfc_app.tests_digest.RefusingBackend'
+UNREACHABLE = 'cfc_app.tests_digest.UnreachableBackend'
+HEADER = {'BILLID': 'SB4', 'DOCDATE': '2021-03-01',
+          'TITLE': 'Changed title', 'SUMMARY': 'Summary'}
+
+
+class RefusingBackend(locmem.EmailBackend):
+    """ locmem backend that refuses every message """
+
+    def send_messages(self, messages):
+        raise ConnectionError('Server refused')
+
+
+class UnreachableBackend(locmem.EmailBackend):
+    """ locmem backend that cannot connect """
+
+    def open(self):
+        raise ConnectionError('Host unreachable')
+
+
+@override_settings(EMAIL_BACKEND=LOCMEM)
+class DigestTests(TestCase):
+    """ Laws changed since the last digest are emailed to profile users """
+
+    @classmethod
+    def setUpTestData(cls):
+        Location.load_defaults()
+        Impact.load_defaults()
+        usa = Location.objects.get(shortname='usa')
+        cls.arizona = Location.objects.get(shortname='az')
+        cls.ohio = Location.objects.get(shortname='oh')
+        cls.health = Impact.objects.get(iname='Healthcare')
+        cls.jobs = Impact.objects.get(iname='Jobs')
+
+        for key, loc, imp in [('US-HB1-1111-Y2021', usa, cls.health),
+                              ('AZ-SB4-1234-Y2021', cls.arizona, cls.health),
+                              ('AZ-SB5-1234-Y2021', cls.arizona, cls.jobs),
+                              ('OH-HB2-2222-Y2021', cls.ohio, cls.health)]:
+            Law(key=key, title=f'Title {key}', summary='Summary',
+                location=loc, impact=imp).save()
+
+        cls.pat = cls.make_user('pat', 'pat@example.com', cls.arizona,
+                                [cls.health])
+        cls.make_user('lee', 'lee@example.com', cls.ohio, [cls.jobs])
+        cls.make_user('kim', '', cls.arizona, [cls.health])
+        cls.make_user('max', 'max@example.com', cls.ohio, [cls.health])
+
+    @staticmethod
+    def make_user(username, email, location, impacts):
+        user = User.objects.create(username=username, email=email)
+        profile = user.profile
+        profile.location = location
+        profile.save()
+        profile.impacts.set(impacts)
+        profile.set_criteria()
+        return user
+
+    def setUp(self):
+        REFERENCE_DATA.clear()
+
+    def test_send(self):
+        digest = send_digest()
+        self.assertEqual([digest.laws, digest.criteria, digest.profiles,
+                          digest.sent, digest.failed], [4, 2, 2, 2, 0])
+        self.assertEqual(Digest.objects.count(), 1)
+
+        sent = {message.to[0]: message for message in mail.outbox}
+        self.assertEqual(set(sent), {'pat@example.com', 'max@example.com'})
+        body = sent['pat@example.com'].body
+        self.assertIn('Weekly Digest', sent['pat@example.com'].subject)
+        self.assertIn('New or changed laws for Arizona, USA: Healthcare',
+                      body)
+        self.assertIn('US-HB1-1111-Y2021', body)
+        self.assertIn('AZ-SB4-1234-Y2021', body)
+        self.assertNotIn('AZ-SB5-1234-Y2021', body)
+        self.assertIn('OH-HB2-2222-Y2021', sent['max@example.com'].body)
+
+    def test_next_digest(self):
+        send_digest()
+        mail.outbox = []
+        self.assertEqual(send_digest().laws, 0)
+        self.assertEqual(len(mail.outbox), 0)
+
+        writer = LawWriter()
+        writer.save('AZ-SB4-1234-Y2021', HEADER, 'relevance', 'Healthcare')
+        writer.flush()
+        digest = send_digest()
+        self.assertEqual([digest.laws, digest.sent], [1, 1])
+        self.assertEqual(mail.outbox[0].to, ['pat@example.com'])
+        self.assertIn('Changed title', mail.outbox[0].body)
+
+        # Saved again with the same contents, so not changed
+        writer.save('AZ-SB4-1234-Y2021', HEADER, 'relevance', 'Healthcare')
+        writer.flush()
+        self.assertEqual(send_digest().laws, 0)
+        self.assertEqual(Digest.objects.count(), 4)
+
+    def test_one_pass(self):
+        with self.assertNumQueries(2):
+            groups = profile_criteria()
+        self.assertEqual(len(groups), 3)
+
+        now = timezone.now()
+        laws = changed_laws(now - timedelta(days=1), now)
+        matched = match_criteria(groups, law_index(laws))
+        pat = self.pat.profile.criteria_id
+        found = sorted(laws[law_id].key for law_id in matched[pat])
+        self.assertEqual(found, ['AZ-SB4-1234-Y2021', 'US-HB1-1111-Y2021'])
+        self.assertEqual(len(matched), 2)
+
+    def test_dry_run(self):
+        digest = send_digest(dry_run=True)
+        self.assertEqual([digest.profiles, digest.sent], [2, 0])
+        self.assertEqual(len(mail.outbox), 0)
+        self.assertFalse(Digest.objects.exists())
+
+    @patch('cfc_app.mailer.async_task')
+    @patch('cfc_app.digest.enqueue')
+    def test_failed(self, enqueue, async_task):
+        with self.settings(EMAIL_BACKEND=REFUSED):
+            digest = send_digest(batch_size=1)
+        self.assertEqual([digest.sent, digest.failed], [0, 2])
+        enqueue.assert_called_once()
+
+        # Saved to be sent again by the mail task
+        jobs = MailJob.objects.filter(digest=digest)
+        self.assertEqual(sorted(jobs.values_list('recipient', flat=True)),
+                         ['max@example.com', 'pat@example.com'])
+        self.assertEqual(jobs[0].error, 'Server refused')
+        self.assertEqual(len(mail.outbox), 0)
+
+        jobs.update(retry_at=timezone.now())
+        self.assertEqual(send_queued_mail(), 2)
+        sent = {message.to[0]: message for message in mail.outbox}
+        body = sent['pat@example.com'].body
+        self.assertIn('Weekly Digest', sent['pat@example.com'].subject)
+        self.assertIn('AZ-SB4-1234-Y2021', body)
+        self.assertNotIn('AZ-SB5-1234-Y2021', body)
+        self.assertIn('OH-HB2-2222-Y2021', sent['max@example.com'].body)
+
+        # The next digest starts where this one ended
+        self.assertEqual(send_digest().laws, 0)
+
+    @patch('cfc_app.digest.enqueue')
+    def test_unreachable(self, enqueue):
+        with self.settings(EMAIL_BACKEND=UNREACHABLE):
+            digest = send_digest()
+        self.assertEqual([digest.sent, digest.failed], [0, 2])
+        self.assertEqual(MailJob.objects.filter(
+            digest=digest, error='Host unreachable').count(), 2)
+        enqueue.assert_called_once()
+
+    @patch('cfc_app.digest.digest_content')
+    def test_not_saved_on_error(self, digest_content):
+        digest_content.side_effect = ValueError('Template error')
+        with self.assertRaises(ValueError):
+            send_digest()
+
+        # The next digest includes the same laws
+        self.assertFalse(Digest.objects.exists())
+        self.assertFalse(MailJob.objects.exists())
+
+    @patch('cfc_app.digest.MAX_LAWS', 1)
+    def test_more_laws(self):
+        send_digest()
+        sent = {message.to[0]: message for message in mail.outbox}
+        body = sent['pat@example.com'].body
+        self.assertIn('... and 1 more, search Arizona, USA', body)
+        self.assertNotIn('US-HB1-1111-Y2021', body)
+
+    def test_command(self):
+        out = io.StringIO()
+        with redirect_stdout(out):
+            call_command('send_digest', '--dry-run', verbosity=0)
+        self.assertIn('criteria matched: 2, profiles: 2', out.getvalue())
+        self.assertEqual(len(mail.outbox), 0)
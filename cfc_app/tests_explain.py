@@ -0,0 +1,44 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+cfc_app/tests_explain.py -- Test query plans of legislation search
+
+Written by Tony Pearson, IBM, 2021
+Licensed under Apache 2.0, see LICENSE for details
+"""
+
+# System imports
+import contextlib
+import io
+
+# Django and other third-party imports
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+
+# Application imports
+from cfc_app.models import Law, Hash
+
+
+class ExplainQueriesTests(TestCase):
+    """ explain_queries reports each query, and saves nothing """
+
+    def test_synthetic(self):
+        out = io.StringIO()
+        with contextlib.redirect_stdout(out):
+            call_command('explain_queries', synthetic=300, repeat=2,
+                         batch=100, verbosity=0)
+        report = out.getvalue()
+
+        self.assertIn('Added 300 laws', report)
+        self.assertIn('Laws: 300, hash codes: 300', report)
+        for name in ['search', 'results page', 'state laws', 'law by key',
+                     'state hashes', 'hash by name', 'lawdump']:
+            self.assertIn(f"\n{name}: ", report)
+        self.assertIn('lawdump: 300 rows', report)
+        if connection.vendor == 'sqlite':
+            self.assertIn('USING INDEX hash_prefix_idx', report)
+
+        self.assertEqual(Law.objects.count(), 0)
+        self.assertEqual(Hash.objects.count(), 0)
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+cfc_app/tests_export.py -- Test streaming download of all legislation
+
+Written by Tony Pearson, IBM, 2021
+Licensed under Apache 2.0, see LICENSE for details
+"""
+
+# System imports
+import csv
+import gzip
+import io
+import json
+
+# Django and other third-party imports
+from django.contrib.auth.models import User
+from django.test import RequestFactory, TestCase
+
+# Application imports
+from cfc_app.law_export import batched, export_laws
+from cfc_app.models import Location, Impact, Law
+from cfc_app.views import lawdump
+
+
+class LawExportTests(TestCase):
+    """ Laws are streamed with one query, in CSV or JSON Lines """
+
+    @classmethod
+    def setUpTestData(cls):
+        Location.load_defaults()
+        Impact.load_defaults()
+        arizona = Location.objects.get(shortname='az')
+        jobs = Impact.objects.get(iname='Jobs')
+        for num in range(5):
+            Law(key=f'AZ-HB{num}-1234-Y2021', title=f'Title, "{num}"',
+                summary='Summary\nline 2', location=arizona,
+                impact=jobs).save()
+        Law(key='ZZ-HB9-1234-Y2021', title='No location', summary='').save()
+        cls.staff = User.objects.create(username='staff', is_staff=True)
+
+    def download(self, query=''):
+        request = RequestFactory().get('/lawdump/' + query)
+        request.user = self.staff
+        response = lawdump(request)
+        with self.assertNumQueries(1):
+            content = b''.join(response.streaming_content)
+        return response, content
+
+    def test_csv(self):
+        response, content = self.download()
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        self.assertIn('lawdump.csv', response['Content-Disposition'])
+
+        rows = list(csv.reader(io.StringIO(content.decode('UTF-8'))))
+        self.assertEqual(rows[0],
+                         ['key', 'location', 'impact', 'title', 'summary'])
+        self.assertEqual(len(rows), 7)
+        self.assertEqual(rows[1], ['AZ-HB0-1234-Y2021', 'Arizona, USA',
+                                   'Jobs', 'Title, "0"', 'Summary\nline 2'])
+        self.assertEqual(rows[6][:3], ['ZZ-HB9-1234-Y2021', '', ''])
+
+    def test_jsonl_gzip(self):
+        response, content = self.download('?format=jsonl&gzip=1')
+        self.assertEqual(response['Content-Type'], 'application/gzip')
+        self.assertIn('lawdump.jsonl.gz', response['Content-Disposition'])
+
+        lines = gzip.decompress(content).decode('UTF-8').splitlines()
+        laws = [json.loads(line) for line in lines]
+        self.assertEqual(len(laws), 6)
+        self.assertEqual(laws[4]['key'], 'AZ-HB4-1234-Y2021')
+        self.assertEqual(laws[4]['location'], 'Arizona, USA')
+        self.assertIsNone(laws[5]['impact'])
+
+    def test_batched(self):
+        chunks = list(batched(['ab', 'cd', 'e', 'fgh', 'i'], size=4))
+        self.assertEqual(chunks, ['abcd', 'efgh', 'i'])
+        self.assertEqual(list(batched([])), [])
+
+    def test_export_laws(self):
+        content, _, filename = export_laws('csv', compress=True)
+        self.assertEqual(filename, 'lawdump.csv.gz')
+        text = gzip.decompress(b''.join(content)).decode('UTF-8')
+        self.assertTrue(text.startswith('key,location,impact'))
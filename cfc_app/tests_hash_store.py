@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+cfc_app/tests_hash_store.py -- Test bulk reads and writes of Hash rows
+
+Written by Tony Pearson, IBM, 2021
+Licensed under Apache 2.0, see LICENSE for details
+"""
+
+# System imports
+import datetime as DT
+
+# Django and other third-party imports
+from django.test import TestCase
+
+# Application imports
+from cfc_app.hash_store import HashStore, QueryCounter
+from cfc_app.models import Hash
+from cfc_app.tests_sync import make_hash
+
+OLD = DT.date(2021, 1, 1)
+NEW = DT.date(2021, 2, 1)
+
+
+def saved(name, mode='FILE'):
+    """ Hash row as saved in the database, None if not found """
+    return Hash.objects.filter(item_name=name, fob_method=mode).first()
+
+
+class HashStoreTests(TestCase):
+    """ Rows are read with one query and written on flush """
+
+    @classmethod
+    def setUpTestData(cls):
+        make_hash('AZ-1.pdf', 'FILE', OLD, 'a' * 32)
+        make_hash('AZ-2.pdf', 'FILE', OLD, 'b' * 32)
+        make_hash('AZ-2.pdf', 'OBJECT', OLD, 'b' * 32)
+        make_hash('OH-1.pdf', 'FILE', OLD, 'c' * 32)
+
+    def test_load_and_find(self):
+        store = HashStore('FILE')
+        with self.assertNumQueries(1):
+            store.load('AZ-')
+            self.assertEqual(store.find('AZ-1.pdf').hashcode, 'a' * 32)
+            self.assertIsNone(store.find('AZ-9.pdf'))
+
+        # Names outside the prefix are read one at a time, then kept
+        with self.assertNumQueries(2):
+            self.assertEqual(store.find('OH-1.pdf').hashcode, 'c' * 32)
+            self.assertIsNone(store.find('OH-9.pdf'))
+            self.assertIsNone(store.find('OH-9.pdf'))
+
+    def test_default_mode(self):
+        with self.settings(FOB_METHOD='OBJECT'):
+            store = HashStore().load('AZ-')
+        self.assertEqual(store.mode, 'OBJECT')
+        self.assertIsNone(store.find('AZ-1.pdf'))
+        self.assertEqual(store.find('AZ-2.pdf').hashcode, 'b' * 32)
+
+    def test_flush(self):
+        store = HashStore('FILE').load('AZ-')
+        with self.assertNumQueries(0):
+            store.update('AZ-1.pdf', NEW, 'x' * 32, 20)
+            store.update('AZ-3.pdf', NEW, 'y' * 32, 30, legdesc='New')
+            store.delete('AZ-2.pdf')
+        self.assertEqual(store.pending(), 3)
+        self.assertEqual(saved('AZ-1.pdf').hashcode, 'a' * 32)
+
+        self.assertEqual(store.flush(), 3)
+        self.assertEqual(store.pending(), 0)
+        self.assertEqual(saved('AZ-1.pdf').hashcode, 'x' * 32)
+        self.assertEqual(saved('AZ-1.pdf').objsize, 20)
+        self.assertEqual(saved('AZ-3.pdf').legdesc, 'New')
+        self.assertIsNone(saved('AZ-2.pdf'))
+        self.assertIsNotNone(saved('AZ-2.pdf', 'OBJECT'))
+
+        # New rows have their primary key, so a change is an update
+        self.assertEqual(store.find('AZ-3.pdf').pk, saved('AZ-3.pdf').pk)
+        store.update('AZ-3.pdf', NEW, 'z' * 32, 40)
+        store.flush()
+        self.assertEqual(saved('AZ-3.pdf').hashcode, 'z' * 32)
+        self.assertEqual(Hash.objects.filter(item_name='AZ-3.pdf').count(),
+                         1)
+
+    def test_delete_then_save(self):
+        store = HashStore('FILE').load('AZ-')
+        record = store.find('AZ-1.pdf')
+        store.delete('AZ-1.pdf')
+        self.assertIsNone(store.find('AZ-1.pdf'))
+        record.hashcode = 'd' * 32
+        store.save(record)
+        store.flush()
+        self.assertEqual(saved('AZ-1.pdf').hashcode, 'd' * 32)
+
+    def test_batch_size(self):
+        store = HashStore('FILE', batch_size=2).load('AZ-')
+        store.update('AZ-1.pdf', NEW, 'x' * 32, 20)
+        self.assertEqual(store.pending(), 1)
+        store.update('AZ-4.pdf', NEW, 'y' * 32, 20)
+        self.assertEqual(store.pending(), 0)
+        self.assertEqual(saved('AZ-4.pdf').hashcode, 'y' * 32)
+
+    def test_query_counter(self):
+        counter = QueryCounter('test').start()
+        HashStore('FILE').load('AZ-')
+        Hash.objects.count()
+        self.assertEqual(counter.stop(), 2)
+        Hash.objects.count()
+        self.assertEqual(counter.count, 2)
+        self.assertEqual(counter.show(1), "Database queries for test: 2")
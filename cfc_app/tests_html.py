@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+cfc_app/tests_html.py -- Test single-pass HTML extraction
+
+Written by Tony Pearson, IBM, 2021
+Licensed under Apache 2.0, see LICENSE for details
+"""
+
+# System imports
+
+# Django and other third-party imports
+from django.test import SimpleTestCase
+
+# Application imports
+from cfc_app.Oneline import Oneline
+from cfc_app.text_convert import parse_html, parse_html_soup
+
+BILL_HTML = """<!DOCTYPE html>
+<html><head><title>HB 2001 Education</title></head>
+<body>
+<p class="x"><span class="SECHEAD">Section 1.\nShort title</span></p>
+<p>1. This act may be cited as the <b>Education</b> Act.</p>
+<p>A. Schools shall   report.</p>
+<p><i>Only italic</i></p>
+<p>   </p>
+<p><!-- comment only --></p>
+<span class="other SECHEAD">Sec. 2</span>
+<pre><p>  \n</p></pre>
+<p>Unclosed paragraph
+<div><p>12. Last item</div>
+</body></html>
+"""
+
+
+def extract(parse, html):
+    """ Text as it would be added to the TXT file """
+    return parse(html, Oneline(nltk_loaded=True)).oneline
+
+
+class ParseHtmlTests(SimpleTestCase):
+    """ Single pass gives the same text as the BeautifulSoup tree """
+
+    def test_same_as_soup(self):
+        for html in [BILL_HTML, "", "<p>text", "<html><body></body></html>",
+                     "<title>T</title><p>a<b>b</b></p>"]:
+            self.assertEqual(extract(parse_html, html),
+                             extract(parse_html_soup, html))
+
+    def test_bill_text(self):
+        text = extract(parse_html, BILL_HTML)
+        self.assertTrue(text.startswith("HB 2001 Education Section 1. "
+                                        "Short title Sec. 2 "))
+        self.assertIn("(A) Schools shall   report. Only italic", text)
+        self.assertIn("comment only", text)
+        self.assertTrue(text.endswith("(12) Last item "))
@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+cfc_app/tests_http.py -- Test HttpClient against a local stub HTTP server
+
+Written by Tony Pearson, IBM, 2021
+Licensed under Apache 2.0, see LICENSE for details
+"""
+
+# System imports
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import threading
+import time
+
+# Django and other third-party imports
+from django.test import SimpleTestCase
+
+# Application imports
+from cfc_app.data_bundle import DataBundle
+from cfc_app.http_client import HttpClient
+
+SAMPLE_PDF = b'%PDF-1.4 sample bill text'
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """ Serve canned responses, counting requests and concurrency """
+
+    def do_GET(self):
+        """ Respond based on the path requested """
+
+        server = self.server
+        with server.lock:
+            server.hits += 1
+            server.active += 1
+            server.peak = max(server.peak, server.active)
+        try:
+            if self.path.startswith('/flaky') and server.failures > 0:
+                server.failures -= 1
+                self.reply(503, b'busy', 'text/plain')
+            elif self.path.startswith('/throttled') and server.failures > 0:
+                server.failures -= 1
+                self.reply(429, b'later', 'text/plain',
+                           {'Retry-After': '3600'})
+            elif self.path.startswith('/slow'):
+                time.sleep(0.2)
+                self.reply(200, b'slow', 'text/plain')
+            elif self.path.startswith('/missing'):
+                self.reply(404, b'missing', 'text/plain')
+            else:
+                self.reply(200, SAMPLE_PDF, 'application/pdf')
+        finally:
+            with server.lock:
+                server.active -= 1
+
+    def reply(self, code, body, mime, headers=None):
+        """ Send response with keep-alive headers """
+
+        self.send_response(code)
+        self.send_header('Content-Type', mime)
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        """ Keep test output quiet """
+        return None
+
+
+class HttpClientTests(SimpleTestCase):
+    """ Testcases for http_client.py """
+
+    def setUp(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), StubHandler)
+        self.server.lock = threading.Lock()
+        self.server.hits = 0
+        self.server.active = 0
+        self.server.peak = 0
+        self.server.failures = 0
+        self.thread = threading.Thread(target=self.server.serve_forever,
+                                       daemon=True)
+        self.thread.start()
+        self.base = f"http://127.0.0.1:{self.server.server_port}"
+        self.client = HttpClient(timeout=5, retries=3, backoff=0.01)
+
+    def tearDown(self):
+        self.client.session.close()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_get_counts_bytes_and_latency(self):
+        """ Successful GET updates per-host counters """
+
+        response = self.client.get(self.base + '/bill.pdf', {'format': 'pdf'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.content, SAMPLE_PDF)
+
+        stats = self.client.host_stats()[0]
+        self.assertEqual(stats.host, '127.0.0.1')
+        self.assertEqual(stats.requests, 1)
+        self.assertEqual(stats.bytes, len(SAMPLE_PDF))
+        self.assertEqual(stats.errors, 0)
+        self.assertGreater(stats.latency, 0.0)
+
+    def test_retry_on_server_error(self):
+        """ 503 responses are retried until successful """
+
+        self.server.failures = 2
+        response = self.client.get(self.base + '/flaky')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.server.hits, 3)
+
+        stats = self.client.host_stats()[0]
+        self.assertEqual(stats.retries, 2)
+        self.assertEqual(stats.errors, 2)
+
+    def test_retries_exhausted(self):
+        """ After all retries, the last response is returned """
+
+        self.server.failures = 10
+        response = self.client.get(self.base + '/flaky')
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(self.server.hits, 4)
+
+    def test_retry_after_limited(self):
+        """ Retry-After longer than max_backoff waits max_backoff """
+
+        client = HttpClient(timeout=5, retries=3, backoff=0.01,
+                            max_backoff=0.05)
+        self.server.failures = 3
+        started = time.monotonic()
+        response = client.get(self.base + '/throttled')
+        client.session.close()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.server.hits, 4)
+        self.assertLess(time.monotonic() - started, 5)
+
+    def test_no_retry_on_not_found(self):
+        """ 4xx responses other than 429 are not retried """
+
+        response = self.client.get(self.base + '/missing')
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(self.server.hits, 1)
+
+    def test_per_host_limit(self):
+        """ No more than the host limit of requests run concurrently """
+
+        client = HttpClient(timeout=5, host_limits={'127.0.0.1': 2})
+        threads = [threading.Thread(target=client.get,
+                                    args=(self.base + '/slow',))
+                   for _ in range(6)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        client.session.close()
+
+        self.assertEqual(self.server.hits, 6)
+        self.assertLessEqual(self.server.peak, 2)
+
+    def test_host_key_suffix(self):
+        """ Subdomains share the budget of their configured suffix """
+
+        url = 'https://search-prod.lis.state.oh.us/solarapi/v1/hb13'
+        self.assertEqual(self.client.host_key(url), 'state.oh.us')
+        self.assertFalse(self.client.verify('state.oh.us'))
+        url = 'https://www.azleg.gov/legtext/sb1154p.htm'
+        self.assertEqual(self.client.host_key(url), 'azleg.gov')
+
+    def test_data_bundle_request(self):
+        """ DataBundle uses the shared client to load PDF """
+
+        bundle = DataBundle('stub')
+        response = bundle.make_request(self.base + '/bill.pdf', {})
+        self.assertTrue(bundle.load_response(response))
+        self.assertEqual(bundle.extension, 'pdf')
+        self.assertEqual(bundle.content, SAMPLE_PDF)
+
+# end of tests
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+cfc_app/tests_index.py -- Test bill index of a session dataset
+
+Written by Tony Pearson, IBM, 2021
+Licensed under Apache 2.0, see LICENSE for details
+"""
+
+# System imports
+import io
+import json
+from types import SimpleNamespace
+import zipfile
+
+# Django and other third-party imports
+from django.test import SimpleTestCase
+
+# Application imports
+from cfc_app.bill_index import BillIndex
+
+
+def make_bill(num, change_hash, year=2021):
+    """ Bill JSON as found in a Legiscan dataset ZIP """
+
+    text = {'doc_id': 1000 + num, 'date': f"{year}-02-01",
+            'mime': 'application/pdf', 'text_size': 500,
+            'url': 'https://legiscan.com/', 'state_link': 'https://az.gov/'}
+    return {'bill': {'bill_id': num, 'title': f"Bill {num}",
+                     'description': 'Summary', 'change_hash': change_hash,
+                     'session': {'session_id': 1234}, 'state': 'AZ',
+                     'bill_number': f"HB{num}", 'texts': [text]}}
+
+
+def make_zip():
+    """ Dataset ZIP with three bills, one too old """
+
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w') as zipf:
+        for num, year in [[1, 2021], [2, 2021], [3, 2015]]:
+            zipf.writestr(f"AZ/2021-2021/55th/bill/HB{num}.json",
+                          json.dumps(make_bill(num, f"hash{num}", year)))
+        zipf.writestr("AZ/2021-2021/55th/people/P1.json", "{}")
+    buffer.seek(0)
+    return zipfile.ZipFile(buffer)
+
+
+class BillIndexTests(SimpleTestCase):
+    """ Find changed bills without reading them again """
+
+    def setUp(self):
+        with make_zip() as zipf:
+            self.index = BillIndex.from_zip(zipf, 'datasethash')
+
+    def test_index_entries(self):
+        self.assertEqual(len(self.index.bills), 3)
+        path, key, extension, change_hash, doc_id, _ = self.index.bills[0]
+        self.assertEqual(path, "AZ/2021-2021/55th/bill/HB1.json")
+        self.assertEqual(key, "AZ-HB0001-1234-Y2021")
+        self.assertEqual([extension, change_hash, doc_id],
+                         ['pdf', 'hash1', 1001])
+
+    def test_round_trip(self):
+        loaded = BillIndex.from_json(self.index.to_json())
+        self.assertEqual(loaded.dataset_hash, 'datasethash')
+        self.assertEqual(loaded.bills, self.index.bills)
+        self.assertIsNone(BillIndex.from_json('not json'))
+        self.assertIsNone(BillIndex.from_json('{"dataset_hash": "abc"}'))
+        self.assertIsNone(BillIndex.from_json(
+            '{"dataset_hash": "abc", "bills": [{"path": "AZ"}]}'))
+
+    def test_changed_paths(self):
+        hashes = {
+            'AZ-HB0001-1234-Y2021.pdf': SimpleNamespace(hashcode='hash1'),
+            'AZ-HB0002-1234-Y2021.pdf': SimpleNamespace(hashcode='old')}
+        texts = {'AZ-HB0001-1234-Y2021.txt', 'AZ-HB0002-1234-Y2021.txt'}
+        self.assertEqual(self.index.changed_paths(hashes, texts, 2019),
+                         ["AZ/2021-2021/55th/bill/HB2.json"])
+
+        # Text file missing, so extract again
+        self.assertEqual(len(self.index.changed_paths(hashes, set(), 2019)),
+                         2)
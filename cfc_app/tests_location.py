@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+cfc_app/tests_location.py -- Test ancestor and descendant search
+
+Written by Tony Pearson, IBM, 2021
+Licensed under Apache 2.0, see LICENSE for details
+"""
+
+# System imports
+
+# Django and other third-party imports
+from django.test import TestCase
+
+# Application imports
+from cfc_app.models import (Location, LOCATION_TREE, TREE_MAX_AGE,
+                            ANCESTOR_CTE, DESCENDANT_CTE)
+
+
+def short_names(locations):
+    """ shortname of each location, in order """
+    return [loc.shortname for loc in locations]
+
+
+class LocationTreeTests(TestCase):
+    """ Ancestors are read with one query, then kept in memory """
+
+    @classmethod
+    def setUpTestData(cls):
+        Location.load_defaults()
+        arizona = Location.objects.get(shortname='az')
+        Location(longname='Maricopa County, AZ', shortname='maricopa',
+                 legiscan_id=0, hierarchy='world.usa.az.maricopa',
+                 govlevel='county', parent=arizona).save()
+
+    def setUp(self):
+        LOCATION_TREE.clear()
+
+    def test_ancestors(self):
+        county = Location.objects.get(shortname='maricopa')
+        with self.assertNumQueries(1):
+            chain = county.ancestors()
+        self.assertEqual(short_names(chain),
+                         ['maricopa', 'az', 'usa', 'world'])
+
+        with self.assertNumQueries(0):
+            self.assertEqual(county.ancestors(), chain)
+
+        world = Location.objects.get(shortname='world')
+        self.assertEqual(short_names(world.ancestors()), ['world'])
+
+    def test_descendants(self):
+        usa = Location.objects.get(shortname='usa')
+        with self.assertNumQueries(1):
+            below = usa.descendants()
+        self.assertEqual(short_names(below), ['az', 'maricopa', 'oh'])
+        with self.assertNumQueries(0):
+            usa.descendants()
+
+    def test_recursive_queries(self):
+        county = Location.objects.get(shortname='maricopa')
+        chain = list(Location.objects.raw(ANCESTOR_CTE, [county.id]))
+        self.assertEqual(chain, county.ancestor_query())
+
+        world = Location.objects.get(shortname='world')
+        tree = list(Location.objects.raw(DESCENDANT_CTE,
+                                         [world.id, world.id]))
+        self.assertEqual(tree, world.descendant_query())
+        self.assertEqual(len(tree), 4)
+
+    def test_save_clears_cache(self):
+        ohio = Location.objects.get(shortname='oh')
+        self.assertEqual(short_names(ohio.ancestors()),
+                         ['oh', 'usa', 'world'])
+
+        Location(longname='Franklin County, OH', shortname='franklin',
+                 legiscan_id=0, hierarchy='world.usa.oh.franklin',
+                 govlevel='county', parent=ohio).save()
+        with self.assertNumQueries(1):
+            self.assertEqual(short_names(ohio.descendants()), ['franklin'])
+
+    def test_max_age(self):
+        ohio = Location.objects.get(shortname='oh')
+        ohio.ancestors()
+        LOCATION_TREE.max_age = 0
+        try:
+            with self.assertNumQueries(1):
+                ohio.ancestors()
+        finally:
+            LOCATION_TREE.max_age = TREE_MAX_AGE
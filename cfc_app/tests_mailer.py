@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+cfc_app/tests_mailer.py -- Test search results emailed by django-q task
+
+Written by Tony Pearson, IBM, 2021
+Licensed under Apache 2.0, see LICENSE for details
+"""
+
+# System imports
+from contextlib import redirect_stdout
+from datetime import timedelta
+import io
+from unittest.mock import patch
+
+# Django and other third-party imports
+from django.contrib.auth.models import User
+from django.core import mail
+from django.core.mail.backends import locmem
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+# Application imports
+from cfc_app.mailer import MAIL_TASK
+from cfc_app.models import Location, Impact, Criteria, Law, MailJob
+from cfc_app.tasks import send_queued_mail
+
+LOCMEM = 'cfc_app.tests_mailer.CountingBackend'
+CONSOLE = 'django.core.mail.backends.console.EmailBackend'
+SMTP = 'django.core.mail.backends.smtp.EmailBackend'
+
+
+class CountingBackend(locmem.EmailBackend):
+    """ locmem backend that counts connections and refuses bad@ """
+
+    opened = 0
+
+    def open(self):
+        type(self).opened += 1
+        return super().open()
+
+    def send_messages(self, messages):
+        for message in messages:
+            if 'bad@example.com' in message.to:
+                raise ConnectionError('Recipient refused')
+        return super().send_messages(messages)
+
+
+@override_settings(EMAIL_BACKEND=LOCMEM,
+                   MAIL_QUEUE={'batch': 50, 'attempts': 3, 'retry': 300})
+@patch('cfc_app.mailer.schedule')
+@patch('cfc_app.mailer.async_task')
+class MailerTests(TestCase):
+    """ sendmail queues a MailJob, the task sends queued jobs in batches """
+
+    @classmethod
+    def setUpTestData(cls):
+        Location.load_defaults()
+        Impact.load_defaults()
+        arizona = Location.objects.get(shortname='az')
+        jobs = Impact.objects.get(iname='Jobs')
+        Law(key='AZ-HB1-1234-Y2021', title='Minimum wage',
+            summary='Raise the minimum wage', location=arizona,
+            impact=jobs).save()
+        cls.criteria = Criteria.find_or_create(arizona, [jobs])
+        cls.user = User.objects.create(username='tester', first_name='Pat',
+                                       last_name='Lee',
+                                       email='pat@example.com')
+
+    def setUp(self):
+        # The class Django loads by name, whatever this module is named
+        self.backend = import_string(LOCMEM)
+        self.backend.opened = 0
+
+    def make_jobs(self, *recipients):
+        jobs = [MailJob(user=self.user, criteria=self.criteria,
+                        recipient=recipient) for recipient in recipients]
+        MailJob.objects.bulk_create(jobs)
+
+    def statuses(self):
+        return list(MailJob.objects.order_by('id').values_list(
+            'status', flat=True))
+
+    def test_sendmail_returns_handle(self, async_task, schedule):
+        self.client.force_login(self.user)
+        response = self.client.get(f'/sendmail/{self.criteria.id}/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(mail.outbox), 0)
+
+        job = MailJob.objects.get()
+        self.assertEqual(job.status, MailJob.QUEUED)
+        self.assertEqual(job.recipient, 'Pat Lee <pat@example.com>')
+        self.assertContains(response, f'/mailstatus/{job.id}/')
+
+        state = self.client.get(f'/mailstatus/{job.id}/').json()
+        self.assertEqual(state['status'], 'queued')
+
+        other = User.objects.create(username='other')
+        self.client.force_login(other)
+        response = self.client.get(f'/mailstatus/{job.id}/')
+        self.assertEqual(response.status_code, 404)
+
+    @override_settings(EMAIL_BACKEND=SMTP, EMAIL_HOST='')
+    def test_not_configured(self, async_task, schedule):
+        self.client.force_login(self.user)
+        response = self.client.get(f'/sendmail/{self.criteria.id}/')
+        self.assertContains(response, 'EMAIL_HOST')
+        self.assertFalse(MailJob.objects.exists())
+
+    def test_one_connection(self, async_task, schedule):
+        self.make_jobs('a@example.com', 'b@example.com', 'c@example.com')
+        self.assertEqual(send_queued_mail(), 3)
+        self.assertEqual(self.backend.opened, 1)
+        self.assertEqual(self.statuses(), ['sent'] * 3)
+
+        message = mail.outbox[0]
+        self.assertEqual(message.to, ['a@example.com'])
+        self.assertIn('Search Results', message.subject)
+        self.assertIn('AZ-HB1-1234-Y2021', message.body)
+        self.assertIn('Generated by Pat Lee [tester]', message.body)
+        self.assertIn('Minimum wage', message.alternatives[0][0])
+        async_task.assert_not_called()
+        schedule.assert_not_called()
+
+    def test_batches(self, async_task, schedule):
+        self.make_jobs('a@example.com', 'b@example.com', 'c@example.com')
+        with self.settings(MAIL_QUEUE={'batch': 2}):
+            self.assertEqual(send_queued_mail(), 2)
+            async_task.assert_called_once_with(MAIL_TASK)
+            self.assertEqual(send_queued_mail(), 1)
+            self.assertEqual(send_queued_mail(), 0)
+        self.assertEqual(len(mail.outbox), 3)
+
+    def test_retry(self, async_task, schedule):
+        self.make_jobs('bad@example.com', 'b@example.com')
+        self.assertEqual(send_queued_mail(), 1)
+        self.assertEqual(self.statuses(), ['queued', 'sent'])
+        schedule.assert_called_once()
+
+        # Not tried again until retry_at
+        self.assertEqual(send_queued_mail(), 0)
+        for _ in range(2):
+            MailJob.objects.filter(status='queued').update(
+                retry_at=timezone.now() - timedelta(seconds=1))
+            send_queued_mail()
+
+        job = MailJob.objects.get(recipient='bad@example.com')
+        self.assertEqual(job.status, MailJob.FAILED)
+        self.assertEqual(job.attempts, 3)
+        self.assertEqual(job.error, 'Recipient refused')
+        self.assertEqual(schedule.call_count, 2)
+
+    def test_stale_sending(self, async_task, schedule):
+        self.make_jobs('a@example.com', 'b@example.com')
+        claimed = timezone.now() - timedelta(seconds=60)
+        MailJob.objects.update(status=MailJob.SENDING, claimed_at=claimed)
+
+        # Still within the lease of the task that claimed them
+        with self.settings(MAIL_QUEUE={'lease': 120}):
+            self.assertEqual(send_queued_mail(), 0)
+
+            # That task did not finish, so they are claimed again
+            MailJob.objects.filter(recipient='a@example.com').update(
+                claimed_at=claimed - timedelta(seconds=120))
+            self.assertEqual(send_queued_mail(), 1)
+        self.assertEqual(self.statuses(), ['sent', 'sending'])
+        self.assertEqual(mail.outbox[0].to, ['a@example.com'])
+
+    def test_stale_attempts(self, async_task, schedule):
+        self.make_jobs('a@example.com', 'b@example.com')
+        claimed = timezone.now() - timedelta(seconds=300)
+        MailJob.objects.update(status=MailJob.SENDING, claimed_at=claimed)
+        MailJob.objects.filter(recipient='b@example.com').update(attempts=2)
+
+        # Each stale claim counts as an attempt, and the last one fails
+        with self.settings(MAIL_QUEUE={'lease': 120, 'attempts': 3}):
+            self.assertEqual(send_queued_mail(), 1)
+        self.assertEqual(self.statuses(), ['sent', 'failed'])
+        attempts = MailJob.objects.order_by('id').values_list(
+            'attempts', flat=True)
+        self.assertEqual(list(attempts), [1, 3])
+        self.assertEqual(mail.outbox[0].to, ['a@example.com'])
+
+    @override_settings(EMAIL_BACKEND=CONSOLE)
+    def test_console_backend(self, async_task, schedule):
+        self.make_jobs('a@example.com')
+        out = io.StringIO()
+        with redirect_stdout(out):
+            self.assertEqual(send_queued_mail(), 1)
+        self.assertIn('To: a@example.com', out.getvalue())
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+cfc_app/tests_manifest.py -- Test manifest index of File/Object storage
+
+Written by Tony Pearson, IBM, 2021
+Licensed under Apache 2.0, see LICENSE for details
+"""
+
+# System imports
+import hashlib
+import io
+import os
+import tempfile
+
+# Django and other third-party imports
+from django.test import SimpleTestCase
+
+# Application imports
+from cfc_app.fob_storage import FobStorage
+
+NAMES = ['AZ-HB1.pdf', 'AZ-HB1.txt', 'AZ-SB2.txt', 'OH-HB3.txt',
+         'OH-HB3.html']
+
+
+class FobManifestTests(SimpleTestCase):
+    """ FILE mode listings with and without the manifest agree """
+
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory(prefix='fob-')
+        self.filesys = os.path.join(self.tempdir.name, 'files')
+        self.dbname = os.path.join(self.tempdir.name, 'manifest.sqlite3')
+        self.plain = FobStorage('FILE', filesys=self.filesys, manifest='')
+        for name in NAMES:
+            self.plain.upload_text(name, name)
+        self.fob = FobStorage('FILE', filesys=self.filesys,
+                              manifest=self.dbname)
+
+    def tearDown(self):
+        self.fob.manifest.close()
+        self.tempdir.cleanup()
+
+    def test_list_items_same_as_glob(self):
+        for args in [{}, {'prefix': 'AZ'}, {'suffix': '.txt'},
+                     {'prefix': 'OH', 'suffix': '.txt'},
+                     {'after': 'AZ-HB1.txt', 'limit': 2}]:
+            self.assertEqual(self.fob.list_items(**args),
+                             self.plain.list_items(**args), args)
+
+    def test_upload_and_remove(self):
+        self.assertFalse(self.fob.item_exists('US-HR4.txt'))
+        self.fob.upload_file(io.BytesIO(b'bill text'), 'US-HR4.txt')
+        self.assertTrue(self.fob.item_exists('US-HR4.txt'))
+        stats = self.fob.manifest.item_stats('US-HR4.txt')
+        self.assertEqual(stats['size'], 9)
+        self.assertEqual(stats['etag'], hashlib.md5(b'bill text').hexdigest())
+
+        self.fob.remove_item('AZ-SB2.txt')
+        self.assertFalse(self.fob.item_exists('AZ-SB2.txt'))
+        self.assertEqual(self.fob.list_items(prefix='AZ'),
+                         ['AZ-HB1.pdf', 'AZ-HB1.txt'])
+
+    def test_refresh_finds_outside_changes(self):
+        self.assertTrue(self.fob.item_exists('OH-HB3.html'))
+        self.plain.remove_item('OH-HB3.html')
+        self.plain.upload_text('new', 'US-SB5.txt')
+        self.assertTrue(self.fob.item_exists('OH-HB3.html'))
+
+        self.fob.refresh_manifest()
+        self.assertFalse(self.fob.item_exists('OH-HB3.html'))
+        self.assertTrue(self.fob.item_exists('US-SB5.txt'))
@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+cfc_app/tests_matcher.py -- Test single-pass term matcher
+
+Written by Tony Pearson, IBM, 2021
+Licensed under Apache 2.0, see LICENSE for details
+"""
+
+# System imports
+
+# Django and other third-party imports
+from django.test import SimpleTestCase
+
+# Application imports
+from cfc_app.term_matcher import TermMatcher, term_regex, count_terms_regex
+
+TERMS = ['health', 'healthcare', 'water', 'clean water', 'air',
+         '401(k)', 'U.S. Route 202', 'co-pay', 'pay']
+
+
+def regex_counts(text, terms=TERMS):
+    """ Counts the way WordMap.scan_extract used to """
+    return count_terms_regex(text, [[term, term_regex(term)]
+                                    for term in terms])
+
+
+class TermMatcherTests(SimpleTestCase):
+    """ Compare TermMatcher with one regex per term """
+
+    def setUp(self):
+        self.matcher = TermMatcher(TERMS)
+
+    def test_whole_words_only(self):
+        text = "Healthcare and HEALTH, but not healthy or airplane. Air!"
+        counts = self.matcher.count(text)
+        self.assertEqual(counts, {'healthcare': 1, 'health': 1, 'air': 1})
+        self.assertEqual(counts, regex_counts(text))
+
+    def test_overlapping_terms(self):
+        text = "Clean water, clean water and water. A co-pay is a pay."
+        counts = self.matcher.count(text)
+        self.assertEqual(counts['water'], 3)
+        self.assertEqual(counts['clean water'], 2)
+        self.assertEqual(counts, regex_counts(text))
+
+    def test_regex_terms(self):
+        text = "Rollover of a 401(k) along U.S. Route 202 or US Route 202"
+        self.assertEqual(self.matcher.count(text), regex_counts(text))
+
+    def test_case_folding_fallback(self):
+        text = "İstanbul water and health"
+        self.assertEqual(self.matcher.count(text), regex_counts(text))
+
+    def test_no_matches(self):
+        self.assertEqual(self.matcher.count("Nothing to see here"), {})
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+cfc_app/tests_oneline.py -- Test Oneline text normalization
+
+Written by Tony Pearson, IBM, 2021
+Licensed under Apache 2.0, see LICENSE for details
+"""
+
+# System imports
+import os
+
+# Django and other third-party imports
+from django.test import SimpleTestCase
+
+# Application imports
+from cfc_app.Oneline import Oneline, squeeze_spaces
+from cfc_app.management.commands.benchmark import (old_common_acronyms,
+                                                   sample_corpus)
+
+SAMPLE_TXT = os.path.join(os.path.dirname(__file__), 'testdata',
+                          'pdf_to_text_sample.txt')
+
+EXAMPLES = [
+    ["H. B. No. 3 and S.B. 12", "HB3 and SB12"],
+    ["Am. Sub. H. B. 7 of the 133rd G.A. ", "Am-Sub HB7 of the 133rd-GA "],
+    ["See Sec. 5, Sub.2 ", "See Sec#5, Sub#2 "],
+    ["Repeal 36-123.01 and (12.3) now", "Repeal and now"],
+    ["Amend 1.2, and 3.4 here", "Amend here"],
+    ["Done.  2. Next", "Done. (2) Next"],
+    ["sections and Sections 4", "sections 4"],
+    ["  a \t ,b ;\n c :  ", " a,b; c: "],
+    ["", ""],
+    [" \n ", " "],
+]
+
+
+class OnelineTests(SimpleTestCase):
+    """ Compiled acronym rules give the same text as before """
+
+    def test_examples(self):
+        for text, expected in EXAMPLES:
+            self.assertEqual(Oneline.common_acronyms(text), expected)
+            self.assertEqual(old_common_acronyms(text), expected)
+
+    def test_golden_corpus(self):
+        with open(SAMPLE_TXT, 'r', errors='ignore') as textfile:
+            sample = textfile.read()
+
+        corpus = sample_corpus() + [sample] + sample.splitlines()
+        for text in corpus:
+            self.assertEqual(Oneline.common_acronyms(text),
+                             old_common_acronyms(text))
+
+    def test_squeeze_spaces(self):
+        self.assertEqual(squeeze_spaces("a  b\t\nc , d"), "a b c, d")
+        self.assertEqual(squeeze_spaces(" x "), " x ")
+
+    def test_add_text_chunks(self):
+        text_line = Oneline(nltk_loaded=True)
+        self.assertEqual(text_line.oneline, '')
+        text_line.add_text("First–line\nsecond").add_text("third")
+        self.assertEqual(text_line.oneline, "First-line second third ")
+        self.assertEqual(len(text_line.chunks), 1)
+
+        text_line.add_text("fourth")
+        self.assertEqual(text_line.oneline,
+                         "First-line second third fourth ")
+        text_line.oneline = "replaced"
+        self.assertEqual(text_line.add_text("x").oneline, "replacedx ")
@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+cfc_app/tests_page_cache.py -- Test cached pages and their invalidation
+
+Written by Tony Pearson, IBM, 2021
+Licensed under Apache 2.0, see LICENSE for details
+"""
+
+# System imports
+import json
+
+# Django and other third-party imports
+from django.contrib.auth.models import AnonymousUser, User
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase
+
+# Application imports
+from cfc_app.law_writer import LawWriter
+from cfc_app.models import (Location, Impact, Criteria, DataVersion,
+                            LAW_DATA, CRITERIA_DATA)
+from cfc_app.page_cache import cached_page, cache_stats, clear_stats
+from cfc_app.views import health, results_key
+
+RENDERED = []
+
+
+@cached_page('test-laws')
+def law_page(request, search_id):
+    """ Count each time the page is rendered """
+    RENDERED.append(search_id)
+    return HttpResponse(f"search {search_id} render {len(RENDERED)}")
+
+
+@cached_page('test-criteria', data=CRITERIA_DATA, key_parts=results_key)
+def criteria_page(request, search_id):
+    """ Page of results, keyed by criteria text and page number """
+    RENDERED.append(search_id)
+    return HttpResponse(f"criteria {search_id} render {len(RENDERED)}")
+
+
+class PageCacheTests(TestCase):
+    """ Pages are rendered once, until the data shown changes """
+
+    @classmethod
+    def setUpTestData(cls):
+        Location.load_defaults()
+        Impact.load_defaults()
+        cls.user = User.objects.create(username='tester')
+
+    def setUp(self):
+        cache.clear()
+        clear_stats()
+        RENDERED.clear()
+        self.factory = RequestFactory()
+
+    def get(self, view, search_id, user=None, query=''):
+        request = self.factory.get(f'/results/{search_id}/{query}')
+        request.user = user or AnonymousUser()
+        return view(request, search_id).content.decode('UTF-8')
+
+    def test_hit_and_miss(self):
+        first = self.get(law_page, 1)
+        self.assertEqual(self.get(law_page, 1), first)
+        self.get(law_page, 2)
+        self.assertEqual(RENDERED, [1, 2])
+
+        stats = cache_stats()
+        self.assertEqual([stats['hits'], stats['misses']], [1, 2])
+        self.assertEqual(stats['ratio'], 0.3333)
+        self.assertEqual(stats['backend'], 'LocMemCache')
+
+    def test_users_kept_apart(self):
+        self.get(law_page, 1)
+        self.get(law_page, 1, user=self.user)
+        self.get(law_page, 1, user=self.user)
+        self.assertEqual(RENDERED, [1, 1])
+
+    def test_law_writer_invalidates(self):
+        self.get(law_page, 1)
+        writer = LawWriter()
+        writer.save('AZ-SB4-1234-Y2021',
+                    {'BILLID': 'SB4', 'DOCDATE': '2021-03-01',
+                     'TITLE': 'Title', 'SUMMARY': 'Summary'},
+                    "(MAP)'doctor' => 'Healthcare'", 'Healthcare')
+        version = DataVersion.current(LAW_DATA)
+        writer.flush()
+        self.assertGreater(DataVersion.current(LAW_DATA), version)
+        self.get(law_page, 1)
+        self.assertEqual(RENDERED, [1, 1])
+
+    def test_criteria_and_page(self):
+        criteria = Criteria(location=Location.objects.get(shortname='az'))
+        criteria.save()
+        criteria.impacts.set([Impact.objects.get(iname='Jobs')])
+        criteria.set_text()
+        criteria.save()
+
+        self.get(criteria_page, criteria.id)
+        self.get(criteria_page, criteria.id, query='?page=1')
+        self.get(criteria_page, criteria.id, query='?page=2')
+        self.assertEqual(len(RENDERED), 2)
+
+        # Criteria changes bump CRITERIA_DATA, and the text in the key
+        criteria.impacts.add(Impact.objects.get(iname='Safety'))
+        self.get(criteria_page, criteria.id)
+        self.assertEqual(len(RENDERED), 3)
+
+    def test_profiles(self):
+        version = DataVersion.current(CRITERIA_DATA)
+        user = User.objects.create(username='pat')
+        self.assertGreater(DataVersion.current(CRITERIA_DATA), version)
+
+        # Each login saves the user and its profile, nothing shown changed
+        version = DataVersion.current(CRITERIA_DATA)
+        self.client.force_login(user)
+        user.save()
+        self.assertEqual(DataVersion.current(CRITERIA_DATA), version)
+
+        profile = user.profile
+        profile.location = Location.objects.get(shortname='az')
+        profile.save()
+        profile.set_criteria()
+        self.assertGreater(DataVersion.current(CRITERIA_DATA), version)
+
+    def test_post_not_cached(self):
+        request = self.factory.post('/results/1/')
+        request.user = AnonymousUser()
+        law_page(request, 1)
+        law_page(request, 1)
+        self.assertEqual(RENDERED, [1, 1])
+
+    def test_health(self):
+        self.get(law_page, 1)
+        self.get(law_page, 1)
+        request = self.factory.get('/health/')
+        request.user = AnonymousUser()
+        state = json.loads(health(request).content)
+        self.assertEqual(state['status'], 'UP')
+        self.assertEqual(state['cache']['hits'], 1)
+        self.assertEqual(state['cache']['ratio'], 0.5)
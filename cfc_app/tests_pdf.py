@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+cfc_app/tests_pdf.py -- Test page-streaming PDF conversion
+
+Written by Tony Pearson, IBM, 2021
+Licensed under Apache 2.0, see LICENSE for details
+"""
+
+# System imports
+import os
+import time
+from unittest.mock import patch
+
+# Django and other third-party imports
+from django.test import SimpleTestCase
+
+# Application imports
+from cfc_app.Oneline import Oneline
+from cfc_app.pdf_to_text import PDFtoText
+from cfc_app.text_convert import parse_intermediate, parse_pages
+
+TESTDATA = os.path.join(os.path.dirname(__file__), 'testdata')
+SAMPLE_PDF = os.path.join(TESTDATA, 'pdf_to_text_sample.pdf')
+SAMPLE_TXT = os.path.join(TESTDATA, 'pdf_to_text_sample.txt')
+
+
+def hang_page_range(binary_input, first, last, max_seconds=0):
+    """ Worker process stuck on a page, except for the first range """
+
+    if first > 0:
+        time.sleep(60)
+    return [f"pages {first}-{last}\f", False]
+
+
+class PDFtoTextTests(SimpleTestCase):
+    """ Pages streamed one at a time give the same text """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        with open(SAMPLE_PDF, 'rb') as pdf_file:
+            cls.bindata = pdf_file.read()
+        with open(SAMPLE_TXT, 'r') as text_file:
+            cls.expected = text_file.read()
+
+    def test_page_budget(self):
+        miner = PDFtoText(SAMPLE_PDF, self.bindata, max_pages=3)
+        pages = list(miner.iter_pages())
+        self.assertEqual(len(pages), 3)
+        self.assertTrue(miner.truncated)
+        self.assertTrue(all(page.endswith('\f') for page in pages))
+        self.assertTrue(self.expected.startswith(''.join(pages)))
+
+    def test_page_range(self):
+        miner = PDFtoText(SAMPLE_PDF, self.bindata)
+        self.assertEqual(miner.page_count(), 706)
+        first = ''.join(miner.iter_pages(0, 2))
+        second = ''.join(miner.iter_pages(2, 4))
+        both = ''.join(PDFtoText(SAMPLE_PDF, self.bindata,
+                                 max_pages=4).iter_pages())
+        self.assertEqual(first + second, both)
+        self.assertFalse(miner.truncated)
+
+    def test_parse_pages(self):
+        pages = list(PDFtoText(SAMPLE_PDF, self.bindata,
+                               max_pages=5).iter_pages())
+        streamed = Oneline(nltk_loaded=True)
+        self.assertEqual(parse_pages(pages, streamed),
+                         sum(len(page) for page in pages))
+        whole = parse_intermediate(''.join(pages), Oneline(nltk_loaded=True))
+        self.assertEqual(streamed.oneline, whole.oneline)
+
+    @patch('cfc_app.pdf_to_text.convert_page_range', hang_page_range)
+    def test_parallel_timeout(self):
+        miner = PDFtoText(SAMPLE_PDF, self.bindata, max_pages=40,
+                          max_seconds=1)
+        started = time.monotonic()
+        with self.assertLogs('cfc_app.pdf_to_text', 'WARNING') as logs:
+            text = miner.convert_to_text(workers=2)
+        self.assertLess(time.monotonic() - started, 30)
+        self.assertEqual(text, "pages 0-20\f")
+        self.assertTrue(miner.truncated)
+        self.assertIn('at page 21, limit 1 seconds', logs.output[0])
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+cfc_app/tests_reference.py -- Test Impact and Location rows kept in memory
+
+Written by Tony Pearson, IBM, 2021
+Licensed under Apache 2.0, see LICENSE for details
+"""
+
+# System imports
+
+# Django and other third-party imports
+from django.contrib.auth.models import User
+from django.test import TestCase
+
+# Application imports
+from cfc_app.forms import SearchForm
+from cfc_app.law_writer import LawWriter
+from cfc_app.models import (Location, Impact, REFERENCE_DATA,
+                            TREE_MAX_AGE)
+
+
+class ReferenceDataTests(TestCase):
+    """ Each table is read with one query, until a row changes """
+
+    @classmethod
+    def setUpTestData(cls):
+        Location.load_defaults()
+        Impact.load_defaults()
+
+    def setUp(self):
+        REFERENCE_DATA.clear()
+
+    def test_impacts(self):
+        with self.assertNumQueries(1):
+            names = [imp.iname for imp in REFERENCE_DATA.impacts()]
+            jobs = REFERENCE_DATA.impact('Jobs')
+            self.assertEqual(REFERENCE_DATA.impact_id(jobs.id), jobs)
+            self.assertIsNone(REFERENCE_DATA.impact('Unknown'))
+        self.assertEqual(names, ['Healthcare', 'Safety', 'Environment',
+                                 'Transportation', 'Jobs'])
+        self.assertEqual(
+            REFERENCE_DATA.impacts(include_none=True)[0].iname, 'None')
+
+    def test_locations(self):
+        with self.assertNumQueries(1):
+            names = [loc.shortname for loc in REFERENCE_DATA.locations()]
+            arizona = REFERENCE_DATA.legiscan_location(3)
+            self.assertEqual(REFERENCE_DATA.location('az'), arizona)
+            self.assertEqual(REFERENCE_DATA.location_id(arizona.id), arizona)
+            self.assertIsNone(REFERENCE_DATA.legiscan_location(0))
+        self.assertEqual(names, ['usa', 'az', 'oh'])
+        self.assertEqual(len(REFERENCE_DATA.locations(include_world=True)), 4)
+
+    def test_save_clears_cache(self):
+        REFERENCE_DATA.impacts()
+        Impact(iname='Education').save()
+        with self.assertNumQueries(1):
+            self.assertIsNotNone(REFERENCE_DATA.impact('Education'))
+
+        REFERENCE_DATA.location('oh').delete()
+        self.assertIsNone(REFERENCE_DATA.location('oh'))
+
+    def test_max_age(self):
+        REFERENCE_DATA.impacts()
+        REFERENCE_DATA.max_age = 0
+        try:
+            with self.assertNumQueries(1):
+                REFERENCE_DATA.impacts()
+        finally:
+            REFERENCE_DATA.max_age = TREE_MAX_AGE
+
+    def test_search_form(self):
+        SearchForm().as_p()
+        with self.assertNumQueries(0):
+            html = SearchForm().as_p()
+        self.assertIn('Arizona, USA', html)
+        self.assertIn('Transportation', html)
+        self.assertNotIn('>None<', html)
+
+        arizona = REFERENCE_DATA.location('az')
+        jobs = REFERENCE_DATA.impact('Jobs')
+        form = SearchForm({'location': arizona.id, 'impacts': [jobs.id]})
+        self.assertTrue(form.is_valid())
+        self.assertEqual(form.cleaned_data['location'], arizona)
+
+    def test_law_writer(self):
+        writer = LawWriter()
+        REFERENCE_DATA.impacts()
+        REFERENCE_DATA.locations()
+        with self.assertNumQueries(0):
+            self.assertEqual(writer.location('AZ').shortname, 'az')
+            self.assertIsNone(writer.location('ZZ'))
+            self.assertEqual(writer.impact('Safety').iname, 'Safety')
+        with self.assertRaises(Impact.DoesNotExist):
+            writer.impact('Unknown')
+
+    def test_set_criteria(self):
+        profile = User.objects.create(username='tester').profile
+        profile.location = REFERENCE_DATA.location('az')
+        profile.save()
+        profile.impacts.set([REFERENCE_DATA.impact('Jobs'),
+                             REFERENCE_DATA.impact('Safety')])
+        crit = profile.set_criteria().criteria
+        self.assertEqual(crit.crtext, 'world.usa.az-Safety-Jobs')
+
+        profile.impacts.set([REFERENCE_DATA.impact('Safety'),
+                             REFERENCE_DATA.impact('Healthcare')])
+        changed = profile.set_criteria().criteria
+        self.assertNotEqual(changed.id, crit.id)
+        self.assertEqual(changed.crtext, 'world.usa.az-Healthcare-Safety')
+        self.assertEqual([imp.iname for imp in changed.impacts.all()],
+                         ['Healthcare', 'Safety'])
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+cfc_app/tests_results.py -- Test saved search results and CSV download
+
+Written by Tony Pearson, IBM, 2021
+Licensed under Apache 2.0, see LICENSE for details
+"""
+
+# System imports
+import csv
+import io
+
+# Django and other third-party imports
+from django.test import TestCase
+
+# Application imports
+from cfc_app.law_writer import LawWriter
+from cfc_app.models import (Location, Impact, Criteria, Law, DataVersion,
+                            SearchResult)
+from cfc_app.search import search_results, result_laws
+
+
+def make_law(key, location, impact):
+    """ Save a cfc_app_law row """
+    law = Law(key=key, title=f'Title {key}', summary='Summary',
+              location=location, impact=impact)
+    law.save()
+    return law
+
+
+class SearchResultTests(TestCase):
+    """ Results are searched once, then kept until Law data changes """
+
+    @classmethod
+    def setUpTestData(cls):
+        Location.load_defaults()
+        Impact.load_defaults()
+        cls.usa = Location.objects.get(shortname='usa')
+        cls.arizona = Location.objects.get(shortname='az')
+        cls.ohio = Location.objects.get(shortname='oh')
+        cls.health = Impact.objects.get(iname='Healthcare')
+        cls.jobs = Impact.objects.get(iname='Jobs')
+        make_law('AZ-HB1-1234-Y2021', cls.arizona, cls.health)
+        make_law('AZ-HB2-1234-Y2021', cls.arizona, cls.jobs)
+        make_law('OH-HB1-5678-Y2021', cls.ohio, cls.health)
+        make_law('US-HR1-0001-Y2021', cls.usa, cls.health)
+
+    def make_criteria(self, location, impacts):
+        criteria = Criteria(location=location)
+        criteria.save()
+        criteria.impacts.set(impacts)
+        criteria.set_text()
+        criteria.save()
+        return criteria
+
+    def found_keys(self, result):
+        return [law.key for law in result_laws(result.id_list())]
+
+    def test_search_once(self):
+        criteria = self.make_criteria(self.arizona, [self.health])
+        result = search_results(criteria)
+        self.assertEqual(result.numlaws, 2)
+        self.assertEqual(self.found_keys(result),
+                         ['AZ-HB1-1234-Y2021', 'US-HR1-0001-Y2021'])
+
+        # Version and saved result only, the search is not run again
+        with self.assertNumQueries(2):
+            again = search_results(criteria)
+        self.assertEqual(again.pk, result.pk)
+        self.assertEqual(SearchResult.objects.count(), 1)
+
+    def test_law_changes(self):
+        criteria = self.make_criteria(self.arizona, [self.health])
+        version = search_results(criteria).version
+
+        make_law('AZ-SB3-1234-Y2021', self.arizona, self.health)
+        self.assertGreater(DataVersion.current(), version)
+        self.assertEqual(search_results(criteria).numlaws, 3)
+
+        writer = LawWriter()
+        writer.save('AZ-SB4-1234-Y2021',
+                    {'BILLID': 'SB4', 'DOCDATE': '2021-03-01',
+                     'TITLE': 'Title', 'SUMMARY': 'Summary'},
+                    "(MAP)'doctor' => 'Healthcare'", 'Healthcare')
+        writer.flush()
+        self.assertEqual(search_results(criteria).numlaws, 4)
+
+    def test_criteria_changes(self):
+        criteria = self.make_criteria(self.arizona, [self.health])
+        self.assertEqual(search_results(criteria).numlaws, 2)
+        criteria.impacts.add(self.jobs)
+        criteria.set_text()
+        criteria.save()
+        self.assertEqual(search_results(criteria).numlaws, 3)
+
+    def test_result_laws(self):
+        criteria = self.make_criteria(self.ohio, [self.health, self.jobs])
+        law_ids = search_results(criteria).id_list()
+        with self.assertNumQueries(1):
+            laws = result_laws(law_ids)
+            names = [law.location.longname for law in laws]
+            impacts = [law.impact.iname for law in laws]
+        self.assertEqual(names, ['Ohio, USA', 'United States'])
+        self.assertEqual(impacts, ['Healthcare', 'Healthcare'])
+
+    def test_download(self):
+        criteria = self.make_criteria(self.arizona, [self.jobs])
+        response = self.client.get(f'/download/{criteria.id}/')
+        self.assertEqual(response['Content-Disposition'],
+                         f'attachment; filename="results-{criteria.id}.csv"')
+        rows = list(csv.DictReader(io.StringIO(response.content.decode())))
+        self.assertEqual([row['key'] for row in rows], ['AZ-HB2-1234-Y2021'])
+        self.assertEqual(rows[0]['impact'], 'Jobs')
+        self.assertEqual(self.client.get('/download/0/').status_code, 404)
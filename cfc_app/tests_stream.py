@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+cfc_app/tests_stream.py -- Test streaming decode of dataset ZIP
+
+Written by Tony Pearson, IBM, 2021
+Licensed under Apache 2.0, see LICENSE for details
+"""
+
+# System imports
+import base64
+import io
+import json
+import zipfile
+
+# Django and other third-party imports
+from django.test import SimpleTestCase
+
+# Application imports
+from cfc_app.json_stream import extract_zip
+
+
+def make_dataset(status='OK'):
+    """ Build dataset JSON with a small ZIP, as Legiscan would """
+
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w') as zipf:
+        for num in range(20):
+            zipf.writestr(f"AZ/2021/bill/HB{num}.json",
+                          json.dumps({'bill': {'bill_id': num}}))
+    zipdata = buffer.getvalue()
+    mimedata = base64.encodebytes(zipdata).decode('ascii')
+    package = {'status': status,
+               'dataset': {'state_id': 3, 'zip': mimedata}}
+    # Legiscan escapes "/" in JSON strings
+    text = json.dumps(package).replace('/', '\\/')
+    return text.encode('UTF-8'), zipdata
+
+
+class JsonStreamTests(SimpleTestCase):
+    """ Testcases for json_stream.py """
+
+    def test_matches_json_loads(self):
+        """ Streaming decode matches json.loads() and b64decode() """
+
+        jsondata, zipdata = make_dataset()
+        package = json.loads(jsondata)
+        expected = base64.b64decode(package['dataset']['zip'])
+        self.assertEqual(expected, zipdata)
+
+        for chunk_size in [7, 64, 1000, 1024 * 1024]:
+            outfile = io.BytesIO()
+            size = extract_zip(io.BytesIO(jsondata), outfile,
+                               chunk_size=chunk_size)
+            self.assertEqual(size, len(zipdata))
+            self.assertEqual(outfile.getvalue(), zipdata)
+
+        outfile.seek(0)
+        with zipfile.ZipFile(outfile, 'r') as zipf:
+            self.assertEqual(len(zipf.namelist()), 20)
+
+    def test_status_not_ok(self):
+        """ Nothing is written if dataset status is not OK """
+
+        jsondata, _ = make_dataset(status='ERROR')
+        outfile = io.BytesIO()
+        self.assertEqual(extract_zip(io.BytesIO(jsondata), outfile), 0)
+        self.assertEqual(outfile.getvalue(), b'')
+
+    def test_no_zip_field(self):
+        """ Nothing is written if there is no zip field """
+
+        outfile = io.BytesIO()
+        jsondata = b'{"status": "OK", "dataset": {}}'
+        self.assertEqual(extract_zip(io.BytesIO(jsondata), outfile), 0)
+
+# end of tests
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+cfc_app/tests_sync.py -- Test fob_sync plan
+
+Written by Tony Pearson, IBM, 2021
+Licensed under Apache 2.0, see LICENSE for details
+"""
+
+# System imports
+import datetime as DT
+
+# Django and other third-party imports
+from django.test import TestCase
+
+# Application imports
+from cfc_app.models import Hash
+from cfc_app.sync_plan import SyncPlan
+
+OLD = DT.date(2021, 1, 1)
+NEW = DT.date(2021, 2, 1)
+
+
+def make_hash(name, mode, date, hashcode):
+    """ Save a cfc_app_hash row """
+    Hash(item_name=name, fob_method=mode, generated_date=date,
+         hashcode=hashcode, objsize=10).save()
+
+
+class SyncPlanTests(TestCase):
+    """ Plan adds, deletes and updates from two listings """
+
+    @classmethod
+    def setUpTestData(cls):
+        make_hash('AZ-2.pdf', 'FILE', NEW, 'b' * 32)
+        make_hash('AZ-2.pdf', 'OBJECT', OLD, 'a' * 32)
+        make_hash('AZ-3.pdf', 'FILE', NEW, 'c' * 32)
+        make_hash('AZ-3.pdf', 'OBJECT', OLD, 'c' * 32)
+        make_hash('AZ-4.pdf', 'FILE', OLD, 'd' * 32)
+        make_hash('AZ-4.pdf', 'OBJECT', OLD, 'd' * 32)
+
+    def plan_actions(self, plan):
+        return [[item.name, item.action] for item in plan.items]
+
+    def test_plan_copies(self):
+        flist = ['AZ-1.pdf', 'AZ-2.pdf', 'AZ-3.pdf', 'AZ-4.pdf', 'AZ-5.pdf']
+        olist = ['AZ-2.pdf', 'AZ-3.pdf', 'AZ-4.pdf', 'AZ-5.pdf', 'AZ-6.pdf']
+        plan = SyncPlan('FILE', 'OBJECT')
+        plan.plan_copies(flist, olist, 10)
+        self.assertEqual(self.plan_actions(plan),
+                         [['AZ-1.pdf', 'add'], ['AZ-2.pdf', 'update'],
+                          ['AZ-3.pdf', 'touch'], ['AZ-5.pdf', 'verify']])
+
+        plan = SyncPlan('FILE', 'OBJECT')
+        plan.plan_copies(flist, olist, 1, skip=True,
+                         done={'AZ-1.pdf': 'a' * 32, 'AZ-2.pdf': 'b' * 32})
+        self.assertEqual(self.plan_actions(plan), [['AZ-1.pdf', 'add']])
+
+    def test_plan_resume(self):
+        flist = ['AZ-2.pdf', 'AZ-3.pdf']
+        olist = ['AZ-2.pdf', 'AZ-3.pdf']
+        plan = SyncPlan('FILE', 'OBJECT')
+        plan.plan_copies(flist, olist, 10, done={'AZ-2.pdf': 'b' * 32})
+        self.assertEqual(self.plan_actions(plan), [['AZ-3.pdf', 'touch']])
+
+        # Source changed since the checkpoint, so it is copied again
+        plan = SyncPlan('FILE', 'OBJECT')
+        plan.plan_copies(flist, olist, 10, done={'AZ-2.pdf': 'e' * 32})
+        self.assertEqual(self.plan_actions(plan),
+                         [['AZ-2.pdf', 'update'], ['AZ-3.pdf', 'touch']])
+
+    def test_plan_deletes(self):
+        plan = SyncPlan('OBJECT', 'FILE')
+        plan.plan_deletes(['A', 'B', 'C', 'D'], ['B'], 2)
+        self.assertEqual(self.plan_actions(plan),
+                         [['A', 'delete'], ['C', 'delete']])
@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+cfc_app/tests_transfer.py -- Test streamed FILE/OBJECT transfers
+
+OBJECT storage is replaced by an in-process fake of the few S3 calls
+that FobStorage makes, so no credentials or network are needed.
+
+Written by Tony Pearson, IBM, 2021
+Licensed under Apache 2.0, see LICENSE for details
+"""
+
+# System imports
+import datetime as DT
+import hashlib
+import io
+import os
+import tempfile
+from unittest.mock import patch
+
+# Django and other third-party imports
+from django.test import SimpleTestCase, TestCase
+
+# Application imports
+from cfc_app.fob_storage import FobStorage
+from cfc_app.fob_transfer import TransferCheckpoint, copy_item, hash_item
+from cfc_app.management.commands.fob_sync import Command as FobSync
+from cfc_app.models import Hash
+
+PART_SIZE = 256 * 1024
+
+
+class FakeCOS():
+    """ In-process stand-in for the ibm_boto3 S3 client """
+
+    def __init__(self):
+        self.objects = {}
+        return None
+
+    def put_object(self, Key, Body, Bucket):
+        self.objects[Key] = bytes(Body)
+        return {'ETag': '"' + hashlib.md5(Body).hexdigest() + '"'}
+
+    def upload_fileobj(self, Fileobj, Bucket, Key):
+        # Like upload_fileobj, read the stream one part at a time
+        parts = []
+        for chunk in iter(lambda: Fileobj.read(PART_SIZE), b''):
+            parts.append(chunk)
+        self.objects[Key] = b''.join(parts)
+        return None
+
+    def get_object(self, Key, Bucket):
+        return {'Body': io.BytesIO(self.objects[Key])}
+
+    def download_fileobj(self, Bucket, Key, Fileobj):
+        Fileobj.write(self.objects[Key])
+        return None
+
+    def head_object(self, Bucket, Key):
+        data = self.objects[Key]
+        return {'ContentLength': len(data),
+                'ETag': '"' + hashlib.md5(data).hexdigest() + '"',
+                'LastModified': DT.datetime.now()}
+
+    def delete_object(self, Bucket, Key):
+        self.objects.pop(Key, None)
+        return None
+
+
+class BrokenReader():
+    """ Stream that fails part way through """
+
+    def __init__(self):
+        self.calls = 0
+
+    def read(self, size=-1):
+        self.calls += 1
+        if self.calls > 2:
+            raise IOError('connection reset')
+        return b'x' * 100
+
+
+def fake_object_storage():
+    """ FobStorage in OBJECT mode backed by FakeCOS """
+
+    fob = FobStorage('NONE', manifest='')
+    fob.mode = 'OBJECT'
+    fob.cos = FakeCOS()
+    fob.cos_bucket = 'fob-test'
+    return fob
+
+
+class FobTransferTests(SimpleTestCase):
+    """ Stream items between FILE and fake OBJECT storage """
+
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory(prefix='fob-')
+        self.fob_file = FobStorage('FILE', filesys=self.tempdir.name,
+                                   manifest='')
+        self.fob_object = fake_object_storage()
+        self.bindata = os.urandom(PART_SIZE * 3 + 17)
+        self.hashcode = hashlib.md5(self.bindata).hexdigest()
+
+    def tearDown(self):
+        self.tempdir.cleanup()
+
+    def test_file_to_object(self):
+        self.fob_file.upload_binary(self.bindata, 'AZ-HB1.pdf')
+        result = copy_item(self.fob_file, self.fob_object, 'AZ-HB1.pdf')
+        self.assertEqual(result, [self.hashcode, len(self.bindata)])
+        self.assertEqual(self.fob_object.cos.objects['AZ-HB1.pdf'],
+                         self.bindata)
+
+    def test_object_to_file(self):
+        self.fob_object.upload_binary(self.bindata, 'OH-SB2.pdf')
+        result = copy_item(self.fob_object, self.fob_file, 'OH-SB2.pdf')
+        self.assertEqual(result, [self.hashcode, len(self.bindata)])
+        self.assertEqual(self.fob_file.download_binary('OH-SB2.pdf'),
+                         self.bindata)
+        self.assertEqual(hash_item(self.fob_file, 'OH-SB2.pdf'), result)
+
+    def test_interrupted_upload_leaves_nothing(self):
+        with self.assertRaises(IOError):
+            self.fob_file.upload_file(BrokenReader(), 'AZ-HB3.pdf')
+        self.assertEqual(os.listdir(self.tempdir.name), [])
+
+    def test_checkpoint_resume(self):
+        ckname = os.path.join(self.tempdir.name, '.checkpoint.json')
+        checkpoint = TransferCheckpoint(ckname)
+        self.assertEqual(checkpoint.load(), {})
+        checkpoint.record('AZ-HB1.pdf', self.hashcode, 10)
+        checkpoint.record('AZ-HB2.pdf', 'b' * 32, 20)
+
+        resumed = TransferCheckpoint(ckname)
+        self.assertEqual(resumed.load(), {'AZ-HB1.pdf': self.hashcode,
+                                          'AZ-HB2.pdf': 'b' * 32})
+        resumed.clear()
+        self.assertFalse(os.path.exists(ckname))
+
+
+class FobSyncResumeTests(TestCase):
+    """ fob_sync copy_items resumes from its checkpoint """
+
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory(prefix='fob-')
+        self.ckname = os.path.join(self.tempdir.name, '.checkpoint.json')
+        self.fob_file = FobStorage('FILE', filesys=self.tempdir.name,
+                                   manifest='')
+        self.names = [f'AZ-HB{num}.pdf' for num in range(1, 7)]
+        for name in self.names:
+            self.fob_file.upload_binary(name.encode() * 100, name)
+        self.fob_object = fake_object_storage()
+        self.copied = []
+        self.interrupted = False
+
+    def tearDown(self):
+        self.tempdir.cleanup()
+
+    def sync(self):
+        """ fob_sync --maxput 10 --workers 1, windows of 4 items """
+
+        with patch('cfc_app.management.commands.fob_sync.FobStorage'):
+            cmd = FobSync()
+        cmd.fob_file = self.fob_file
+        cmd.fob_object = self.fob_object
+        cmd.workers = 1
+        cmd.ops = {'checkpoint': self.ckname}
+        cmd.flist = list(self.names)
+        cmd.olist = sorted(self.fob_object.cos.objects)
+        options = {'prefix': None, 'skip': False, 'dryrun': False,
+                   'verbosity': 0}
+        cmd.copy_items(10, options, from_fob='FILE', to_fob='OBJECT')
+        return cmd.count
+
+    def copy_or_fail(self, read_fob, write_fob, item_name):
+        """ copy_item, interrupted the first time AZ-HB6.pdf is copied """
+
+        self.copied.append(item_name)
+        if item_name == 'AZ-HB6.pdf' and not self.interrupted:
+            self.interrupted = True
+            raise IOError('Connection reset')
+        return copy_item(read_fob, write_fob, item_name)
+
+    @patch('cfc_app.management.commands.fob_sync.copy_item')
+    def test_resume(self, mock_copy):
+        mock_copy.side_effect = self.copy_or_fail
+        with self.assertRaises(IOError):
+            self.sync()
+
+        # The first window was copied and recorded, the second was not
+        done = TransferCheckpoint(self.ckname).load()
+        self.assertEqual(sorted(done), self.names[:4])
+        self.assertEqual(Hash.objects.filter(
+            item_name__in=list(done), fob_method='FILE').count(), 4)
+
+        # AZ-HB1.pdf was changed after it was copied
+        self.fob_file.upload_binary(b'changed', 'AZ-HB1.pdf')
+        Hash.objects.filter(item_name='AZ-HB1.pdf',
+                            fob_method='FILE').update(
+            hashcode=hashlib.md5(b'changed').hexdigest(),
+            generated_date=DT.date.today() + DT.timedelta(days=1))
+
+        # AZ-HB5.pdf was copied before the interruption, so it is only
+        # verified, not copied again
+        self.copied = []
+        self.assertEqual(self.sync(), 2)
+        self.assertEqual(sorted(self.copied), ['AZ-HB1.pdf', 'AZ-HB6.pdf'])
+        self.assertEqual(self.fob_object.cos.objects['AZ-HB1.pdf'],
+                         b'changed')
+        self.assertFalse(os.path.exists(self.ckname))
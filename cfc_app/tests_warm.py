@@ -0,0 +1,34 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+cfc_app/tests_warm.py -- Test state shared by tasks in one process
+
+Written by Tony Pearson, IBM, 2021
+Licensed under Apache 2.0, see LICENSE for details
+"""
+
+# System imports
+
+# Django and other third-party imports
+from django.test import SimpleTestCase
+
+# Application imports
+from cfc_app.warm_state import shared_wordmap
+
+IMPACTS = ['Healthcare', 'Safety', 'Environment', 'Transportation', 'Jobs']
+
+
+class SharedWordMapTests(SimpleTestCase):
+    """ wordmap.csv is loaded once per process """
+
+    def test_same_impacts_reuse_wordmap(self):
+        womp = shared_wordmap(IMPACTS)
+        self.assertIs(shared_wordmap(list(IMPACTS)), womp)
+        self.assertEqual(len(womp.matchers), 3)
+
+    def test_other_impacts_reload(self):
+        womp = shared_wordmap(IMPACTS)
+        other = shared_wordmap(IMPACTS[:3])
+        self.assertIsNot(other, womp)
+        self.assertEqual(other.impact_list, IMPACTS[:3])
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+cfc_app/tests_work_pool.py -- Test fetch/convert/finish worker pools
+
+Written by Tony Pearson, IBM, 2021
+Licensed under Apache 2.0, see LICENSE for details
+"""
+
+# System imports
+
+# Django and other third-party imports
+from django.test import SimpleTestCase
+
+# Application imports
+from cfc_app.work_pool import WorkPool
+
+
+def convert_pair(detail, bindata):
+    """ Same arguments as convert_source(detail, bindata) """
+
+    if bindata == b'bad':
+        raise ValueError(f"Cannot convert {detail}")
+    return f"{detail}:{bindata.decode()}"
+
+
+class WorkPoolTests(SimpleTestCase):
+    """ Items are fetched in threads, converted in processes """
+
+    def setUp(self):
+        self.finished = {}
+
+    def fetch(self, item):
+        if item == 'skip':
+            return None
+        if item == 'bad':
+            return [item, b'bad']
+        return [item, b'text']
+
+    def finish(self, item, result):
+        self.finished[item] = result
+        return 1 if result else 0
+
+    def test_convert_arguments(self):
+        pool = WorkPool(2, self.fetch, convert_pair, self.finish)
+        try:
+            for item in ['one', 'two', 'skip']:
+                pool.submit(item)
+            processed = pool.drain()
+        finally:
+            pool.close()
+
+        self.assertEqual(processed, 2)
+        self.assertEqual(self.finished, {'one': 'one:text',
+                                         'two': 'two:text',
+                                         'skip': None})
+
+    def test_convert_error(self):
+        with self.assertLogs('cfc_app.work_pool', 'ERROR'):
+            pool = WorkPool(1, self.fetch, convert_pair, self.finish)
+            try:
+                for item in ['bad', 'one']:
+                    pool.submit(item)
+                processed = pool.drain()
+            finally:
+                pool.close()
+
+        # The bad item is finished with None, the others still converted
+        self.assertEqual(processed, 1)
+        self.assertEqual(self.finished, {'bad': None, 'one': 'one:text'})
+        self.assertEqual(pool.completed, 2)
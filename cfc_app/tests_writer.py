@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+cfc_app/tests_writer.py -- Test batched save of analyzed legislation
+
+Written by Tony Pearson, IBM, 2021
+Licensed under Apache 2.0, see LICENSE for details
+"""
+
+# System imports
+
+# Django and other third-party imports
+from django.test import TestCase
+
+# Application imports
+from cfc_app.law_analysis import prior_analysis
+from cfc_app.law_writer import LawWriter
+from cfc_app.models import Location, Impact, Law
+
+
+def make_header(bill_id):
+    """ Header as parsed from the top of a text file """
+    return {'BILLID': bill_id, 'DOCDATE': '2021-03-01',
+            'TITLE': f'Title {bill_id}', 'SUMMARY': 'Summary',
+            'CITE': 'https://www.azleg.gov/'}
+
+
+class LawWriterTests(TestCase):
+    """ LawWriter creates and updates Law records in batches """
+
+    @classmethod
+    def setUpTestData(cls):
+        if Location.objects.count() == 0:
+            Location.load_defaults()
+        if Impact.objects.count() == 0:
+            Impact.load_defaults()
+
+    def test_create_then_update(self):
+        writer = LawWriter(batch_size=2)
+        writer.save('AZ-HB1-1234-Y2021', make_header('HB1'),
+                    "(MAP)'water' => 'Environment'", 'Environment')
+        self.assertEqual(Law.objects.count(), 0)
+        writer.save('AZ-HB2-1234-Y2021', make_header('HB2'),
+                    "(MAP)'doctor' => 'Healthcare'", 'Healthcare')
+        self.assertEqual(Law.objects.count(), 2)
+        self.assertEqual(writer.created, 2)
+
+        writer.save('AZ-HB1-1234-Y2021', make_header('HB1'),
+                    "(MAP)'police' => 'Safety'", 'Safety')
+        writer.flush()
+        self.assertEqual(Law.objects.count(), 2)
+        self.assertEqual(writer.updated, 1)
+
+        law = Law.objects.get(key='AZ-HB1-1234-Y2021')
+        self.assertEqual(law.impact.iname, 'Safety')
+        self.assertEqual(law.location.legiscan_id, 3)
+        self.assertEqual(law.bill_id, 'HB1')
+
+    def test_prior_analysis(self):
+        prior = prior_analysis("(NLU)'a' => 'Jobs'(MAP)'b' => 'Jobs'", 'Jobs')
+        self.assertEqual(prior, ["(NLU)'a' => 'Jobs'", "(MAP)'b' => 'Jobs'",
+                                 'Jobs', 'Jobs'])
+        self.assertEqual(prior_analysis(None, None), ["", "", "", ""])
@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Content-addressed cache of text extracted from PDF/HTML sources.
+
+Entries are keyed by the SHA-256 of the source bytes and the version of
+the extractor for that file type, see EXTRACTOR_VERSION in text_convert.
+A source that has been converted before, by this or any other bill, is
+not converted again.  The cached text is the extracted body, before the
+header and split_sentences(), so the TXT file written from a cache hit
+is the same as the one written by a new conversion.
+
+Entries are files named DIR/<extension>-v<version>/NN/<sha256>.txt.
+Bumping the version of one extension leaves the entries for the others
+in place, and purge() removes the directories of versions no longer in
+use.  Other directories under DIR are left alone.  When the cache grows
+past max_bytes, the least recently used entries are evicted.
+
+Set environment variable TEXT_CACHE to the directory to use, otherwise
+extract_files does not use a cache.
+
+Written by Tony Pearson, IBM, 2021
+Licensed under Apache 2.0, see LICENSE for details
+"""
+
+# System imports
+import hashlib
+import logging
+import os
+import re
+import shutil
+import tempfile
+import threading
+
+# Django and other third-party imports
+
+# Application imports
+
+# Debug with:  import pdb; pdb.set_trace()
+logger = logging.getLogger(__name__)
+
+MAX_BYTES = 1024 * 1024 * 1024    # 1 GiB
+LOW_WATER = 0.9                   # evict down to 90% of max_bytes
+
+
+class TextCache():
+    """ Extracted text, keyed by source SHA-256 and extractor version """
+
+    def __init__(self, dirname, versions, max_bytes=MAX_BYTES):
+        self.dirname = dirname
+        self.versions = versions
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0, 'stores': 0, 'evictions': 0}
+        os.makedirs(dirname, exist_ok=True)
+        self.size = sum(size for _, _, size in self.entries())
+        return None
+
+    @staticmethod
+    def source_key(bindata):
+        """ Content address of the source bytes """
+        return hashlib.sha256(bindata).hexdigest()
+
+    def version_dir(self, extension):
+        """ Directory for the current extractor version of extension """
+        return f"{extension}-v{self.versions[extension]}"
+
+    def entry_path(self, extension, key):
+        """ Full path of the cache entry """
+        return os.path.join(self.dirname, self.version_dir(extension),
+                            key[:2], key + '.txt')
+
+    def entries(self):
+        """ Yield [path, mtime, size] of each entry of current versions """
+        for extension in self.versions:
+            topdir = os.path.join(self.dirname, self.version_dir(extension))
+            for subdir, _, names in os.walk(topdir):
+                for name in names:
+                    if not name.endswith('.txt'):
+                        continue
+                    path = os.path.join(subdir, name)
+                    try:
+                        stats = os.stat(path)
+                    except FileNotFoundError:
+                        continue
+                    yield [path, stats.st_mtime, stats.st_size]
+
+    def count(self, stat):
+        """ Thread-safe increment of hit/miss statistics """
+        with self.lock:
+            self.stats[stat] += 1
+        return None
+
+    def get(self, extension, key):
+        """ Return cached text, or None if not found """
+
+        if extension not in self.versions:
+            return None
+
+        path = self.entry_path(extension, key)
+        try:
+            with open(path, 'r', encoding='UTF-8') as entry:
+                textdata = entry.read()
+            # Reading does not always update atime, so use mtime for LRU
+            os.utime(path)
+        except FileNotFoundError:
+            self.count('misses')
+            return None
+
+        self.count('hits')
+        return textdata
+
+    def put(self, extension, key, textdata):
+        """ Save text, evicting old entries if cache is full """
+
+        if extension not in self.versions:
+            return None
+
+        path = self.entry_path(extension, key)
+        subdir = os.path.dirname(path)
+        os.makedirs(subdir, exist_ok=True)
+
+        # Write to a temporary name, so that readers in other processes
+        # never see a partial entry.
+        bindata = textdata.encode('UTF-8')
+        try:
+            replaced = os.stat(path).st_size
+        except FileNotFoundError:
+            replaced = 0
+        with tempfile.NamedTemporaryFile(dir=subdir, prefix='.part-',
+                                         delete=False) as entry:
+            entry.write(bindata)
+        os.replace(entry.name, path)
+
+        with self.lock:
+            self.stats['stores'] += 1
+            self.size += len(bindata) - replaced
+            full = self.size > self.max_bytes
+        if full:
+            self.evict()
+        return None
+
+    def evict(self):
+        """ Remove least recently used entries, down to LOW_WATER """
+
+        with self.lock:
+            entries = sorted(self.entries(), key=lambda entry: entry[1])
+            self.size = sum(size for _, _, size in entries)
+            target = int(self.max_bytes * LOW_WATER)
+            for path, _, size in entries:
+                if self.size <= target:
+                    break
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                self.size -= size
+                self.stats['evictions'] += 1
+        return None
+
+    def purge(self):
+        """ Remove entries of extractor versions no longer in use
+
+        Only directories named <extension>-v<version>, for the extensions
+        in versions, are removed.
+        """
+
+        current = [self.version_dir(ext) for ext in self.versions]
+        removed = []
+        for name in sorted(os.listdir(self.dirname)):
+            path = os.path.join(self.dirname, name)
+            found = re.fullmatch(r'(\w+)-v\d+', name)
+            if (found and found.group(1) in self.versions
+                    and name not in current and os.path.isdir(path)):
+                shutil.rmtree(path, ignore_errors=True)
+                removed.append(name)
+        if removed:
+            logger.info(f"166:Removed old text cache versions: {removed}")
+        return removed
+
+    def show_stats(self):
+        """ Describe hits, misses and size """
+
+        lookups = self.stats['hits'] + self.stats['misses']
+        ratio = 100.0 * self.stats['hits'] / lookups if lookups else 0.0
+        return (f"Text cache: {self.stats['hits']} hits, "
+                f"{self.stats['misses']} misses ({ratio:.1f}% hit), "
+                f"{self.stats['stores']} stored, "
+                f"{self.stats['evictions']} evicted, "
+                f"{self.size / (1024 * 1024):.1f} MiB")
+
+# end of module
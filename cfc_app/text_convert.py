@@ -0,0 +1,295 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Convert PDF/HTML legislation source to a single text line.
+
+These functions do not touch the database or File/Object storage, so
+they can be run in a separate process by extract_files --workers.
+
+Written by Tony Pearson, IBM, 2021
+Licensed under Apache 2.0, see LICENSE for details
+"""
+
+# System imports
+import logging
+import re
+
+# Django and other third-party imports
+from bs4 import BeautifulSoup
+from lxml import etree
+
+# Application imports
+from cfc_app.Oneline import Oneline, Oneline_add_header
+from cfc_app.pdf_to_text import PDFtoText
+
+# Debug with:   import pdb; pdb.set_trace()
+logger = logging.getLogger(__name__)
+
+PARSER = "lxml"
+
+# Bump the version for a file type when its extraction changes, so that
+# the text saved by TextCache for that file type is converted again.
+EXTRACTOR_VERSION = {'html': 1, 'pdf': 1}
+
+# Ordered lists are changed from "N." or "A." to "(N)" or "(A)"
+NUMBER_REGEX = re.compile(r"^([0-9]{1,2})[.] ")
+LETTER_REGEX = re.compile(r"^([A-Za-z])[.] ")
+
+# Same as BeautifulSoup, strings of only these are shrunk to one space
+ASCII_SPACES = '\x20\x0a\x09\x0c\x0d'
+PRESERVE_TAGS = ['pre', 'textarea']
+
+
+class HtmlSections():
+    """ lxml parser target to find title, SECHEAD spans and paragraphs
+
+    Finds the same strings as BeautifulSoup with the lxml parser, in a
+    single pass without building the tree.  Each open element is kept
+    only as [name, children, string, kind, index], where string is what
+    BeautifulSoup Tag.string would return for it so far.
+    """
+
+    def __init__(self):
+        self.title = None
+        self.found_title = False
+        self.sections = []
+        self.paragraphs = []
+        self.stack = [[None, 0, None, None, None]]
+        self.pending = []
+        self.preserve = 0
+        return None
+
+    def add_child(self, value):
+        """ Count child string or element of the current element """
+        parent = self.stack[-1]
+        parent[1] += 1
+        parent[2] = value
+        return None
+
+    def flush(self):
+        """ End of a string, same as BeautifulSoup.endData() """
+        if self.pending:
+            text = ''.join(self.pending)
+            self.pending = []
+            if not self.preserve and not text.strip(ASCII_SPACES):
+                text = '\n' if '\n' in text else ' '
+            self.add_child(text)
+        return None
+
+    def start(self, tag, attrib, nsmap=None):
+        """ Start of element, reserve slot if it is one we want """
+        self.flush()
+        kind, index = None, None
+        if tag == 'title' and not self.found_title:
+            self.found_title = True
+            kind = 'title'
+        elif tag == 'span' and 'SECHEAD' in attrib.get('class', '').split():
+            kind, index = 'section', len(self.sections)
+            self.sections.append(None)
+        elif tag == 'p':
+            kind, index = 'paragraph', len(self.paragraphs)
+            self.paragraphs.append(None)
+
+        if tag in PRESERVE_TAGS:
+            self.preserve += 1
+        self.stack.append([tag, 0, None, kind, index])
+        return None
+
+    def end(self, tag=None):
+        """ End of element, save its string if it is one we want """
+        self.flush()
+        name, children, value, kind, index = self.stack.pop()
+        if children != 1:
+            value = None
+
+        if kind == 'title':
+            self.title = value
+        elif kind == 'section':
+            self.sections[index] = value
+        elif kind == 'paragraph':
+            self.paragraphs[index] = value
+
+        if name in PRESERVE_TAGS:
+            self.preserve -= 1
+        self.add_child(value)
+        return None
+
+    def data(self, data):
+        """ Text, joined until the next tag, comment or end """
+        self.pending.append(data)
+        return None
+
+    def comment(self, text):
+        """ Comments are strings, same as BeautifulSoup Comment """
+        self.flush()
+        self.pending.append(text)
+        self.flush()
+        return None
+
+    def pi(self, target, data=None):
+        """ Processing instruction, same as BeautifulSoup """
+        self.flush()
+        self.pending.append(target + ' ' + data)
+        self.flush()
+        return None
+
+    def doctype(self, name, pubid, system):
+        """ Doctype is a child of the document, never one we want """
+        self.flush()
+        self.add_child(name)
+        return None
+
+    def close(self):
+        """ End of document, end any elements still open """
+        self.flush()
+        while len(self.stack) > 1:
+            self.end()
+        return self
+
+
+def add_sections(title, found_title, sections, paragraphs, out_line):
+    """ Add title, section headers then paragraphs, in that order """
+
+    if found_title:
+        out_line.add_text(title)
+
+    for rawtext in sections:
+        if rawtext:
+            lines = rawtext.splitlines()
+            header = " ".join(lines)
+            out_line.add_text(header)
+
+    for prg in paragraphs:
+        if prg:
+            prg = NUMBER_REGEX.sub(r"(\1) ", prg)
+            prg = LETTER_REGEX.sub(r"(\1) ", prg)
+            out_line.add_text(prg)
+
+    return out_line
+
+
+def parse_html(in_line, out_line):
+    """ Parse HTML in a single pass, same text as parse_html_soup() """
+
+    target = HtmlSections()
+    parser = etree.HTMLParser(target=target, recover=True)
+    try:
+        parser.feed(in_line)
+        parser.close()
+    except etree.ParserError as exc:
+        logger.warning(f"79:HTML parser failed, using BeautifulSoup: {exc}")
+        return parse_html_soup(in_line, out_line)
+
+    return add_sections(target.title, target.found_title, target.sections,
+                        target.paragraphs, out_line)
+
+
+def parse_html_soup(in_line, out_line):
+    """ Use BeautifulSoup libraries to parse HTML """
+
+    soup = BeautifulSoup(in_line, PARSER)
+    title = soup.find('title')
+    sections = soup.findAll("span", {"class": "SECHEAD"})
+    paragraphs = soup.findAll("p")
+    return add_sections(title.string if title else None, title is not None,
+                        [section.string for section in sections],
+                        [paragraph.string for paragraph in paragraphs],
+                        out_line)
+
+
+def parse_intermediate(input_string, output_line):
+    """ Parse the intermediate file from pdf_to_text conversion """
+
+    lines = input_string.splitlines()
+    for line in lines:
+        newline = line.replace('B I L L', 'BILL')
+        newline = newline.strip()
+        # Remove lines that only contain blanks or line numbers only
+        if newline != '' and not newline.isdigit():
+            output_line.add_text(newline)
+    return output_line
+
+
+def parse_pages(pages, output_line):
+    """ Parse PDF text one page at a time, return characters seen
+
+    pages is any iterable of page text, such as PDFtoText.iter_pages(),
+    so parsing starts while the later pages are still being converted.
+    """
+
+    chars = 0
+    for page in pages:
+        chars += len(page)
+        parse_intermediate(page, output_line)
+    return chars
+
+
+def extract_body(detail, bindata, max_pages=0, max_seconds=0,
+                 pdf_workers=0):
+    """ Extract text from PDF/HTML bytes, without header
+
+    Returns [body, complete].  The body is the text as joined by
+    Oneline.add_text(), or None if the PDF did not contain any text that
+    could be extracted.  complete is False if a PDF was truncated by
+    max_pages or max_seconds, see PDFtoText.
+    """
+
+    body_line = Oneline(nltk_loaded=True)
+    complete = True
+    if detail.extension == 'html':
+        billtext = bindata.decode('UTF-8', errors='ignore')
+        parse_html(billtext, body_line)
+
+    elif detail.extension == 'pdf':
+        miner = PDFtoText(detail.bill_name, bindata, max_pages=max_pages,
+                          max_seconds=max_seconds)
+        # Long PDFs can be split across processes.  Otherwise, each page
+        # is parsed as soon as it is converted.
+        if pdf_workers > 1:
+            pages = [miner.convert_to_text(pdf_workers)]
+        else:
+            pages = miner.iter_pages()
+        if not parse_pages(pages, body_line):
+            return [None, not miner.truncated]
+        complete = not miner.truncated
+
+    else:
+        return [None, True]
+
+    return [body_line.oneline, complete]
+
+
+def text_with_header(detail, body):
+    """ Put header ahead of extracted text, split into sentences """
+
+    text_line = Oneline(nltk_loaded=True)
+    Oneline_add_header(text_line, detail)
+    text_line.add_oneline(body)
+    text_line.split_sentences()
+    return text_line.oneline
+
+
+def convert_source(detail, bindata, max_pages=0, max_seconds=0, body=None):
+    """ Convert PDF/HTML bytes into text ready for File/Object storage
+
+    body is the text extracted from the same source before, if found in
+    TextCache, and then bindata is not converted again.
+
+    Returns [textdata, body].  textdata is an empty string if the PDF did
+    not contain any text that could be extracted.  The body returned is
+    the text to save in TextCache, None if it should not be saved.
+    """
+
+    complete = False
+    if body is None:
+        body, complete = extract_body(detail, bindata, max_pages,
+                                      max_seconds)
+
+    textdata = ""
+    if body is not None:
+        textdata = text_with_header(detail, body)
+
+    return [textdata, body if complete else None]
+
+# end of module
@@ -33,6 +33,10 @@ urlpatterns = [
     # Page for sending saved search critera via email
     path('sendmail/<int:search_id>/', views.sendmail, name='sendmail'),
 
+    # Status of search results queued by sendmail
+    path('mailstatus/<int:job_id>/', views.mailstatus,
+         name='mailstatus'),
+
     # Page for sending saved search critera via email
     path('download/<int:search_id>/', views.download, name='download'),
 
@@ -9,27 +9,29 @@ Licensed under Apache 2.0, see LICENSE for details
 """
 
 # System imports
-import os
 import csv
 from datetime import datetime
 import logging
 
 # Django and other third-party imports
 from django.contrib.admin.views.decorators import staff_member_required
-from django.conf import settings
-from django.template.loader import render_to_string
-from django.core.mail import send_mail
-from django.http import HttpResponse
+from django.contrib.auth.decorators import login_required
+from django.http import HttpResponse, StreamingHttpResponse
 from django.contrib.auth.models import User
-from django.shortcuts import render, redirect
+from django.shortcuts import get_object_or_404, render, redirect
 from django.http import JsonResponse
 from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
 
 # Application imports
 from users.models import Profile
 from .forms import SearchForm
+from .law_export import export_laws, FORMATS
+from .mailer import mail_configured, queue_mail, recipient_format
 from .models import impact_seq
-from .models import Location, Impact, Criteria, Law
+from .models import Location, Impact, Criteria, MailJob
+from .models import CRITERIA_DATA, REFERENCE_DATA
+from .page_cache import cached_page, cache_stats, page_number
+from .search import search_results, result_laws
 
 
 # Debugging options
@@ -39,68 +41,19 @@ from .models import Location, Impact, Criteria, Law
 # import pdb; pdb.set_trace()
 logger = logging.getLogger(__name__)
 
+NUM_LAWS_PER_PAGE = 10    # Laws shown on each page of results
+
 #########################
 # Support functions here
 #########################
 
 
-def cte_query(loc):
-    """ Ancestor-search, find all parents to specified location"""
-    loc_list = [loc]
-    for _ in range(10):
-        loc = loc.parent
-        if loc:
-            loc_list.append(loc)
-            if loc.shortname == 'world':
-                break
-        else:
-            break
-    return loc_list
-
-
-def make_csv(search_id, laws):
-    """ Make Comma-Separated-Value (CSV) format file"""
-    laws_table = []
-    for law in laws:
-        laws_table.append({'key': law.key,
-                           'location': law.location.longname,
-                           'impact': law.impact.iname,
-                           'title': law.title,
-                           'summary': law.summary})
-
-    filename = results_filename(search_id)
-    with open(filename, 'w', newline='') as csvfile:
-        fieldnames = ['key', 'location', 'impact', 'title', 'summary']
-        writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-
-        writer.writeheader()
-        for law in laws_table:
-            writer.writerow(law)
-    return None
-
-
-def recipient_format(first, last, addr):
-    """ Format receiption with email address and name if available """
-    if first == '' and last == '':
-        rec = addr
-    else:
-        rec = first+' '+last+' <'+addr+'>'
-    return rec
-
-
 def results_basename(search_id):
     """ Generate the base name for the download file """
     basename = 'results-{}.csv'.format(search_id)
     return basename
 
 
-def results_filename(search_id):
-    """ Generate the fully qualified name for results file """
-    basename = results_basename(search_id)
-    filename = os.path.join(settings.MEDIA_ROOT, basename)
-    return filename
-
-
 def strip_double_quotes(item):
     """ Remove double quotes and the beginning and end of string """
     new_item = item
@@ -109,6 +62,14 @@ def strip_double_quotes(item):
     return new_item
 
 
+def results_key(request, search_id):
+    """ Criteria text and page number for the cached results page """
+
+    crtext = Criteria.objects.filter(id=search_id).values_list(
+        'crtext', flat=True).first()
+    return [crtext, page_number(request)]
+
+
 def zero_if_none(item):
     """If item exists, return id, otherwise return 0."""
     result_id = 0
@@ -130,6 +91,7 @@ def criteria(request, search_id):
 
 
 @staff_member_required
+@cached_page('criterias', data=CRITERIA_DATA)
 def criterias(request):
     """Show all saved search criterias."""
 
@@ -155,9 +117,11 @@ def criterias(request):
 
 
 def download(request, search_id):
-    """ Download results as CSV file """
+    """ Download results as CSV file, written straight to the response """
 
     logger.info(f"159:Download {request.user}")
+    criteria = get_object_or_404(Criteria, id=search_id)
+
     # Create the HttpResponse object with the appropriate CSV header.
     response = HttpResponse(content_type='text/csv')
     basename = results_basename(search_id)
@@ -165,10 +129,10 @@ def download(request, search_id):
     response['Content-Disposition'] = disp
     writer = csv.writer(response)
 
-    with open(results_filename(search_id), newline="") as in_file:
-        reader = csv.reader(in_file)
-        for row in reader:
-            writer.writerow(row)
+    writer.writerow(['key', 'location', 'impact', 'title', 'summary'])
+    for law in result_laws(search_results(criteria).id_list()):
+        writer.writerow([law.key, law.location.longname, law.impact.iname,
+                         law.title, law.summary])
     return response
 
 
@@ -176,20 +140,20 @@ def health(request):
     """ Used by Docker/Tekton to confirm status """
 
     logger.info(f"177:Health {request.user}")
-    state = {"status": "UP"}
+    state = {"status": "UP", "cache": cache_stats()}
     return JsonResponse(state)
 
 
+@cached_page('impacts')
 def impacts(request):
     """Show all impacts."""
 
     logger.info(f"185:Impacts {request.user}")
-    impacts = Impact.objects.order_by('date_added')
-    if len(impacts) == 0:
+    if len(REFERENCE_DATA.impacts(include_none=True)) == 0:
         Impact.load_defaults()
 
     # Do not display the None option for end-users
-    impacts = Impact.objects.order_by('date_added').exclude(iname='None')
+    impacts = REFERENCE_DATA.impacts()
 
     context = {'impacts': impacts}
     return render(request, 'impacts.html', context)
@@ -204,53 +168,50 @@ def index(request):
 
 @staff_member_required
 def lawdump(request):
-    """ Download all legislation as CSV file, for staff use only """
+    """ Download all legislation as CSV file, for staff use only
+
+    Specify ?format=jsonl for JSON Lines instead of CSV, and &gzip=1
+    to compress it.  The laws are streamed as they are read.
+    """
 
     logger.info(f"208:Lawdump username={request.user.username}")
-    # Create the HttpResponse object with the appropriate CSV header.
-    response = HttpResponse(content_type='text/csv')
-    basename = 'lawdump.csv'
+    fmt = request.GET.get('format', 'csv')
+    if fmt not in FORMATS:
+        fmt = 'csv'
+    compress = request.GET.get('gzip', '') not in ['', '0']
+
+    content, content_type, basename = export_laws(fmt, compress)
+    response = StreamingHttpResponse(content, content_type=content_type)
     disp = 'attachment; filename="{}"'.format(basename)
     response['Content-Disposition'] = disp
-    writer = csv.writer(response)
-    writer.writerow(['key', 'location', 'impact', 'title', 'summary'])
-    for law in Law.objects.all():
-        writer.writerow([law.key, law.location.longname, law.impact.iname,
-                         law.title, law.summary])
     return response
 
 
+@cached_page('locations')
 def locations(request):
     """Show all locations."""
-    locations = Location.objects.order_by('hierarchy')
 
     # If database is empty, re-create the "world" entry that acts as
     # the master parent for the ancestor-search.
-    if len(locations) == 0:
+    if len(REFERENCE_DATA.locations(include_world=True)) == 0:
         Location.load_defaults()
 
-    locations = Location.objects.order_by(
-        'hierarchy').exclude(longname='world')
+    locations = REFERENCE_DATA.locations()
     context = {'locations': locations}
     return render(request, 'locations.html', context)
 
 
+@cached_page('results', key_parts=results_key)
 def results(request, search_id):
     """Show search results."""
 
     criteria = Criteria.objects.get(id=search_id)
-    loc = criteria.location
     # import pdb; pdb.set_trace()
-    loc_list = cte_query(loc)
-    impact_list = criteria.impacts.all()
-
-    laws_list = Law.objects.filter(location__in=loc_list)
-    laws_list = laws_list.filter(impact__in=impact_list)
+    result = search_results(criteria)
 
     # Pagination logic, to change the amount of laws per page modify NUM_LAWS_PER_PAGE
-    NUM_LAWS_PER_PAGE = 10
     page = request.GET.get('page')
-    paginator = Paginator(laws_list, NUM_LAWS_PER_PAGE)
+    paginator = Paginator(result.id_list(), NUM_LAWS_PER_PAGE)
 
     try: 
         laws = paginator.page(page)
@@ -258,16 +219,16 @@ def results(request, search_id):
         laws = paginator.page(1)
     except EmptyPage:
         laws = paginator.page(paginator.num_pages)
+    laws.object_list = result_laws(laws.object_list)
 
     gen_date = datetime.now().strftime("%B %-d, %Y")
 
     context = {'heading': criteria.crtext,
                'laws': laws,
-               'numlaws': len(laws_list),
+               'numlaws': result.numlaws,
                'search_id': search_id,
                'gen_date': gen_date}
 
-    make_csv(search_id, laws_list)
     return render(request, 'results.html', context)
 
 
@@ -288,9 +249,9 @@ def search(request):
 
         form = SearchForm(data=request.POST)
         if form.is_valid():
-            criteria = form.save()
-            criteria.set_text()
-            criteria.save()
+            # Reuse the criteria of an earlier, identical search
+            criteria = Criteria.find_or_create(
+                form.cleaned_data['location'], form.cleaned_data['impacts'])
             crit_id = criteria.id
             return redirect('cfc_app:results', search_id=crit_id)
 
@@ -298,28 +259,15 @@ def search(request):
     return render(request, 'search.html', context)
 
 
+@login_required
 def sendmail(request, search_id):
-    """ send results to profile user """
-
-# subject: A string;
-# message: A string;
-# from_email: A string;
-# recipient_list: A list of strings;
-# fail_silently: A boolean;
-# auth_user: The optional username to use to authenticate to the SMTP server;
-# auth_password: optional password to use to authenticate to the SMTP server;
-# connection: The optional email backend to use to send the mail;
-# html_message: An optional string containg the messsage in HTML format.
-
-    today = datetime.now()
-    gen_date = today.strftime("%B %d, %Y")
-
-    # Read the results set
-    filename = results_filename(search_id)
-    with open(filename, 'rt') as res_file:
-        results_reader = csv.DictReader(res_file)
-        laws_found = list(results_reader)
-        # import pdb; pdb.set_trace()
+    """ Queue results to be sent to profile user by a django-q task
+
+    The page returns at once, with the id of the MailJob, and
+    mailstatus/<id>/ shows whether it has been sent.
+    """
+
+    criteria = Criteria.objects.get(id=search_id)
 
     # Specify email headers
     user = request.user
@@ -328,30 +276,23 @@ def sendmail(request, search_id):
                                    user.email)]
 
     # If the EMAIL_HOST is configured in cfc_project/settings.py
-    if settings.EMAIL_HOST:
-        context = {'laws_found': laws_found,
-                   'gen_date': gen_date}
-        text_version = render_to_string(
-            template_name='email-results.txt',
-            context=context, request=request)
-        html_version = render_to_string(
-            template_name='email-results.html',
-            context=context, request=request)
-
-        sent = send_mail(f"{settings.APP_NAME} --Search Results-- {gen_date}",
-                         text_version, 'CFCapp@ibm.com', recipients,
-                         fail_silently=True, html_message=html_version)
-
-        # the variable "sent" represents the number of emails successfully
-        # sent.  Thus, 0=none sent, and 1=one sent successfull
-        if sent > 0:
-            status_message = 'Mail successfully sent to:'
-        else:
-            status_message = 'ERROR: Unable to deliver email'
+    job = None
+    if mail_configured():
+        job = queue_mail(user, criteria, recipients[0])
+        status_message = 'Mail queued to be sent to:'
     else:
         status_message = 'ERROR: EMAIL_HOST environment variable not defined'
 
     context = {'status_message': status_message,
                'recipients': recipients,
+               'job': job,
                'search_id': search_id}
     return render(request, 'email_sent.html', context)
+
+
+@login_required
+def mailstatus(request, job_id):
+    """ Status of a MailJob queued by sendmail, as JSON """
+
+    job = get_object_or_404(MailJob, id=job_id, user=request.user)
+    return JsonResponse(job.state())
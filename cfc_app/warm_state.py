@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+State loaded once per process: NLTK punkt tokenizer and word map.
+
+nltk.download('punkt') goes to the network to check for updates every
+time it is called, and WordMap parses wordmap.csv and builds its term
+matchers every time analyze_text runs.  The functions here do that work
+once per process, so a long-running worker (see warm_worker command)
+pays for it only at startup.
+
+Written by Tony Pearson, IBM, 2021
+Licensed under Apache 2.0, see LICENSE for details
+"""
+
+# System imports
+import logging
+import os
+import threading
+import time
+
+# Django and other third-party imports
+from django.conf import settings
+import nltk
+
+# Application imports
+from cfc_app.word_map import WordMap
+
+# Debug with:  import pdb; pdb.set_trace()
+logger = logging.getLogger(__name__)
+
+RLIMIT = 10   # same as analyze_text
+
+STATE_LOCK = threading.Lock()
+PUNKT_READY = []          # non-empty once punkt has been loaded
+WORDMAPS = {}             # (impacts, mtime) => WordMap
+
+
+def ensure_punkt():
+    """ Load NLTK punkt tokenizer, downloading only if not found locally """
+
+    with STATE_LOCK:
+        if PUNKT_READY:
+            return None
+
+        started = time.perf_counter()
+        try:
+            nltk.data.find('tokenizers/punkt')
+        except LookupError:
+            logger.warning("52:NLTK punkt not found locally, downloading")
+            nltk.download('punkt', quiet=True)
+
+        # Load the tokenizer now, rather than on the first bill
+        nltk.tokenize.sent_tokenize("Warm up. Ready.")
+        PUNKT_READY.append(True)
+        logger.info(f"58:NLTK punkt loaded in "
+                    f"{time.perf_counter()-started:.3f} seconds")
+    return None
+
+
+def shared_wordmap(impact_list):
+    """ WordMap for these impacts, reloaded only if wordmap.csv changes """
+
+    mapname = os.path.join(settings.SOURCE_ROOT, 'wordmap.csv')
+    key = (tuple(impact_list), os.path.getmtime(mapname))
+
+    with STATE_LOCK:
+        womp = WORDMAPS.get(key)
+        if womp is None:
+            started = time.perf_counter()
+            womp = WordMap(RLIMIT)
+            womp.load_csv(list(impact_list))
+            for category_list in [womp.primary, womp.secondary,
+                                  womp.tertiary]:
+                womp.term_matcher(category_list)
+            WORDMAPS.clear()
+            WORDMAPS[key] = womp
+            logger.info(f"80:Word map loaded in "
+                        f"{time.perf_counter()-started:.3f} seconds")
+    return womp
+
+
+def warm_up(impact_list):
+    """ Load all shared state, return {step: seconds} """
+
+    timings = {}
+    started = time.perf_counter()
+    ensure_punkt()
+    timings['punkt'] = time.perf_counter() - started
+
+    step = time.perf_counter()
+    shared_wordmap(impact_list)
+    timings['wordmap'] = time.perf_counter() - step
+
+    timings['total'] = time.perf_counter() - started
+    return timings
+
+# end of module
@@ -17,6 +17,7 @@ import re
 from django.conf import settings
 
 # Application imports
+from cfc_app.term_matcher import TermMatcher
 
 # import pdb; pdb.set_trace()
 logger = logging.getLogger(__name__)
@@ -41,6 +42,7 @@ class WordMap():
         self.regex = re.compile(r'["](.*)["]\s*,\s*["](.*)["]')
         self.impact_list = None
         self.categories = None
+        self.matchers = []
         return None
 
     def load_csv(self, impact_list):
@@ -110,8 +112,20 @@ class WordMap():
         self.primary = primary
         self.secondary = secondary
         self.tertiary = tertiary
+        self.matchers = []
         return None
 
+    def term_matcher(self, category_list):
+        """ Find or build the matcher for this list of terms """
+
+        for known_list, matcher in self.matchers:
+            if known_list is category_list:
+                return matcher
+
+        matcher = TermMatcher([rel[0] for rel in category_list])
+        self.matchers.append([category_list, matcher])
+        return matcher
+
     def relevance(self, extracted_text):
         """ return top impact areas from extracted text """
 
@@ -128,13 +142,15 @@ class WordMap():
     def scan_extract(self, extracted_text, category_list):
         """ Scan extracted text for relevant keywords """
 
-        relterms, concept = {}, []
+        concept = []
+        counts = self.term_matcher(category_list).count(extracted_text)
+
+        # Keep terms in category_list order, so ties sort as before
+        relterms = {}
         for rel in category_list:
             term = rel[0]
-            rec = re.compile(r"\b"+term+r"\b", re.IGNORECASE)
-            matches = rec.findall(extracted_text)
-            if matches:
-                relterms[term] = len(matches)
+            if term in counts:
+                relterms[term] = counts[term]
 
         num = 0
         # import pdb; pdb.set_trace()
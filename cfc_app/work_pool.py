@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Bounded worker pools for long-running custom commands.
+
+Each item goes through three steps:
+
+    fetch(item)              runs in a thread pool (network, storage I/O)
+    convert(*payload)        runs in a process pool (CPU-heavy parsing)
+    finish(item, result)     runs in the caller's thread
+
+fetch returns the list of arguments for convert, or None to skip it.
+If convert raises an exception, the error is logged and finish is
+called with None, so one bad item does not stop the others.
+
+All database updates belong in finish(), so that Django ORM access
+stays in the main thread.  The convert function must be defined at
+module level, so that it can be pickled and sent to another process.
+
+Written by Tony Pearson, IBM, 2021
+Licensed under Apache 2.0, see LICENSE for details
+"""
+
+# System imports
+import concurrent.futures as CF
+import logging
+import multiprocessing
+import time
+
+# Django and other third-party imports
+
+# Application imports
+
+# Debug with:   import pdb; pdb.set_trace()
+logger = logging.getLogger(__name__)
+
+
+class WorkPool():
+    """ Fetch in threads, convert in processes, finish in main thread """
+
+    def __init__(self, workers, fetch, convert, finish, threads=None):
+        self.workers = workers
+        self.fetch = fetch
+        self.convert = convert
+        self.finish = finish
+        if threads is None:
+            threads = workers * 2    # fetches spend most time waiting
+        self.threads = CF.ThreadPoolExecutor(max_workers=threads)
+        # Use "spawn" so that child processes do not inherit the locks
+        # held by fetch threads, nor the Django database connections.
+        self.procs = CF.ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context('spawn'))
+        self.backlog = workers * 4   # limit memory held by fetched items
+        self.fetching = {}
+        self.converting = {}
+        self.submitted = 0
+        self.completed = 0
+        self.processed = 0
+        self.start = time.monotonic()
+        return None
+
+    @property
+    def pending(self):
+        """ Number of items submitted but not yet finished """
+        return len(self.fetching) + len(self.converting)
+
+    def submit(self, item):
+        """ Queue item to be fetched """
+
+        future = self.threads.submit(self.fetch, item)
+        self.fetching[future] = item
+        self.submitted += 1
+        return None
+
+    def poll(self, block=False):
+        """ Move finished work along, return number of items processed
+
+        If block is True, wait until at least one step has completed.
+        Exceptions raised by fetch are re-raised here.
+        """
+
+        processed = 0
+        if self.pending == 0:
+            return processed
+
+        timeout = None if block else 0
+        futures = list(self.fetching) + list(self.converting)
+        done, _ = CF.wait(futures, timeout=timeout,
+                          return_when=CF.FIRST_COMPLETED)
+
+        for future in done:
+            if future in self.fetching:
+                item = self.fetching.pop(future)
+                payload = future.result()
+                if payload is None:
+                    processed += self.complete(item, None)
+                else:
+                    conv = self.procs.submit(self.convert, *payload)
+                    self.converting[conv] = item
+            else:
+                item = self.converting.pop(future)
+                try:
+                    result = future.result()
+                except Exception as exc:
+                    logger.error(f"106:Convert failed for {item}: {exc}")
+                    result = None
+                processed += self.complete(item, result)
+
+        return processed
+
+    def complete(self, item, result):
+        """ Run the finish step for this item """
+
+        processed = self.finish(item, result)
+        self.completed += 1
+        self.processed += processed
+        return processed
+
+    def wait_below(self, count):
+        """ Wait until fewer than count items are pending """
+
+        processed = 0
+        while self.pending and self.pending >= count:
+            processed += self.poll(block=True)
+        return processed
+
+    def drain(self):
+        """ Wait for all pending items to finish """
+
+        processed = 0
+        while self.pending:
+            processed += self.poll(block=True)
+        return processed
+
+    def close(self, cancel=False):
+        """ Shut down the thread and process pools """
+
+        if cancel:
+            for future in list(self.fetching) + list(self.converting):
+                future.cancel()
+            self.fetching, self.converting = {}, {}
+
+        self.threads.shutdown(wait=True)
+        self.procs.shutdown(wait=True)
+        return None
+
+    def elapsed(self):
+        """ Seconds since this pool was started """
+        return time.monotonic() - self.start
+
+    def rate(self):
+        """ Items completed per second """
+
+        seconds = self.elapsed()
+        items_per_sec = 0.0
+        if seconds > 0:
+            items_per_sec = self.completed / seconds
+        return items_per_sec
+
+# end of module
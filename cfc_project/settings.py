@@ -43,6 +43,13 @@ APP_NAME = 'Legit-Info'
 #       COS_API_KEY_ID = <COS api-key-id>
 #       COS_INSTANCE = <crn:v1:bluemix:public:etc:etc:etc>
 #
+# Optionally, set FOB_MANIFEST = 'full/path/to/manifest.sqlite3' to keep
+#    a local index of items, used to check if items exist and list them.
+#
+# Optionally, set TEXT_CACHE = 'full/path/to/directory' for extract_files
+#    to keep a cache of extracted text, so identical PDF/HTML sources are
+#    not converted again.
+#
 FOB_METHOD = os.getenv('FOB_METHOD', 'FILE')
 
 # Quick-start development settings - unsuitable for production
@@ -230,6 +237,62 @@ EMAIL_HOST_USER = os.getenv('EMAIL_HOST_USER', '')
 EMAIL_HOST_PASSWORD = os.getenv('EMAIL_HOST_PASSWORD', '')
 EMAIL_PORT = os.getenv('EMAIL_PORT', '')
 
+# Search results are emailed by a django-q task, see cfc_app/mailer.py.
+# Each task sends up to 'batch' messages over one SMTP connection.  A
+# message that fails is tried up to 'attempts' times, 'retry' seconds
+# apart.  A message still being sent after 'lease' seconds, by a task
+# that was killed, is sent again by the next task.
+
+MAIL_QUEUE = {
+    'batch': int(os.getenv('MAIL_BATCH', '50')),
+    'attempts': int(os.getenv('MAIL_ATTEMPTS', '3')),
+    'retry': int(os.getenv('MAIL_RETRY', '300')),
+    'lease': int(os.getenv('MAIL_LEASE', '900')),
+}
+
+# HTTP requests to Legiscan.com API and state websites share a keep-alive
+# session, see cfc_app/http_client.py.  Timeout is in seconds.  Requests
+# that fail with 429 or 5xx status codes are retried with backoff, and
+# wait no longer than 'max_backoff' seconds, even if the host sends a
+# longer Retry-After.  Add 'host_limits': {'state.oh.us': 4} to change
+# concurrent requests allowed per host.
+
+HTTP_CLIENT = {
+    'timeout': float(os.getenv('HTTP_TIMEOUT', '60')),
+    'retries': int(os.getenv('HTTP_RETRIES', '3')),
+    'max_backoff': float(os.getenv('HTTP_MAX_BACKOFF', '60')),
+}
+
+# Rendered pages for locations/, impacts/, criterias/ and results/ are
+# cached, see cfc_app/page_cache.py.  CFC_CACHE selects where:
+#   'locmem' -- memory of each gunicorn worker (default)
+#   'file'   -- files in CFC_CACHE_DIR, shared by workers on one host
+#   'redis'  -- Redis at CFC_CACHE_URL, shared by all hosts, this
+#               requires the django-redis package to be installed
+# Timeout is in seconds.  Pages are also rebuilt when laws change.
+
+CACHE_BACKENDS = {
+    'locmem': ['django.core.cache.backends.locmem.LocMemCache',
+               'cfc_app'],
+    'file': ['django.core.cache.backends.filebased.FileBasedCache',
+             os.getenv('CFC_CACHE_DIR', '/tmp/cfc_cache')],
+    'redis': ['django_redis.cache.RedisCache',
+              os.getenv('CFC_CACHE_URL', 'redis://localhost:6379/1')],
+}
+
+CFC_CACHE = os.getenv('CFC_CACHE', 'locmem')
+if CFC_CACHE not in CACHE_BACKENDS:
+    CFC_CACHE = 'locmem'
+
+CACHES = {
+    'default': {
+        'BACKEND': CACHE_BACKENDS[CFC_CACHE][0],
+        'LOCATION': CACHE_BACKENDS[CFC_CACHE][1],
+        'TIMEOUT': int(os.getenv('CFC_CACHE_TIMEOUT', '3600')),
+        'KEY_PREFIX': 'cfc',
+    }
+}
+
 WSGI_APPLICATION = 'cfc_project.wsgi.application'
 
 # Database
@@ -7,4 +7,4 @@ echo $PATH
 which pipenv
 ls -al
 pipenv install
-pipenv run ./manage.py qcluster
+pipenv run ./manage.py warm_worker
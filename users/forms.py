@@ -14,6 +14,7 @@ from django import forms
 from django.contrib.auth.models import User
 
 # Application imports
+from cfc_app.forms import reference_choices
 from cfc_app.models import Location, Impact
 from .models import Profile
 
@@ -44,3 +45,8 @@ class ProfileForm(forms.ModelForm):
         widget=forms.CheckboxSelectMultiple,
         queryset=Impact.objects.all().exclude(iname='None')
     )
+
+    def __init__(self, *args, **kwargs):
+        """ Show locations and impacts kept in memory """
+        super().__init__(*args, **kwargs)
+        reference_choices(self)
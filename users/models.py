@@ -11,9 +11,10 @@ Licensed under Apache 2.0, see LICENSE for details
 # System imports
 from django.db import models
 from django.contrib.auth.models import User
-from django.db.models.signals import post_save
+from django.db.models.signals import m2m_changed, post_delete, post_save
 from django.dispatch import receiver
 from cfc_app.models import Impact, Criteria
+from cfc_app.models import DataVersion, CRITERIA_DATA
 
 # Create your models here.
 
@@ -43,27 +44,14 @@ class Profile(models.Model):
         return f'{self.user.username}'
 
     def set_criteria(self):
-        """ Create or update criteria record for this profile. """
-
-        crit = self.criteria
-        if crit:
-            crit.location = self.location
-            selected = self.impacts.all()
-            for impact in Impact.objects.all():
-                if impact in selected:
-                    crit.impacts.add(impact)
-                else:
-                    crit.impacts.remove(impact)
-        else:
-            crit = Criteria(location=self.location)
-            crit.save()
-            for impact in self.impacts.all():
-                crit.impacts.add(impact)
-
-        crit.set_text()
-        crit.save()
+        """ Find or create criteria record for this profile. """
+
+        # Profiles and searches with the same location and impacts
+        # share one criteria row
+        crit = Criteria.find_or_create(self.location, self.impacts.all())
         self.criteria = crit
         self.save()
+        DataVersion.bump(CRITERIA_DATA)
 
         return self
 
@@ -87,3 +75,23 @@ def save_user_profile(sender, instance, **kwargs):
         pass
 
     instance.profile.save()
+
+
+@receiver(post_save, sender=Profile)
+@receiver(post_delete, sender=Profile)
+@receiver(m2m_changed, sender=Profile.impacts.through)
+def profile_changed(sender, **kwargs):
+    """ Cached pages listing profiles are out of date
+
+    Saving an existing profile does not count, since every login saves
+    it, see save_user_profile.  Changes to its location and criteria are
+    counted by set_criteria.
+    """
+
+    if sender is None and kwargs is None:   # Eliminate pylint errors
+        pass
+
+    if kwargs.get('created') is False:
+        return
+    if kwargs.get('action', 'post_').startswith('post_'):
+        DataVersion.bump(CRITERIA_DATA)
@@ -6,3 +6,4 @@
 /app/cron1 get_datasets --api
 /app/cron1 extract_files --api --skip --limit 0
 /app/cron1 analyze_text --api --skip --compare --limit 0
+/app/cron1 send_digest